@@ -1,12 +1,20 @@
+import time
+RUN_START = time.perf_counter()
+
 import streamlit as st
-import os
-import fitz  # PyMuPDF
-import ollama
-import tempfile
 from pathlib import Path
-import json
 from datetime import datetime
-import pandas as pd
+import sys
+
+# Modules partagés (dossier analyseur/ à la racine du dépôt)
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from analyseur import checklist, extraction, llm, metrics, pipeline, precompute, prompts, store
+from analyseur.ui import bootstrap, identify, render_archive_panel, render_checklist, render_metrics_panel, render_sections
+
+bootstrap()
+identify()
 
 # Configuration de la page Streamlit
 st.set_page_config(
@@ -79,9 +87,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Configuration d'Ollama
+@st.cache_resource(ttl=30, show_spinner=False)
 def check_ollama_connection():
-    """Vérifie la connexion à Ollama"""
+    """Vérifie la connexion à Ollama (résultat réutilisé 30 s entre les reruns)"""
     try:
+        import ollama
+
         # Vérifier si Ollama est accessible
         models = ollama.list()
         return True, models
@@ -153,124 +164,153 @@ with st.sidebar:
             step=0.1,
             help="Plus la température est élevée, plus les réponses sont créatives"
         )
+        
+        precompute_on = st.checkbox(
+            "⚡ Précalcul dès l'upload",
+            value=precompute.enabled(),
+            help="Lance en arrière-plan l'extraction, le résumé et les questions types dès qu'un fichier est déposé"
+        )
+        
+        stream_on = st.checkbox(
+            "🌊 Résumé en flux (longs documents)",
+            value=False,
+            help="Envoie les pages au modèle par lots pendant la lecture du PDF, puis condense les notes de chaque lot"
+        )
+    
+    # Section archive : recherche et réouverture sans nouvelle extraction
+    reopened = render_archive_panel(max_length)
+    if reopened:
+        st.session_state['pdf_text'] = reopened['text']
+        st.session_state['document_id'] = reopened['id']
+        st.session_state['sections'] = reopened['sections']
+        st.session_state['summary'] = reopened['summary']
+        st.session_state['reopened_name'] = reopened['name'] or reopened['id'][:12]
+        st.session_state.chat_history = []
+        st.session_state.pop('precomputation', None)
 
 # Fonction pour extraire le texte du PDF
 def extract_pdf_text(pdf_file, max_length=120000):
     """Extrait le texte d'un fichier PDF avec repères de pages"""
     try:
-        # Sauvegarder le fichier temporairement
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.read())
-            tmp_path = tmp_file.name
-        
-        # Ouvrir le PDF
-        pdf = fitz.open(tmp_path)
-        text = ""
-        
-        for i, page in enumerate(pdf, start=1):
-            page_text = page.get_text()
-            text += f"\n\n=== [PAGE {i}] ===\n{page_text.strip()}"
+        document = extraction.extract_document(pdf_file, max_length)
         
-        pdf.close()
-        
-        # Nettoyer le fichier temporaire
-        os.unlink(tmp_path)
-        
-        # Nettoyer le texte
-        text = "\n".join(line.strip() for line in text.splitlines())
-        
-        # Tronquer si nécessaire
-        if len(text) > max_length:
-            text = text[:max_length]
+        if document['empty_pages']:
+            st.warning(f"⚠️ Pages sans texte exploitable (scans non reconnus ?) : {document['empty_pages']}")
+
+        if document['truncated']:
             st.warning(f"⚠️ Le texte a été tronqué à {max_length:,} caractères pour des raisons de performance.")
         
-        return text
+        st.session_state['document_id'] = document['id']
+        st.session_state['sections'] = document['sections']
+        return document['text']
         
     except Exception as e:
         st.error(f"❌ Erreur lors de la lecture du PDF: {str(e)}")
         return None
 
 # Fonction pour générer le résumé avec Ollama
-def generate_summary_ollama(text, model, summary_length=300, temperature=0.3):
-    """Génère un résumé financier avec Ollama"""
+def generate_summary_ollama(text, model, summary_length=300, temperature=0.3, sections=None):
+    """Génère un résumé financier avec Ollama (pages utiles seulement si les sections sont connues)"""
     
-    system_prompt = f"""Tu es analyste financier expert. On te fournit le texte d'un document financier
-(rapport annuel, trimestriel, comptes, bilan, annexes).
-
-Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :
-
-- **Société / Période / Devise** : (si repérable)
-- **Résumé exécutif** : activité, faits marquants, contexte ({summary_length//4}-{summary_length//3} lignes)
-- **Chiffres clés** (tableau) :
- | Indicateur | Valeur | Évolution/Contexte | Période | Page |
- |---|---:|---|---|---:|
- (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,
- Dette nette, Trésorerie, etc.)
-- **Analyse** :
- - Performance (croissance, marges, cash)
- - Structure financière (dette, liquidité)
- - Risques & incertitudes (marché, réglementation, change)
- - Outlook / Guidance (si communiqué)
-- **Références internes** : pages/sections à relire
-
-Exigences :
-- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.
-- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).
-- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).
-- Reste concis : {summary_length-50}-{summary_length+50} mots hors tableau."""
+    with metrics.timer("prompt_build"):
+        messages = prompts.summary_messages(text, summary_length, sections)
 
     try:
-        # Appel à Ollama
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ],
-            options={
+        # Appel à Ollama (réponse mise en cache ; rejoint un appel identique en cours)
+        return llm.complete(
+            "ollama",
+            model,
+            messages,
+            {
                 "temperature": temperature,
                 "num_predict": 2000
-            }
+            },
+            stage="summary"
         )
         
-        return response['message']['content']
-        
     except Exception as e:
         st.error(f"❌ Erreur lors de la génération du résumé: {str(e)}")
         return None
 
+# Fonction pour lire le PDF et le résumer en flux avec Ollama
+def stream_summary_ollama(pdf_file, model, max_length, summary_length=300, temperature=0.3):
+    """Lecture et résumé superposés ; renvoie ``(texte, résumé)``"""
+    text = summary = None
+    try:
+        with st.status("🌊 Lecture et résumé en flux...", expanded=True) as status:
+            progress = st.empty()
+            placeholder = st.empty()
+            pieces = []
+            for kind, payload in pipeline.stream_summary(
+                pdf_file,
+                "ollama",
+                model,
+                summary_length,
+                {"temperature": temperature, "num_predict": 2000},
+                max_length=max_length,
+                chunk_params={"temperature": temperature, "num_predict": 600}
+            ):
+                if kind == "page":
+                    progress.caption(f"📄 {payload} pages lues")
+                elif kind == "chunk":
+                    st.write(f"📨 Pages {payload[0]}–{payload[1]} envoyées au modèle")
+                elif kind == "document":
+                    text = payload['text']
+                    st.session_state['document_id'] = payload['id']
+                    st.session_state['sections'] = payload['sections']
+                    if payload['empty_pages']:
+                        st.warning(f"⚠️ Pages sans texte exploitable (scans non reconnus ?) : {payload['empty_pages']}")
+                    if payload['truncated']:
+                        st.warning(f"⚠️ Le texte a été tronqué à {max_length:,} caractères pour des raisons de performance.")
+                elif kind == "text":
+                    pieces.append(payload)
+                    placeholder.markdown("".join(pieces))
+                elif kind == "summary":
+                    summary = payload
+            placeholder.empty()
+            status.update(label="✅ Résumé en flux terminé", state="complete", expanded=False)
+    except Exception as e:
+        st.error(f"❌ Erreur lors du résumé en flux: {str(e)}")
+    return text, summary
+
 # Fonction pour répondre aux questions avec Ollama
-def answer_question_ollama(question, text, model, temperature=0.1):
+def answer_question_ollama(question, text, model, temperature=0.1, sections=None):
     """Répond à une question spécifique sur le document avec Ollama"""
     
-    system_prompt = """Tu es analyste financier. On te donne un extrait de rapport financier. 
-Réponds uniquement à la question posée, sans inventer de données. 
-Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. 
-Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===').
-Sois concis et précis."""
+    with metrics.timer("prompt_build"):
+        messages = prompts.question_messages(question, text, sections)
 
+    params = {
+        "temperature": temperature,
+        "num_predict": 500
+    }
     try:
-        # Appel à Ollama
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
-            ],
-            options={
-                "temperature": temperature,
-                "num_predict": 500
-            }
+        # Appel à Ollama (réponse mise en cache ; rejoint un appel identique en cours)
+        cached = llm.is_cached("ollama", model, messages, params)
+        start = time.perf_counter()
+        response = llm.stream("ollama", model, messages, params, stage="question")
+        answer = response.text()
+        store.save_answer(
+            st.session_state.get('document_id'), question, answer, model, "ollama",
+            time.perf_counter() - start, cached, response.usage
         )
-        
-        return response['message']['content']
+        return answer
         
     except Exception as e:
         return f"❌ Erreur lors de la génération de la réponse: {str(e)}"
 
+# Liste de questions : un appel par groupe de questions partageant les mêmes pages
+def answer_checklist_ollama(questions, text, model, temperature=0.1, sections=None):
+    """Répond à une liste de questions ; renvoie (lignes du tableau, statistiques)"""
+    return checklist.answer_checklist(
+        questions, text, sections, "ollama", model, {"temperature": temperature}
+    )
+
 # Interface principale
 ollama_status, models_info = check_ollama_connection()
 if not ollama_status:
+    # Pas de mise en cache d'un échec : nouvelle vérification au prochain rerun
+    check_ollama_connection.clear()
     st.error("⚠️ Impossible de se connecter à Ollama. Veuillez vérifier que le service est démarré.")
     st.info("""
     **Pour démarrer Ollama :**
@@ -300,6 +340,19 @@ uploaded_file = st.file_uploader(
 )
 
 if uploaded_file is not None:
+    # Précalcul spéculatif : mêmes messages et paramètres que les appels ci-dessous
+    if precompute_on and model:
+        st.session_state['precomputation'] = precompute.start(
+            uploaded_file,
+            max_length,
+            "ollama",
+            model,
+            summary_messages=lambda text, sections=None: prompts.summary_messages(text, summary_length, sections),
+            summary_params={"temperature": temperature, "num_predict": 2000},
+            question_messages=prompts.question_messages,
+            question_params={"temperature": temperature, "num_predict": 500}
+        )
+    
     # Afficher les informations du fichier
     file_details = {
         "Nom du fichier": uploaded_file.name,
@@ -314,8 +367,12 @@ if uploaded_file is not None:
     
     # Bouton pour analyser le PDF
     if st.button("🔍 Analyser le Document", type="primary"):
-        with st.spinner("📖 Extraction du texte en cours..."):
-            text = extract_pdf_text(uploaded_file, max_length)
+        analysis_start = time.perf_counter()
+        if stream_on:
+            text, summary = stream_summary_ollama(uploaded_file, model, max_length, summary_length, temperature)
+        else:
+            with st.spinner("📖 Extraction du texte en cours..."):
+                text = extract_pdf_text(uploaded_file, max_length)
         
         if text:
             st.success("✅ Texte extrait avec succès!")
@@ -323,10 +380,15 @@ if uploaded_file is not None:
             # Aperçu du texte
             with st.expander("👀 Aperçu du texte extrait", expanded=False):
                 st.text_area("Texte extrait", text[:2000] + "..." if len(text) > 2000 else text, height=200)
+            render_sections(st.session_state.get('sections'))
             
-            # Génération du résumé
-            with st.spinner("🤖 Génération du résumé en cours..."):
-                summary = generate_summary_ollama(text, model, summary_length, temperature)
+            # Génération du résumé (déjà faite en mode flux)
+            if not stream_on:
+                with st.spinner("🤖 Génération du résumé en cours..."):
+                    summary = generate_summary_ollama(
+                        text, model, summary_length, temperature, st.session_state.get('sections')
+                    )
+            metrics.REGISTRY.observe("analysis_total", time.perf_counter() - analysis_start)
             
             if summary:
                 st.markdown("## 📊 Résumé Financier")
@@ -335,6 +397,15 @@ if uploaded_file is not None:
                 # Sauvegarder le contexte pour les questions
                 st.session_state['pdf_text'] = text
                 st.session_state['summary'] = summary
+                st.session_state.pop('reopened_name', None)
+                
+                # Archiver le résumé avec le document
+                store.save_summary(
+                    st.session_state.get('document_id'),
+                    summary,
+                    model,
+                    {"summary_length": summary_length, "temperature": temperature}
+                )
                 
                 # Bouton de téléchargement du résumé
                 st.download_button(
@@ -344,6 +415,13 @@ if uploaded_file is not None:
                     mime="text/markdown"
                 )
 
+# Rapport rouvert depuis l'archive (sans nouvel upload)
+if uploaded_file is None and st.session_state.get('reopened_name'):
+    st.info(f"📂 Rapport rouvert depuis l'archive : {st.session_state['reopened_name']}")
+    if st.session_state.get('summary'):
+        st.markdown("## 📊 Résumé Financier")
+        st.markdown(st.session_state['summary'])
+
 # Section des questions interactives
 if 'pdf_text' in st.session_state:
     st.markdown("## 💬 Questions Interactives")
@@ -378,31 +456,42 @@ if 'pdf_text' in st.session_state:
         )
     
     with col2:
-        if st.button("❓ Poser", type="primary"):
-            if question.strip():
-                # Ajouter la question à l'historique
-                st.session_state.chat_history.append({
-                    'role': 'user',
-                    'content': question
-                })
-                
-                # Générer la réponse
-                with st.spinner("🤔 Recherche en cours..."):
-                    answer = answer_question_ollama(
-                        question, 
-                        st.session_state['pdf_text'], 
-                        model, 
-                        temperature
-                    )
-                
-                # Ajouter la réponse à l'historique
-                st.session_state.chat_history.append({
-                    'role': 'assistant',
-                    'content': answer
-                })
-                
-                # Recharger la page pour afficher la nouvelle conversation
-                st.rerun()
+        ask = st.button("❓ Poser", type="primary")
+    
+    # Questions types (⚡ : réponse précalculée disponible immédiatement)
+    precomputation = st.session_state.get('precomputation')
+    ready = precomputation.ready() if precomputation else []
+    suggestions = precompute.standard_questions()
+    for column, suggestion in zip(st.columns(len(suggestions)), suggestions):
+        label = f"⚡ {suggestion}" if suggestion in ready else suggestion
+        if column.button(label, key=f"suggestion_{suggestion}", use_container_width=True):
+            question, ask = suggestion, True
+    
+    if ask and question.strip():
+        # Ajouter la question à l'historique
+        st.session_state.chat_history.append({
+            'role': 'user',
+            'content': question
+        })
+        
+        # Générer la réponse
+        with st.spinner("🤔 Recherche en cours..."):
+            answer = answer_question_ollama(
+                question, 
+                st.session_state['pdf_text'], 
+                model, 
+                temperature,
+                st.session_state.get('sections')
+            )
+        
+        # Ajouter la réponse à l'historique
+        st.session_state.chat_history.append({
+            'role': 'assistant',
+            'content': answer
+        })
+        
+        # Recharger la page pour afficher la nouvelle conversation
+        st.rerun()
     
     # Bouton pour effacer l'historique
     if st.session_state.chat_history:
@@ -410,6 +499,18 @@ if 'pdf_text' in st.session_state:
             st.session_state.chat_history = []
             st.rerun()
 
+    render_checklist(
+        st.session_state.get('document_id'),
+        lambda questions: answer_checklist_ollama(
+            questions, st.session_state['pdf_text'], model, temperature, st.session_state.get('sections')
+        ),
+    )
+
+# Panneau de performances (en fin de script pour inclure les mesures de ce rerun)
+metrics.REGISTRY.observe("script_run", time.perf_counter() - RUN_START)
+with st.sidebar:
+    render_metrics_panel()
+
 # Footer
 st.markdown("---")
 st.markdown("""
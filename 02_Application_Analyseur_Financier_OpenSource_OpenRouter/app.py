@@ -1,10 +1,20 @@
+import time
+RUN_START = time.perf_counter()
+
 import streamlit as st
 import os
-import fitz  # PyMuPDF
-from dotenv import load_dotenv
-import requests
-import tempfile
-import uuid
+import sys
+from pathlib import Path
+
+# Modules partagés (dossier analyseur/ à la racine du dépôt)
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from analyseur import checklist, extraction, llm, metrics, precompute, prompts, store
+from analyseur.ui import bootstrap, identify, load_env, render_archive_panel, render_checklist, render_metrics_panel, render_sections
+
+bootstrap()
+identify()
 
 # Configuration de la page
 st.set_page_config(
@@ -75,8 +85,8 @@ st.markdown('<p style="text-align: center; font-size: 1.2rem; color: #666;">Anal
 with st.sidebar:
     st.markdown("## ⚙️ Configuration")
     
-    # Chargement des variables d'environnement
-    load_dotenv()
+    # Chargement des variables d'environnement (une fois par processus)
+    load_env(str(Path(__file__).resolve().parent))
     api_key_env = os.getenv("OPENROUTER_API_KEY")
     
     # Section pour la clé API
@@ -123,6 +133,23 @@ with st.sidebar:
     # Paramètres
     st.markdown("### 📋 Paramètres")
     max_length = st.slider("Longueur maximale du texte (caractères):", 50000, 200000, 120000, step=10000)
+    precompute_on = st.checkbox(
+        "⚡ Précalcul dès l'upload",
+        value=precompute.enabled(),
+        help="Lance le résumé et les questions types dès l'upload ; "
+             "consomme des crédits OpenRouter même si vous ne les consultez pas."
+    )
+    
+    # Archive : recherche et réouverture sans nouvelle extraction
+    reopened = render_archive_panel(max_length)
+    if reopened:
+        st.session_state.pdf_text = reopened["text"]
+        st.session_state.document_id = reopened["id"]
+        st.session_state.sections = reopened["sections"]
+        st.session_state.summary = reopened["summary"]
+        st.session_state.chat_history = []
+        st.session_state.pop("precomputation", None)
+        st.success(f"📂 {reopened['name'] or 'Rapport'} rouvert depuis l'archive")
     
     st.markdown("---")
     st.markdown("### 📚 À propos")
@@ -150,134 +177,109 @@ with st.sidebar:
 # Fonction pour extraire le texte du PDF
 def extract_pdf_text(pdf_file, max_length):
     try:
-        # Sauvegarder le fichier temporairement
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_file.read())
-            tmp_path = tmp_file.name
-        
-        # Ouvrir le PDF avec PyMuPDF
-        pdf = fitz.open(tmp_path)
-        texte = ""
-        
-        for i, page in enumerate(pdf, start=1):
-            texte_page = pdf[i-1].get_text()
-            texte += f"\n\n=== [PAGE {i}] ===\n" + texte_page.strip()
-        
-        pdf.close()
-        
-        # Nettoyer le texte
-        texte = "\n".join(l.strip() for l in texte.splitlines())
+        # Extraction mise en cache par contenu : les reruns ne relisent pas le PDF
+        document = extraction.extract_document(pdf_file, max_length)
         
-        # Tronquer si nécessaire
-        if len(texte) > max_length:
-            texte = texte[:max_length]
+        if document["empty_pages"]:
+            st.warning(f"⚠️ Pages sans texte exploitable (scans non reconnus ?) : {document['empty_pages']}")
+
+        if document["truncated"]:
             st.warning(f"⚠️ Le texte a été tronqué à {max_length} caractères pour des raisons de performance.")
         
-        # Nettoyer le fichier temporaire
-        os.unlink(tmp_path)
-        
-        return texte
+        st.session_state.document_id = document["id"]
+        st.session_state.sections = document["sections"]
+        return document["text"]
     except Exception as e:
         st.error(f"Erreur lors de la lecture du PDF: {str(e)}")
         return None
 
+# Consignes envoyées au modèle (partagées avec le précalcul)
+CONSIGNES_RESUME = (
+    "Tu es analyste financier. On te fournit le texte d'un document financier\n"
+    "(rapport annuel, trimestriel, comptes, bilan, annexes).\n\n"
+    "Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :\n\n"
+    "- **Société / Période / Devise** : (si repérable)\n"
+    "- **Résumé exécutif (5–8 lignes)** : activité, faits marquants, contexte\n"
+    "- **Chiffres clés** (tableau) :\n"
+    " | Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
+    " |---|---:|---|---|---:|\n"
+    " (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,\n"
+    " Dette nette, Trésorerie, NPL/Coût du risque pour banque, CET1, LCR/NSFR, etc.)\n"
+    "- **Analyse** :\n"
+    " - Performance (croissance, marges, cash)\n"
+    " - Structure financière (dette, liquidité)\n"
+    " - Risques & incertitudes (marché, réglementation, change)\n"
+    " - Outlook / Guidance (si communiqué)\n"
+    "- **Références internes** : pages/sections à relire\n\n"
+    "Exigences :\n"
+    "- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.\n"
+    "- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).\n"
+    "- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).\n"
+    "- Reste concis : 200–350 mots hors tableau."
+)
+
+CONSIGNES_QUESTIONS = (
+    "Tu es analyste financier. On te donne le texte d'un rapport financier. "
+    "Réponds uniquement à la question posée, sans inventer de données. "
+    "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
+    "Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===')."
+)
+
+# Avec les sections du document, seules les pages utiles sont envoyées
+def summary_messages(text, sections=None):
+    return [
+        {"role": "system", "content": CONSIGNES_RESUME},
+        {"role": "user", "content": prompts.summary_context(text, sections)}
+    ]
+
+def question_messages(question, text, sections=None):
+    return [
+        {"role": "system", "content": CONSIGNES_QUESTIONS},
+        {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{prompts.question_context(question, text, sections)}"}
+    ]
+
 # Fonction pour générer le résumé via OpenRouter
-def generate_summary(text, api_key, model):
+def generate_summary(text, api_key, model, sections=None):
     try:
-        # Configuration pour OpenRouter
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "http://localhost:8888/",
-            "Content-Type": "application/json"
-        }
-        
-        # URL de l'API OpenRouter
-        api_url = "https://openrouter.ai/api/v1/chat/completions"
-        
-        consignes = (
-            "Tu es analyste financier. On te fournit le texte d'un document financier\n"
-            "(rapport annuel, trimestriel, comptes, bilan, annexes).\n\n"
-            "Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :\n\n"
-            "- **Société / Période / Devise** : (si repérable)\n"
-            "- **Résumé exécutif (5–8 lignes)** : activité, faits marquants, contexte\n"
-            "- **Chiffres clés** (tableau) :\n"
-            " | Indicateur | Valeur | Évolution/Contexte | Période | Page |\n"
-            " |---|---:|---|---|---:|\n"
-            " (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,\n"
-            " Dette nette, Trésorerie, NPL/Coût du risque pour banque, CET1, LCR/NSFR, etc.)\n"
-            "- **Analyse** :\n"
-            " - Performance (croissance, marges, cash)\n"
-            " - Structure financière (dette, liquidité)\n"
-            " - Risques & incertitudes (marché, réglementation, change)\n"
-            " - Outlook / Guidance (si communiqué)\n"
-            "- **Références internes** : pages/sections à relire\n\n"
-            "Exigences :\n"
-            "- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.\n"
-            "- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).\n"
-            "- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).\n"
-            "- Reste concis : 200–350 mots hors tableau."
-        )
-        
         # Préparation de la requête
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": consignes},
-                {"role": "user", "content": text}
-            ]
-        }
+        prompt_start = time.perf_counter()
+        messages = summary_messages(text, sections)
+        metrics.REGISTRY.observe("prompt_build", time.perf_counter() - prompt_start)
         
-        # Appel API
-        response = requests.post(api_url, json=payload, headers=headers)
-        response_json = response.json()
-        
-        # Extraction du texte de la réponse
-        return response_json['choices'][0]['message']['content']
+        # Appel API (streaming instrumenté ; cache, précalcul ou appel identique en cours)
+        return llm.complete("openrouter", model, messages, api_key=api_key, stage="summary")
         
     except Exception as e:
         st.error(f"Erreur lors de la génération du résumé: {str(e)}")
         return None
 
 # Fonction pour répondre aux questions via OpenRouter
-def answer_question(question, text, api_key, model):
+def answer_question(question, text, api_key, model, sections=None):
     try:
-        # Configuration pour OpenRouter
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "http://localhost:8888/",
-            "Content-Type": "application/json"
-        }
-        
-        # URL de l'API OpenRouter
-        api_url = "https://openrouter.ai/api/v1/chat/completions"
-        
-        consignes_questions = (
-            "Tu es analyste financier. On te donne le texte d'un rapport financier. "
-            "Réponds uniquement à la question posée, sans inventer de données. "
-            "Si la réponse n'est pas claire dans le texte, écris : 'non précisé'. "
-            "Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===')."
-        )
-        
         # Préparation de la requête
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": consignes_questions},
-                {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{text}"}
-            ]
-        }
-        
-        # Appel API
-        response = requests.post(api_url, json=payload, headers=headers)
-        response_json = response.json()
+        prompt_start = time.perf_counter()
+        messages = question_messages(question, text, sections)
+        metrics.REGISTRY.observe("prompt_build", time.perf_counter() - prompt_start)
         
-        # Extraction du texte de la réponse
-        return response_json['choices'][0]['message']['content']
+        # Appel API (streaming instrumenté ; cache, précalcul ou appel identique en cours)
+        cached = llm.is_cached("openrouter", model, messages)
+        start = time.perf_counter()
+        response = llm.stream("openrouter", model, messages, api_key=api_key, stage="question")
+        answer = response.text()
+        store.save_answer(
+            st.session_state.get("document_id"), question, answer, model, "openrouter",
+            time.perf_counter() - start, cached, response.usage
+        )
+        return answer
         
     except Exception as e:
         st.error(f"Erreur lors de la réponse à la question: {str(e)}")
         return None
 
+# Fonction pour répondre à une liste de questions (un appel par groupe de pages communes)
+def answer_checklist(questions, text, api_key, model, sections=None):
+    return checklist.answer_checklist(questions, text, sections, "openrouter", model, api_key=api_key)
+
 # Interface principale
 if not api_key:
     st.markdown('<h2 class="sub-header">🚫 Configuration requise</h2>', unsafe_allow_html=True)
@@ -326,6 +328,12 @@ if 'chat_history' not in st.session_state:
 
 # Traitement du PDF
 if uploaded_file is not None:
+    if precompute_on:
+        # Extraction, résumé et questions types lancés en tâche de fond
+        st.session_state.precomputation = precompute.start(
+            uploaded_file, max_length, backend="openrouter", model=model, api_key=api_key,
+            summary_messages=summary_messages, question_messages=question_messages
+        )
     with st.spinner("📖 Analyse du document en cours..."):
         pdf_text = extract_pdf_text(uploaded_file, max_length)
         
@@ -335,16 +343,19 @@ if uploaded_file is not None:
             # Aperçu du texte
             with st.expander("👁️ Aperçu du document (cliquez pour voir)"):
                 st.text(pdf_text[:1000] + "..." if len(pdf_text) > 1000 else pdf_text)
+            render_sections(st.session_state.get("sections"))
             
             st.success(f"✅ Document analysé avec succès ! ({len(pdf_text)} caractères)")
             
             # Bouton pour générer le résumé
             if st.button("🚀 Générer le Résumé Financier", use_container_width=True):
                 with st.spinner("🤖 Génération du résumé en cours..."):
-                    summary = generate_summary(pdf_text, api_key, model)
+                    with metrics.timer("analysis_total"):
+                        summary = generate_summary(pdf_text, api_key, model, st.session_state.get("sections"))
                     
                     if summary:
                         st.session_state.summary = summary
+                        store.save_summary(st.session_state.get("document_id"), summary, model)
                         st.success("✅ Résumé généré avec succès !")
 
 # Affichage du résumé
@@ -354,7 +365,7 @@ if st.session_state.summary:
     # Métriques rapides
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("📄 Pages analysées", str(pdf_text.count("=== [PAGE")) if st.session_state.pdf_text else "0")
+        st.metric("📄 Pages analysées", str(st.session_state.pdf_text.count("=== [PAGE")) if st.session_state.pdf_text else "0")
     with col2:
         st.metric("📊 Caractères", f"{len(st.session_state.pdf_text):,}" if st.session_state.pdf_text else "0")
     with col3:
@@ -382,8 +393,19 @@ if st.session_state.pdf_text:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
     
+    # Questions types (⚡ : réponse déjà précalculée)
+    precomputation = st.session_state.get("precomputation")
+    ready = precomputation.ready() if precomputation else []
+    suggestion = None
+    if precomputation and precomputation.answers:
+        cols = st.columns(len(precomputation.answers))
+        for col, q in zip(cols, precomputation.answers):
+            with col:
+                if st.button(("⚡ " if q in ready else "") + q, use_container_width=True):
+                    suggestion = q
+    
     # Input pour la question
-    if prompt := st.chat_input("Posez votre question..."):
+    if prompt := (st.chat_input("Posez votre question...") or suggestion):
         # Ajouter la question à l'historique
         st.session_state.chat_history.append({"role": "user", "content": prompt})
         
@@ -394,7 +416,7 @@ if st.session_state.pdf_text:
         # Générer la réponse
         with st.chat_message("assistant"):
             with st.spinner("🤔 Recherche de la réponse..."):
-                response = answer_question(prompt, st.session_state.pdf_text, api_key, model)
+                response = answer_question(prompt, st.session_state.pdf_text, api_key, model, st.session_state.get("sections"))
                 
                 if response:
                     st.markdown(response)
@@ -408,6 +430,18 @@ if st.session_state.pdf_text:
             st.session_state.chat_history = []
             st.rerun()
 
+    render_checklist(
+        st.session_state.get("document_id"),
+        lambda questions: answer_checklist(
+            questions, st.session_state.pdf_text, api_key, model, st.session_state.get("sections")
+        ),
+    )
+
+# Panneau de performances (en fin de script pour inclure les mesures de ce rerun)
+metrics.REGISTRY.observe("script_run", time.perf_counter() - RUN_START)
+with st.sidebar:
+    render_metrics_panel()
+
 # Footer
 st.markdown("---")
 st.markdown("""
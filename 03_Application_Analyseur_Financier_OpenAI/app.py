@@ -1,9 +1,20 @@
+import time
+RUN_START = time.perf_counter()
+
 import streamlit as st
-import os
-import fitz  # PyMuPDF
-import tempfile
-import re
-from dotenv import load_dotenv, find_dotenv
+import sys
+from pathlib import Path
+
+# Modules partagés (dossier analyseur/ à la racine du dépôt)
+ROOT_DIR = str(Path(__file__).resolve().parent.parent)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+from analyseur import extraction, metrics, precompute, store
+from analyseur.figures import extract_figures, indicators_in
+from analyseur.sections import split_pages
+from analyseur.ui import bootstrap, load_env, render_archive_panel, render_metrics_panel, render_sections
+
+bootstrap()
 
 # ======================================================
 # CONFIGURATION PAGE
@@ -25,7 +36,7 @@ st.markdown(
 # ======================================================
 with st.sidebar:
     st.header("⚙️ Configuration")
-    load_dotenv(find_dotenv(), override=True)
+    load_env(str(Path(__file__).resolve().parent), override=True)
 
     st.markdown("### 🧠 Comportement de l’IA")
     st.markdown("""
@@ -40,6 +51,15 @@ with st.sidebar:
         50_000, 200_000, 120_000, step=10_000
     )
 
+    # Archive : recherche et réouverture sans nouvelle extraction
+    reopened = render_archive_panel(max_length)
+    if reopened:
+        st.session_state["pdf_text"] = reopened["text"]
+        st.session_state["document_id"] = reopened["id"]
+        st.session_state["sections"] = reopened["sections"]
+        st.session_state["archived_summary"] = reopened["summary"]
+        st.success(f"📂 {reopened['name'] or 'Rapport'} rouvert depuis l'archive")
+
     st.markdown("---")
     st.markdown("### 📘 Mode Prototype")
     st.info(
@@ -52,60 +72,45 @@ with st.sidebar:
 # ======================================================
 def extract_pdf_text(pdf_file, max_length):
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_file.read())
-            path = tmp.name
+        document = extraction.extract_document(pdf_file, max_length)
 
-        doc = fitz.open(path)
-        text = ""
+        if document["empty_pages"]:
+            st.warning(f"⚠️ Pages sans texte exploitable (scans non reconnus ?) : {document['empty_pages']}")
 
-        for i, page in enumerate(doc, start=1):
-            text += f"\n\n=== [PAGE {i}] ===\n"
-            text += page.get_text().strip()
-
-        text = "\n".join(line.strip() for line in text.splitlines())
-
-        if len(text) > max_length:
-            text = text[:max_length]
+        if document["truncated"]:
             st.warning("⚠️ Texte tronqué pour rester exploitable par l’IA")
 
-        os.remove(path)
-        return text
+        st.session_state["document_id"] = document["id"]
+        st.session_state["sections"] = document["sections"]
+        return document["text"]
 
     except Exception as e:
         st.error(f"Erreur PDF : {e}")
         return None
 
 # ======================================================
-# EXTRACTION DE DONNÉES NUMÉRIQUES SIMPLES
+# INDICATEURS CHIFFRÉS DU DOCUMENT
 # ======================================================
-def extract_numbers(text):
-    keywords = ["chiffre d'affaires", "résultat net", "marge", "dette", "trésorerie"]
-    data = {}
-
-    for key in keywords:
-        pattern = rf"{key}[^0-9]*([\d\s,.]+)"
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        data[key] = matches
-
-    return data
+def document_figures(text):
+    """Indicateurs archivés du document, sinon repérés dans le texte extrait"""
+    archive = store.get_store()
+    document_id = st.session_state.get("document_id")
+    figures = archive.figures(document_id) if archive and document_id else []
+    if not figures:
+        by_page = split_pages(text)
+        figures = extract_figures([by_page.get(n, "") for n in range(1, max(by_page, default=0) + 1)])
+    return figures
 
 # ======================================================
-# AUDIT DE COHÉRENCE SIMPLE
+# AUDIT DE COHÉRENCE (identités comptables, variations, échelles)
 # ======================================================
-def audit_financier(data):
-    alerts = []
-
-    if data["chiffre d'affaires"] and data["résultat net"]:
-        alerts.append("📈 CA et Résultat net identifiés — cohérence à vérifier manuellement")
-
-    if data["dette"] and data["trésorerie"]:
-        alerts.append("⚠️ Dette et Trésorerie présentes — analyser la solvabilité")
-
-    if not alerts:
-        return "✅ Aucune incohérence majeure détectée"
+def audit_financier(text, question=None):
+    # pandas n'est importé qu'au premier audit (démarrage de l'application plus rapide)
+    from analyseur import audit
 
-    return "\n".join(alerts)
+    frame = audit.figures_frame(document_figures(text), st.session_state.get("document_id"))
+    violations = audit.run_audit(frame)
+    return audit.report(violations, indicators_in(question) if question else None)
 
 # ======================================================
 # MOTEUR IA — MODE PROTOTYPE (REMPLAÇABLE)
@@ -146,9 +151,10 @@ def generate_summary(text):
     - recommandations
     """
 
-    summary = ia_engine(text, instruction)
-    numbers = extract_numbers(text)
-    audit = audit_financier(numbers)
+    with metrics.timer("llm_total"):
+        summary = ia_engine(text, instruction)
+    with metrics.timer("audit"):
+        audit = audit_financier(text)
 
     return summary + "\n\n---\n\n### 🔎 Audit de cohérence\n" + audit
 
@@ -162,9 +168,15 @@ def answer_question(text, question):
     Question : {question}
     """
 
-    response = ia_engine(text, instruction)
-    numbers = extract_numbers(text)
-    audit = audit_financier(numbers)
+    start = time.perf_counter()
+    with metrics.timer("llm_total"):
+        response = ia_engine(text, instruction)
+    store.save_answer(
+        st.session_state.get("document_id"), question, response, "prototype", "prototype",
+        time.perf_counter() - start
+    )
+    with metrics.timer("audit"):
+        audit = audit_financier(text, question)
 
     return response + "\n\n---\n\n### 🔎 Audit lié à la question\n" + audit
 
@@ -176,6 +188,9 @@ def main():
 
     with tab1:
         uploaded = st.file_uploader("Uploader un PDF financier", type=["pdf"])
+        if uploaded and precompute.enabled():
+            # Extraction et indexation anticipées : « Analyser » les trouve en cache
+            precompute.start(uploaded, max_length)
 
         if uploaded and st.button("🚀 Analyser"):
             with st.spinner("Extraction du texte..."):
@@ -184,12 +199,16 @@ def main():
             if text:
                 st.session_state["pdf_text"] = text
                 st.success("✅ Texte extrait")
+                render_sections(st.session_state.get("sections"))
 
                 with st.spinner("Analyse IA en cours..."):
-                    summary = generate_summary(text)
+                    with metrics.timer("analysis_total"):
+                        summary = generate_summary(text)
 
                 st.markdown("## 📊 Résumé & Audit")
                 st.markdown(summary)
+                store.save_summary(st.session_state.get("document_id"), summary, "prototype")
+                st.session_state.pop("archived_summary", None)
 
                 st.download_button(
                     "💾 Télécharger le résumé",
@@ -198,6 +217,10 @@ def main():
                     mime="text/markdown"
                 )
 
+        elif not uploaded and st.session_state.get("archived_summary"):
+            st.markdown("## 📊 Résumé & Audit (archive)")
+            st.markdown(st.session_state["archived_summary"])
+
     with tab2:
         if "pdf_text" not in st.session_state:
             st.info("Analysez d’abord un document")
@@ -211,6 +234,11 @@ def main():
                     )
                 st.markdown(answer)
 
+    # Panneau de performances (en fin de script pour inclure les mesures de ce rerun)
+    with st.sidebar:
+        metrics.REGISTRY.observe("script_run", time.perf_counter() - RUN_START)
+        render_metrics_panel()
+
 # ======================================================
 # LANCEMENT
 # ======================================================
@@ -0,0 +1,5 @@
+"""Briques partagées par les applications d'analyse financière.
+
+Les scripts Streamlit (``0X_.../app.py``) ajoutent la racine du dépôt au
+``sys.path`` puis importent ces modules, qui ne dépendent pas de Streamlit.
+"""
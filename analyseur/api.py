@@ -0,0 +1,372 @@
+"""API HTTP (ASGI) de l'analyseur, pour les outils internes et les tests de charge.
+
+Routes :
+
+- ``POST /documents?name=...&max_length=...`` : corps = PDF brut ; extraction
+- ``GET  /documents/{id}`` : description du document
+- ``POST /documents/{id}/summary`` : lance un résumé en tâche de fond
+- ``GET  /jobs/{id}`` : état d'une tâche
+- ``POST /documents/{id}/questions`` : ``{"question": ..., "stream": true}``
+  renvoie la réponse en Server-Sent Events ou en JSON
+- ``POST /documents/{id}/checklist`` : ``{"questions": [...]}`` (ou ``"text"``,
+  une question par ligne) ; réponses groupées, en JSON ou en CSV (``"format": "csv"``)
+- ``GET  /documents/{id}/results`` : résultats déjà calculés
+- ``GET  /search?q=...&limit=20`` : recherche plein texte dans l'archive
+- ``GET  /search/semantic?q=...&k=10`` : passages proches par le sens (index vectoriel)
+- ``GET  /usage?by=user&days=7`` : tokens consommés (``analyseur.budget``) ;
+  en-têtes ``X-Analyseur-User`` / ``X-Analyseur-Session`` pour l'attribution
+- ``GET  /metrics`` (OpenMetrics), ``GET /health``
+
+Lancement hors ligne avec le modèle simulé :
+``python -m analyseur.api --backend mock --port 8800`` (nécessite uvicorn).
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from urllib.parse import parse_qs
+
+from . import budget, store
+from .checklist import parse_questions, to_csv
+from .metrics import REGISTRY
+from .service import ServiceBusy, UnknownDocument, get_service
+
+# Taille maximale d'un PDF envoyé (octets), alignée sur maxUploadSize de Streamlit
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _read_body(receive, limit=MAX_UPLOAD_BYTES):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(400, "Client déconnecté")
+        body = message.get("body", b"")
+        size += len(body)
+        if size > limit:
+            raise HTTPError(413, "Document trop volumineux")
+        chunks.append(body)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _read_json(receive):
+    body = await _read_body(receive, limit=1024 * 1024)
+    if not body:
+        return {}
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, "JSON invalide")
+    if not isinstance(parsed, dict):
+        raise HTTPError(400, "Le corps JSON doit être un objet")
+    return parsed
+
+
+def _number(source, field, default, cast=int):
+    """Paramètre numérique de la requête ou du corps JSON ; erreur 400 s'il est invalide"""
+    value = source.get(field)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"Paramètre '{field}' invalide : {value!r}")
+
+
+def _text(source, field, required=False):
+    """Champ texte du corps JSON (None s'il est absent) ; erreur 400 s'il n'est pas une chaîne"""
+    value = source.get(field)
+    if value is None and not required:
+        return None
+    if not isinstance(value, str) or (required and not value.strip()):
+        raise HTTPError(400, f"Champ '{field}' requis (texte)" if required else f"Champ '{field}' : texte attendu")
+    return value.strip() if required else value
+
+
+async def _send(send, status, body, content_type="application/json; charset=utf-8"):
+    if not isinstance(body, bytes):
+        body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AnalyzerAPI:
+    """Application ASGI minimale (sans framework) autour d'``AnalyzerService``.
+
+    ``max_concurrency`` borne le nombre de requêtes coûteuses (extraction,
+    questions) traitées simultanément ; les suivantes attendent leur tour.
+    """
+
+    def __init__(self, service=None, max_concurrency=None):
+        self._service = service
+        self.max_concurrency = int(max_concurrency or os.getenv("ANALYSEUR_API_CONCURRENCY", "8"))
+        self._semaphore = None
+        self.routes = [
+            ("GET", re.compile(r"^/health$"), self.health),
+            ("GET", re.compile(r"^/metrics$"), self.metrics),
+            ("POST", re.compile(r"^/documents$"), self.upload),
+            ("GET", re.compile(r"^/documents/(?P<document_id>[0-9a-f]{64})$"), self.get_document),
+            ("POST", re.compile(r"^/documents/(?P<document_id>[0-9a-f]{64})/summary$"), self.summary),
+            ("POST", re.compile(r"^/documents/(?P<document_id>[0-9a-f]{64})/questions$"), self.question),
+            ("POST", re.compile(r"^/documents/(?P<document_id>[0-9a-f]{64})/checklist$"), self.checklist),
+            ("GET", re.compile(r"^/documents/(?P<document_id>[0-9a-f]{64})/results$"), self.results),
+            ("GET", re.compile(r"^/jobs/(?P<job_id>[0-9a-f]{32})$"), self.get_job),
+            ("GET", re.compile(r"^/search$"), self.search),
+            ("GET", re.compile(r"^/search/semantic$"), self.semantic_search),
+            ("GET", re.compile(r"^/usage$"), self.usage),
+        ]
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = get_service()
+        return self._service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        query = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        # Appelant pour le décompte des tokens (propre à la tâche asyncio de cette requête)
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        client = scope.get("client") or ("api", 0)
+        budget.set_caller(
+            user=headers.get("x-analyseur-user") or f"api:{client[0]}",
+            session=headers.get("x-analyseur-session"),
+        )
+        path_matched = False
+        for method, pattern, handler in self.routes:
+            match = pattern.match(scope["path"])
+            if not match:
+                continue
+            path_matched = True
+            if method != scope["method"]:
+                continue
+            try:
+                with REGISTRY.timer(f"api_{handler.__name__}"):
+                    await handler(send, receive, query, **match.groupdict())
+            except HTTPError as e:
+                await _send(send, e.status, {"error": e.message})
+            except UnknownDocument as e:
+                await _send(send, 404, {"error": f"Document inconnu : {e.args[0]}"})
+            except ServiceBusy as e:
+                await _send(send, 429, {"error": f"Service saturé : {e}"})
+            except budget.BudgetExceeded as e:
+                await _send(send, 429, {"error": str(e)})
+            return
+        await _send(send, 405 if path_matched else 404, {"error": "Route inconnue"})
+
+    async def _in_worker(self, fn, *args):
+        """Exécute ``fn`` sur le pool de workers partagé, sous le sémaphore"""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.service.executor, budget.carry(fn), *args)
+
+    async def _call_model(self, fn, *args):
+        """Comme ``_in_worker`` ; une panne du modèle (Ollama arrêté, OpenRouter en erreur) devient un 502"""
+        try:
+            return await self._in_worker(fn, *args)
+        except (HTTPError, UnknownDocument, ServiceBusy, budget.BudgetExceeded):
+            raise
+        except Exception as e:
+            REGISTRY.incr("api_backend_errors")
+            raise HTTPError(502, f"Erreur du modèle : {e}")
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+    async def health(self, send, receive, query):
+        await _send(send, 200, {"status": "ok", "backend": self.service.backend, "model": self.service.model})
+
+    async def metrics(self, send, receive, query):
+        await _send(send, 200, REGISTRY.to_openmetrics().encode("utf-8"),
+                    "application/openmetrics-text; version=1.0.0; charset=utf-8")
+
+    async def upload(self, send, receive, query):
+        data = await _read_body(receive)
+        if not data.startswith(b"%PDF"):
+            raise HTTPError(415, "Le corps de la requête doit être un PDF")
+        max_length = _number(query, "max_length", 120000)
+        try:
+            document = await self._in_worker(self.service.add_document, data, query.get("name"), max_length)
+        except Exception as e:
+            raise HTTPError(422, f"Erreur lors de la lecture du PDF: {e}")
+        await _send(send, 201, self.service.describe(document))
+
+    async def get_document(self, send, receive, query, document_id):
+        document = await self._in_worker(self.service.document, document_id)
+        await _send(send, 200, self.service.describe(document))
+
+    async def summary(self, send, receive, query, document_id):
+        body = await _read_json(receive)
+        job = await self._in_worker(
+            self.service.submit_summary, document_id,
+            _number(body, "summary_length", 300), _number(body, "temperature", 0.3, float), _text(body, "model"),
+        )
+        await _send(send, 200 if job.cached else 202, job.to_dict())
+
+    async def get_job(self, send, receive, query, job_id):
+        job = self.service.job(job_id)
+        if job is None:
+            raise HTTPError(404, f"Tâche inconnue : {job_id}")
+        await _send(send, 200, job.to_dict())
+
+    async def results(self, send, receive, query, document_id):
+        await _send(send, 200, await self._in_worker(self.service.results, document_id))
+
+    async def search(self, send, receive, query):
+        if not query.get("q", "").strip():
+            raise HTTPError(400, "Paramètre 'q' requis")
+        hits = await self._in_worker(self.service.search, query["q"], _number(query, "limit", 20))
+        await _send(send, 200, {"query": query["q"], "hits": hits})
+
+    async def semantic_search(self, send, receive, query):
+        if not query.get("q", "").strip():
+            raise HTTPError(400, "Paramètre 'q' requis")
+        hits = await self._call_model(self.service.semantic_search, query["q"], _number(query, "k", 10))
+        await _send(send, 200, {"query": query["q"], "hits": hits})
+
+    async def usage(self, send, receive, query):
+        by = query.get("by", "user")
+        if by not in store.DocumentStore.USAGE_GROUPS:
+            raise HTTPError(400, f"Paramètre 'by' parmi : {', '.join(store.DocumentStore.USAGE_GROUPS)}")
+        days = _number(query, "days", None, float)
+        await _send(send, 200, {"by": by, "days": days, "usage": await self._in_worker(self.service.usage, by, days)})
+
+    async def question(self, send, receive, query, document_id):
+        body = await _read_json(receive)
+        question = _text(body, "question", required=True)
+        args = (document_id, question, _number(body, "temperature", 0.1, float), _text(body, "model"))
+        await self._in_worker(self.service.document, document_id)
+
+        if not body.get("stream"):
+            answer = await self._call_model(self.service.answer, *args)
+            await _send(send, 200, {"question": question, "answer": answer})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache")],
+        })
+        async for event, data in self._stream(args):
+            payload = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            await send({"type": "http.response.body", "body": payload.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def checklist(self, send, receive, query, document_id):
+        body = await _read_json(receive)
+        questions = body.get("questions") or parse_questions(_text(body, "text") or "")
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            raise HTTPError(400, "Champ 'questions' (liste de textes) ou 'text' requis")
+        questions = [q.strip() for q in questions if q.strip()]
+        if not questions:
+            raise HTTPError(400, "Champ 'questions' (liste de textes) ou 'text' requis")
+        temperature = _number(body, "temperature", 0.1, float)
+        model = _text(body, "model")
+        await self._in_worker(self.service.document, document_id)
+        rows, stats = await self._call_model(self.service.checklist, document_id, questions, temperature, model)
+        if body.get("format") == "csv":
+            await _send(send, 200, to_csv(rows).encode("utf-8"), "text/csv; charset=utf-8")
+            return
+        await _send(send, 200, {"answers": rows, "stats": stats})
+
+    async def _stream(self, args):
+        """Relaie vers l'event loop les morceaux produits par un worker"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def produce():
+            try:
+                for piece in self.service.stream_answer(*args):
+                    loop.call_soon_threadsafe(queue.put_nowait, ("token", piece))
+                loop.call_soon_threadsafe(queue.put_nowait, ("done", ""))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", str(e)))
+
+        async with self._semaphore:
+            future = loop.run_in_executor(self.service.executor, budget.carry(produce))
+            while True:
+                event, data = await queue.get()
+                yield event, data
+                if event != "token":
+                    break
+            await future
+
+
+app = AnalyzerAPI()
+
+_server_thread = None
+_server_lock = threading.Lock()
+
+
+def start_api_server(port=None, host="127.0.0.1"):
+    """Lance l'API dans un thread du processus courant (Streamlit) ; idempotent.
+
+    Le port vient de ``ANALYSEUR_API_PORT`` ; sans port, rien n'est lancé.
+    L'API partage alors le pool de workers et les caches de l'interface.
+    """
+    global _server_thread
+    port = port or os.getenv("ANALYSEUR_API_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server_thread is None:
+            import uvicorn
+
+            server = uvicorn.Server(uvicorn.Config(app, host=host, port=int(port), log_level="warning"))
+            # Le serveur tourne hors du thread principal : pas de gestion des signaux
+            server.install_signal_handlers = lambda: None
+            _server_thread = threading.Thread(target=server.run, name="analyseur-api", daemon=True)
+            _server_thread.start()
+        return _server_thread
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="API HTTP de l'analyseur financier")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--backend", choices=["ollama", "openrouter", "mock"], help="défaut : ANALYSEUR_BACKEND")
+    parser.add_argument("--model", help="défaut : ANALYSEUR_MODEL")
+    parser.add_argument("--workers", type=int, help="taille du pool (défaut : ANALYSEUR_WORKERS)")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        os.environ["ANALYSEUR_BACKEND"] = args.backend
+    if args.model:
+        os.environ["ANALYSEUR_MODEL"] = args.model
+    if args.workers:
+        os.environ["ANALYSEUR_WORKERS"] = str(args.workers)
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Audit de cohérence des indicateurs repérés (``figures``), vectorisé avec pandas.
+
+Tous les contrôles s'appliquent en une passe à un tableau d'indicateurs
+couvrant un ou plusieurs milliers de documents :
+
+- ``bilan`` : total actif = passif + capitaux propres (ou total passif,
+  quand celui-ci inclut déjà les capitaux propres)
+- ``dette_nette`` : dette nette = dette brute − trésorerie
+- ``marge`` : marge publiée (%) = résultat / chiffre d'affaires
+- ``variation`` : écart d'une année à l'autre au-delà de ``SWING``, ou
+  changement de signe
+- ``echelle`` / ``devise`` : même indicateur et même période lus à un
+  facteur 1 000 près (échelle oubliée) ou dans deux devises
+
+Chaque anomalie est une ligne (colonnes ``COLUMNS``) avec le document, la
+période, les pages où lire les chiffres, la valeur attendue et la valeur
+publiée.
+
+Hors interface : ``python -m analyseur.audit [--csv anomalies.csv]`` audite
+toute l'archive.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .metrics import REGISTRY
+
+# Écart relatif toléré pour les identités comptables (arrondis des rapports)
+TOLERANCE = 0.02
+# Écart toléré entre marge publiée et marge recalculée (points de %)
+MARGIN_TOLERANCE = 1.0
+# Variation d'une année sur l'autre signalée au-delà de ce ratio
+SWING = 0.5
+# Facteurs d'échelle recherchés entre deux lectures d'un même chiffre (puissances de 10)
+SCALE_STEPS = (3, 6, 9)
+
+MONETARY = [
+    "chiffre_affaires", "ebitda", "ebit", "resultat_net", "dette_brute", "dette_nette", "tresorerie",
+    "capex", "fcf", "total_actif", "total_passif", "capitaux_propres",
+]
+COLUMNS = ["document_id", "check", "indicator", "period", "pages", "expected", "observed", "gap", "message"]
+
+
+def figures_frame(figures, document_id=None):
+    """Indicateurs (``figures.extract_figures`` ou ``store.figures``) -> DataFrame"""
+    frame = pd.DataFrame.from_records(
+        figures, columns=["document_id", "indicator", "value", "unit", "scale", "period", "page", "raw"]
+    )
+    if document_id is not None:
+        frame["document_id"] = document_id
+    frame["unit"] = frame["unit"].fillna("").astype(str)
+    frame["period"] = frame["period"].fillna("").astype(str)
+    frame["value"] = frame["value"].astype(float)
+    return frame
+
+
+def _empty():
+    return pd.DataFrame(columns=COLUMNS)
+
+
+def _values(frame):
+    """Première occurrence (page la plus basse) de chaque indicateur monétaire.
+
+    Renvoie deux tableaux larges indexés par (document, période), une
+    colonne par indicateur : valeurs et pages.
+    """
+    monetary = frame[frame["indicator"].isin(MONETARY) & (frame["unit"] != "%")]
+    first = monetary.sort_values(["document_id", "page"]).drop_duplicates(["document_id", "period", "indicator"])
+    values = first.pivot(index=["document_id", "period"], columns="indicator", values="value")
+    pages = first.pivot(index=["document_id", "period"], columns="indicator", values="page")
+    return values.reindex(columns=MONETARY), pages.reindex(columns=MONETARY)
+
+
+def _pages(pages):
+    """Colonnes de numéros de page -> texte par ligne (« 12, 14 »)"""
+    return pd.Series(
+        [", ".join(str(int(p)) for p in sorted(set(row[~np.isnan(row)]))) for row in pages.to_numpy(float)],
+        index=pages.index,
+    )
+
+
+def _violations(mask, check, indicator, expected, observed, pages, message):
+    """Lignes d'anomalie là où ``mask`` est vrai (``indicator`` None : pris dans l'index).
+
+    ``pages`` : colonnes de numéros de page à citer, mises en texte pour ces seules lignes.
+    """
+    mask = mask.fillna(False).astype(bool)
+    if not mask.any():
+        return _empty()
+    rows = pd.DataFrame({
+        "expected": expected[mask],
+        "observed": observed[mask],
+        "pages": _pages(pages[mask]),
+        "message": pd.Series(message, index=mask.index)[mask],
+    }).reset_index()
+    rows["check"] = check
+    if indicator is not None:
+        rows["indicator"] = indicator
+    rows["gap"] = rows["observed"] - rows["expected"]
+    return rows[COLUMNS]
+
+
+def check_balance_sheet(values, pages, tolerance=TOLERANCE):
+    assets, liabilities, equity = values["total_actif"], values["total_passif"], values["capitaux_propres"]
+    expected = liabilities + equity
+    # Le « total passif » des bilans français inclut souvent les capitaux propres
+    mask = ((assets - expected).abs() > tolerance * assets.abs()) & (
+        (assets - liabilities).abs() > tolerance * assets.abs()
+    )
+    return _violations(
+        mask, "bilan", "total_actif", expected, assets,
+        pages[["total_actif", "total_passif", "capitaux_propres"]],
+        "Total actif différent de passif + capitaux propres",
+    )
+
+
+def check_net_debt(values, pages, tolerance=TOLERANCE):
+    gross, cash, net = values["dette_brute"], values["tresorerie"], values["dette_nette"]
+    expected = gross - cash
+    return _violations(
+        (net - expected).abs() > tolerance * gross.abs(), "dette_nette", "dette_nette", expected, net,
+        pages[["dette_brute", "tresorerie", "dette_nette"]],
+        "Dette nette différente de dette brute − trésorerie",
+    )
+
+
+def check_margin(frame, values, pages, tolerance=MARGIN_TOLERANCE):
+    """Marge publiée (%) comparée au plus proche des ratios résultat net, EBIT ou EBITDA / CA"""
+    published = frame[(frame["indicator"] == "marge") & (frame["unit"] == "%")]
+    published = published.sort_values(["document_id", "page"]).drop_duplicates(["document_id", "period"])
+    published = published.set_index(["document_id", "period"])
+    if published.empty:
+        return _empty()
+    aligned = values.reindex(published.index)
+    revenue = aligned["chiffre_affaires"].where(aligned["chiffre_affaires"] != 0)
+    candidates = aligned[["resultat_net", "ebit", "ebitda"]].div(revenue, axis=0) * 100
+    gaps = candidates.sub(published["value"], axis=0).abs()
+    closest = np.argmin(gaps.fillna(np.inf).to_numpy(), axis=1)
+    expected = pd.Series(candidates.to_numpy()[np.arange(len(candidates)), closest], index=candidates.index)
+    basis = pd.Series(candidates.columns.to_numpy()[closest], index=candidates.index)
+    page_frame = pages.reindex(published.index).assign(marge=published["page"])
+    return _violations(
+        gaps.min(axis=1) > tolerance, "marge", "marge", expected, published["value"],
+        page_frame[["marge", "chiffre_affaires"]],
+        "Marge publiée différente du ratio " + basis + " / chiffre_affaires",
+    )
+
+
+def check_swings(values, pages, threshold=SWING):
+    """Variations d'une année sur l'autre au-delà de ``threshold``, ou changement de signe"""
+    keys = ["document_id", "period"]
+    long = values.reset_index().melt(id_vars=keys, var_name="indicator", value_name="value").merge(
+        pages.reset_index().melt(id_vars=keys, var_name="indicator", value_name="page"), on=[*keys, "indicator"]
+    )
+    long["year"] = pd.to_numeric(long["period"].str.extract(r"^((?:19|20)\d{2})$", expand=False), errors="coerce")
+    long = long.dropna(subset=["value", "year"]).sort_values(["document_id", "indicator", "year"], ignore_index=True)
+    grouped = long.groupby(["document_id", "indicator"], sort=False)
+    previous, previous_page = grouped["value"].shift(), grouped["page"].shift()
+    change = (long["value"] - previous) / previous.abs().where(previous != 0)
+    flip = (np.sign(long["value"]) * np.sign(previous)) < 0
+    mask = previous.notna() & ((change.abs() > threshold) | flip)
+    if not mask.any():
+        return _empty()
+    rows = long[mask].assign(
+        check="variation", expected=previous[mask], observed=long["value"][mask],
+        gap=(long["value"] - previous)[mask],
+    )
+    rows["pages"] = [", ".join(str(int(p)) for p in sorted({a, b})) for a, b in zip(previous_page[mask], rows["page"])]
+    rows["message"] = [
+        "Changement de signe sur un an" if f else f"Variation de {c:+.0%} sur un an"
+        for f, c in zip(flip[mask], change[mask])
+    ]
+    return rows[COLUMNS]
+
+
+def check_scales(frame):
+    """Même chiffre lu à des échelles ou dans des devises différentes (document, indicateur, période)"""
+    keys = ["document_id", "indicator", "period"]
+    monetary = frame[frame["indicator"].isin(MONETARY) & (frame["unit"] != "%") & (frame["value"] != 0)]
+    monetary = monetary.assign(magnitude=np.log10(monetary["value"].abs()))
+    if monetary.empty:
+        return _empty()
+    grouped = monetary.groupby(keys)
+    low = monetary.loc[grouped["magnitude"].idxmin()].set_index(keys)
+    high = monetary.loc[grouped["magnitude"].idxmax()].set_index(keys)
+    width = high["magnitude"] - low["magnitude"]
+    # Facteur 1 000, 1 000 000... à 12 % près : l'unité manque sur l'une des lectures
+    steps = np.rint(width)
+    pages = pd.DataFrame({"low": low["page"], "high": high["page"]})
+    scale_rows = _violations(
+        steps.isin(SCALE_STEPS) & ((width - steps).abs() < 0.05), "echelle", None, high["value"], low["value"],
+        pages, "Même indicateur à un facteur 10^" + steps.astype(int).astype(str) + " près : échelle à vérifier",
+    )
+
+    priced = monetary[monetary["unit"].isin(["EUR", "USD"])]
+    units = priced.groupby(keys)["unit"].nunique()
+    # Pages listées pour les seuls groupes en anomalie (agrégation Python coûteuse)
+    mixed = priced[priced.set_index(keys).index.isin(units[units > 1].index)]
+    currency_rows = mixed.groupby(keys)["page"].agg(
+        lambda p: ", ".join(str(int(x)) for x in sorted(set(p)))
+    ).rename("pages").reset_index().assign(
+        check="devise", expected=np.nan, observed=np.nan, gap=np.nan,
+        message="Même indicateur publié en EUR et en USD",
+    )[COLUMNS]
+    return _concat([scale_rows, currency_rows])
+
+
+def _concat(parts):
+    parts = [part for part in parts if not part.empty]
+    return pd.concat(parts, ignore_index=True) if parts else _empty()
+
+
+def run_audit(frame):
+    """Toutes les anomalies d'un tableau d'indicateurs (``figures_frame``), triées par document"""
+    if frame.empty:
+        return _empty()
+    with REGISTRY.timer("audit_checks", figures=len(frame)):
+        values, pages = _values(frame)
+        violations = _concat([
+            check_balance_sheet(values, pages),
+            check_net_debt(values, pages),
+            check_margin(frame, values, pages),
+            check_swings(values, pages),
+            check_scales(frame),
+        ])
+    REGISTRY.incr("audit_violations", len(violations))
+    return violations.sort_values(["document_id", "check", "indicator", "period"], ignore_index=True)
+
+
+def _amount(value):
+    return f"{value:,.0f}".replace(",", "\u202f")
+
+
+def report(violations, indicators=None):
+    """Anomalies en liste Markdown (limitées à ``indicators`` si fourni)"""
+    if indicators:
+        violations = violations[violations["indicator"].isin(indicators)]
+    if violations.empty:
+        return "✅ Aucune incohérence majeure détectée"
+    lines = []
+    for row in violations.itertuples(index=False):
+        period = f" {row.period}" if row.period else ""
+        detail = ""
+        if row.check == "marge":
+            detail = f" : recalculée {row.expected:.1f} %, publiée {row.observed:.1f} %"
+        elif row.check == "variation":
+            detail = f" : {_amount(row.expected)} → {_amount(row.observed)}"
+        elif pd.notna(row.expected):
+            detail = f" : attendu {_amount(row.expected)}, publié {_amount(row.observed)}"
+        lines.append(f"- ⚠️ **{row.indicator}{period}** — {row.message}{detail} (p. {row.pages})")
+    return "\n".join(lines)
+
+
+def audit_archive(archive=None):
+    """Anomalies de tous les documents archivés, en une passe"""
+    from . import store
+
+    archive = archive or store.get_store()
+    if archive is None:
+        return _empty()
+    return run_audit(figures_frame(archive.figures()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit de cohérence des indicateurs de l'archive")
+    parser.add_argument("--csv", help="fichier de sortie (sinon sortie standard)")
+    args = parser.parse_args(argv)
+    violations = audit_archive()
+    violations.to_csv(args.csv or sys.stdout, index=False)
+    if args.csv:
+        print(f"{len(violations)} anomalies -> {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
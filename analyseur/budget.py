@@ -0,0 +1,301 @@
+"""Comptage des tokens par session, utilisateur et document, et garde-fou budgétaire.
+
+Chaque appel au modèle est attribué à l'appelant courant (``set_caller`` /
+``caller`` : session, utilisateur, document), avec les tokens réellement
+consommés (champ ``usage`` d'OpenRouter, compteurs d'évaluation d'Ollama).
+Les consommations sont archivées (table ``usage``) pour les rapports :
+``python -m analyseur.budget --by user``.
+
+Budgets : ``ANALYSEUR_BUDGETS`` (ex. ``user=2000000,session=300000,document=500000``)
+en tokens par fenêtre de ``ANALYSEUR_BUDGET_WINDOW`` secondes (défaut un
+jour). Avant un nouvel appel, la part consommée (appel compris, estimé) de
+la portée la plus entamée décide du traitement (seuils
+``ANALYSEUR_BUDGET_STEPS``, défaut ``0.8,0.9``) :
+
+1. en dessous du premier seuil : appel normal
+2. ``reduced`` : contexte réduit (``ANALYSEUR_BUDGET_CONTEXT``, défaut la moitié)
+3. ``cheaper`` : contexte réduit et modèle moins cher (``ANALYSEUR_CHEAP_MODELS``,
+   ex. ``openrouter=mistralai/mistral-7b-instruct,ollama=llama3.2:3b``)
+4. budget épuisé : réponse déjà archivée pour la même question (ou dernier
+   résumé), sinon refus (``BudgetExceeded``)
+
+Les précalculs, spéculatifs, sont refusés dès le premier seuil.
+"""
+import argparse
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from . import prompts, store
+from .metrics import REGISTRY, log_event
+
+SCOPES = ("session", "user", "document")
+
+_caller = contextvars.ContextVar("analyseur_caller", default={})
+
+
+class BudgetExceeded(RuntimeError):
+    """Budget de tokens épuisé, sans réponse archivée à servir"""
+
+
+# ======================================================
+# APPELANT COURANT
+# ======================================================
+def set_caller(**fields):
+    """Appelant du contexte courant ; une valeur peut être une fonction (lue à chaque appel)"""
+    _caller.set({k: v for k, v in fields.items() if k in SCOPES})
+
+
+@contextmanager
+def caller(**fields):
+    """Complète ou remplace des champs de l'appelant le temps d'un bloc"""
+    token = _caller.set({**_caller.get(), **{k: v for k, v in fields.items() if k in SCOPES}})
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def current():
+    """``{session, user, document}`` de l'appelant courant (None si inconnu)"""
+    fields = _caller.get()
+    resolved = {}
+    for scope in SCOPES:
+        value = fields.get(scope)
+        resolved[scope] = value() if callable(value) else value
+    return resolved
+
+
+def carry(fn):
+    """``fn`` exécutée ailleurs (pool, callback) pour le compte de l'appelant actuel"""
+    who = current()
+
+    def run(*args, **kwargs):
+        token = _caller.set(who)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _caller.reset(token)
+
+    return run
+
+
+# ======================================================
+# RÉGLAGES
+# ======================================================
+def limits():
+    """``{portée: tokens}`` d'après ``ANALYSEUR_BUDGETS`` (vide : comptage seul)"""
+    parsed = {}
+    for item in os.getenv("ANALYSEUR_BUDGETS", "").split(","):
+        scope, _, value = item.partition("=")
+        if scope.strip() in SCOPES and value.strip():
+            parsed[scope.strip()] = int(value)
+    return parsed
+
+
+def window():
+    return float(os.getenv("ANALYSEUR_BUDGET_WINDOW", "86400"))
+
+
+def steps():
+    reduce_at, cheaper_at = (float(v) for v in os.getenv("ANALYSEUR_BUDGET_STEPS", "0.8,0.9").split(","))
+    return reduce_at, cheaper_at
+
+
+def cheaper_model(backend, model):
+    """Modèle de repli configuré pour ``backend`` (ou ``model`` lui-même)"""
+    for item in os.getenv("ANALYSEUR_CHEAP_MODELS", "").split(","):
+        name, _, cheap = item.partition("=")
+        if name.strip() == backend and cheap.strip():
+            return cheap.strip()
+    return model
+
+
+# ======================================================
+# CONSOMMATION
+# ======================================================
+class Ledger:
+    """Tokens consommés par portée dans la fenêtre courante.
+
+    Tenu en mémoire, et repris de l'archive au changement de fenêtre (ou au
+    démarrage du processus).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._window = None
+        self._used = {}
+
+    def _roll(self):
+        start = time.time() // window() * window()
+        if start == self._window:
+            return
+        self._window = start
+        self._used = {}
+        archive = store.get_store()
+        if archive is not None:
+            for scope in SCOPES:
+                for row in archive.usage_report(scope, since=start):
+                    self._used[(scope, row["key"])] = row["tokens"]
+
+    def used(self, scope, key):
+        with self._lock:
+            self._roll()
+            return self._used.get((scope, key), 0)
+
+    def add(self, who, tokens):
+        with self._lock:
+            self._roll()
+            for scope in SCOPES:
+                if who.get(scope) is not None:
+                    self._used[(scope, who[scope])] = self._used.get((scope, who[scope]), 0) + tokens
+
+
+LEDGER = Ledger()
+
+
+def record(who, backend, model, stage, usage, action="full"):
+    """Attribue un appel terminé (ou refusé) à l'appelant ``who``"""
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    LEDGER.add(who, prompt_tokens + completion_tokens)
+    if action != "full":
+        REGISTRY.incr(f"budget_{action}")
+    archive = store.get_store()
+    if archive is not None:
+        archive.save_usage(who, backend, model, stage, prompt_tokens, completion_tokens, action)
+
+
+def estimate(messages, params=None):
+    """Tokens d'un appel avant envoi : ~4 caractères par token, plus la réponse maximale"""
+    params = params or {}
+    completion = params.get("num_predict") or params.get("max_tokens") or 500
+    return sum(len(m["content"]) for m in messages) // 4 + int(completion)
+
+
+def pressure(who, tokens):
+    """``(part consommée appel compris, portée)`` de la portée la plus entamée"""
+    worst, worst_scope = 0.0, None
+    for scope, limit in limits().items():
+        if who.get(scope) is None or limit <= 0:
+            continue
+        ratio = (LEDGER.used(scope, who[scope]) + tokens) / limit
+        if ratio > worst:
+            worst, worst_scope = ratio, scope
+    return worst, worst_scope
+
+
+def precompute_allowed(who, tokens=0):
+    """Précalcul permis : aucune portée de ``who`` n'atteint le premier seuil (sans rien archiver)"""
+    if not limits():
+        return True
+    return pressure(who, tokens)[0] < steps()[0]
+
+
+# ======================================================
+# DÉGRADATION
+# ======================================================
+def reduce_context(messages, share=None):
+    """Raccourcit le plus long message (le texte du document), à une limite de page si possible"""
+    share = float(share or os.getenv("ANALYSEUR_BUDGET_CONTEXT", "0.5"))
+    longest = max(range(len(messages)), key=lambda i: len(messages[i]["content"]))
+    content = messages[longest]["content"]
+    cut = int(len(content) * share)
+    boundary = content.rfind("=== [PAGE", 0, cut)
+    if boundary > cut // 2:
+        cut = boundary
+    reduced = list(messages)
+    reduced[longest] = {**messages[longest], "content": content[:cut]}
+    return reduced
+
+
+def archived_answer(who, messages, stage):
+    """Réponse déjà archivée pour la même question sur le même document (ou dernier résumé)"""
+    archive = store.get_store()
+    if archive is None or not who.get("document"):
+        return None
+    if stage.endswith("summary"):
+        return archive.latest_summary(who["document"])
+    question = prompts.question_of(messages)
+    return archive.find_answer(who["document"], question) if question else None
+
+
+def govern(who, backend, model, messages, params=None, stage="llm"):
+    """Applique le budget de ``who`` à un nouvel appel.
+
+    Renvoie ``(modèle, messages, réponse archivée, action)`` ; lève
+    ``BudgetExceeded`` si le budget est épuisé et qu'aucune réponse archivée
+    ne peut être servie.
+    """
+    if not limits():
+        return model, messages, None, "full"
+    ratio, scope = pressure(who, estimate(messages, params))
+    reduce_at, cheaper_at = steps()
+    if ratio < reduce_at:
+        return model, messages, None, "full"
+
+    action = "reduced" if ratio < cheaper_at else "cheaper" if ratio < 1 else "archived"
+    reduced = reduce_context(messages)
+    if action == "archived" and not stage.startswith("precompute"):
+        # L'estimation portait sur le contexte complet : réduit, l'appel peut encore tenir
+        reduced_ratio, reduced_scope = pressure(who, estimate(reduced, params))
+        if reduced_ratio < 1:
+            action, ratio, scope = "cheaper", reduced_ratio, reduced_scope
+    if stage.startswith("precompute"):
+        action = "rejected"
+    elif action == "archived":
+        fallback = archived_answer(who, messages, stage)
+        if fallback is not None:
+            record(who, backend, model, stage, {}, "archived")
+            log_event("budget", action="archived", scope=scope, ratio=round(ratio, 3), stage=stage)
+            return model, messages, fallback, "archived"
+        action = "rejected"
+    log_event("budget", action=action, scope=scope, ratio=round(ratio, 3), stage=stage)
+
+    if action == "rejected":
+        record(who, backend, model, stage, {}, "rejected")
+        raise BudgetExceeded(f"Budget de tokens épuisé ({scope} : {who[scope]}, {ratio:.0%} consommé)")
+    messages = reduced
+    if action == "cheaper":
+        model = cheaper_model(backend, model)
+    return model, messages, None, action
+
+
+# ======================================================
+# RAPPORTS
+# ======================================================
+def report(by="user", days=None):
+    """Consommation groupée par ``by`` (``session``, ``user``, ``document``, ``model``, ``stage``...)"""
+    archive = store.get_store()
+    if archive is None:
+        return []
+    since = time.time() - days * 86400 if days else 0
+    return archive.usage_report(by, since)
+
+
+def remaining(who=None):
+    """``{portée: (consommé, budget)}`` pour l'appelant (courant par défaut)"""
+    who = who or current()
+    return {
+        scope: (LEDGER.used(scope, who[scope]), limit)
+        for scope, limit in limits().items()
+        if who.get(scope) is not None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consommation de tokens archivée")
+    parser.add_argument("--by", default="user", choices=list(store.DocumentStore.USAGE_GROUPS))
+    parser.add_argument("--days", type=float, help="derniers jours seulement")
+    args = parser.parse_args(argv)
+    rows = report(args.by, args.days)
+    print(f"{args.by:<40}{'appels':>8}{'prompt':>12}{'réponse':>12}{'dégradés':>10}{'refusés':>9}")
+    for row in rows:
+        print(f"{str(row['key'])[:39]:<40}{row['calls']:>8}{row['prompt_tokens']:>12,}"
+              f"{row['completion_tokens']:>12,}{row['degraded']:>10}{row['rejected']:>9}")
+
+
+if __name__ == "__main__":
+    main()
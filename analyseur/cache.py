@@ -0,0 +1,88 @@
+"""Caches LRU partagés par le processus (Streamlit et API HTTP)."""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .metrics import REGISTRY
+
+
+def make_key(*parts):
+    """Clé stable (SHA-256) à partir d'éléments sérialisables en JSON"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Cache LRU thread-safe dont les succès/échecs alimentent les métriques.
+
+    ``on_evict(clé, valeur)`` est appelé (hors verrou) pour chaque entrée
+    sortie du cache, par éviction ou ``clear`` : fermeture de ressources.
+    """
+
+    def __init__(self, name, maxsize=128, on_evict=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                REGISTRY.cache_hit(self.name)
+                return self._data[key]
+        REGISTRY.cache_miss(self.name)
+        return default
+
+    def peek(self, key, default=None):
+        """Lecture sans effet sur l'ordre LRU ni sur les métriques"""
+        with self._lock:
+            return self._data.get(key, default)
+
+    def put(self, key, value):
+        evicted = []
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+        self._evicted(evicted)
+
+    def pop(self, key, default=None):
+        """Retire une entrée sans appeler ``on_evict`` (l'appelant en dispose)"""
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def resize(self, maxsize):
+        """Change la taille maximale ; les entrées en trop sortent (``on_evict`` appelé)"""
+        evicted = []
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+        self._evicted(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            evicted = list(self._data.items())
+            self._data.clear()
+        self._evicted(evicted)
+
+    def _evicted(self, items):
+        if self.on_evict is not None:
+            for key, value in items:
+                self.on_evict(key, value)
+
+
+# Réponses des modèles, indexées par (backend, modèle, messages, paramètres)
+ANSWERS = LRUCache("answers", maxsize=256)
@@ -0,0 +1,166 @@
+"""Réponse groupée à une liste de questions (checklist d'analyste).
+
+Les questions qui portent sur les mêmes pages (mêmes sections pertinentes,
+voir ``sections.kinds_for_question``) partagent un seul appel au modèle :
+l'extrait n'est envoyé qu'une fois et le modèle renvoie un JSON avec une
+réponse, une valeur et les pages citées par question. Sans sections, toutes
+les questions partagent le texte complet, par groupes de
+``ANALYSEUR_CHECKLIST_GROUP`` questions.
+"""
+import csv
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from . import budget, llm, prompts
+from . import sections as sectioning
+from .metrics import REGISTRY
+from .scheduler import SCHEDULER
+
+# Colonnes du tableau de réponses, dans l'ordre d'affichage et d'export
+COLUMNS = ("question", "reponse", "valeur", "pages", "groupe")
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)]|[a-zA-Z][.)])\s+")
+_JSON = re.compile(r"\{.*\}|\[.*\]", re.DOTALL)
+_NUMBERED = re.compile(r"^\s*(\d+)\s*[.):-]\s*(.+)$", re.MULTILINE)
+_PAGE_REF = re.compile(r"\bpages?\s+(\d+)", re.IGNORECASE)
+
+
+def parse_questions(text):
+    """Texte collé (une question par ligne, puces ou numéros tolérés) -> questions uniques"""
+    questions = []
+    for line in text.splitlines():
+        question = _BULLET.sub("", line).strip()
+        if question and question not in questions:
+            questions.append(question)
+    return questions
+
+
+def group_questions(questions, sections=None, max_group=None):
+    """Groupes de questions partageant le même contexte.
+
+    Renvoie une liste de ``(familles de sections, questions)`` ; des familles
+    vides désignent le texte complet.
+    """
+    max_group = max_group or int(os.getenv("ANALYSEUR_CHECKLIST_GROUP", "8"))
+    by_pages = {}
+    for question in questions:
+        kinds = sectioning.kinds_for_question(question) if sections else []
+        # Familles sans page dans ce document : même contexte que le texte complet
+        pages = frozenset(sectioning.pages_for(sections, kinds))
+        group_kinds, members = by_pages.setdefault(pages, ([], []))
+        if pages:
+            group_kinds.extend(k for k in kinds if k not in group_kinds)
+        members.append(question)
+    return [
+        (kinds, members[i:i + max_group])
+        for kinds, members in by_pages.values()
+        for i in range(0, len(members), max_group)
+    ]
+
+
+def parse_answers(raw, count):
+    """Réponse du modèle -> ``count`` dictionnaires ``reponse``, ``valeur``, ``pages``.
+
+    Tolère un JSON entouré de texte ou de balises Markdown, une liste nue, et
+    à défaut des lignes numérotées ``1. ...`` ; les questions sans réponse
+    exploitable valent « non précisé ».
+    """
+    answers = [{"reponse": "non précisé", "valeur": "", "pages": []} for _ in range(count)]
+    items = None
+    match = _JSON.search(raw or "")
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            items = data if isinstance(data, list) else data.get("reponses") or data.get("answers")
+        except (ValueError, AttributeError):
+            items = None
+    if isinstance(items, list):
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("id", position + 1)) - 1
+            except (TypeError, ValueError):
+                index = position
+            if not 0 <= index < count:
+                continue
+            text = str(item.get("reponse") or item.get("answer") or "").strip() or "non précisé"
+            pages = item.get("pages") or []
+            if not isinstance(pages, list):
+                pages = [pages]
+            answers[index] = {
+                "reponse": text,
+                "valeur": str(item.get("valeur") or item.get("value") or "").strip(),
+                "pages": sorted({int(p) for p in pages if str(p).strip().isdigit()}) or _pages_in(text),
+            }
+        return answers
+
+    REGISTRY.incr("checklist_unparsed")
+    for number, text in _NUMBERED.findall(raw or ""):
+        index = int(number) - 1
+        if 0 <= index < count:
+            answers[index] = {"reponse": text.strip(), "valeur": "", "pages": _pages_in(text)}
+    return answers
+
+
+def _pages_in(text):
+    return sorted({int(p) for p in _PAGE_REF.findall(text)})
+
+
+def answer_checklist(questions, text, sections=None, backend="ollama", model=None, params=None,
+                     api_key=None, max_group=None, max_workers=None):
+    """Répond à ``questions`` sur ``text`` en un appel par groupe de contexte.
+
+    Renvoie ``(lignes, statistiques)`` : une ligne par question (clés
+    ``COLUMNS``, dans l'ordre des questions) et le nombre d'appels, la taille
+    des extraits envoyés et celle qu'auraient coûtée des appels séparés.
+    """
+    groups = group_questions(questions, sections, max_group)
+    calls = []
+    for kinds, members in groups:
+        context = sectioning.focus_text(text, sections, kinds) if kinds else text
+        if sections:
+            context = f"Sommaire du document :\n{sectioning.table_of_contents(sections)}\n\n{context}"
+        call_params = dict(params or {})
+        call_params.setdefault("num_predict", 150 * len(members) + 100)
+        calls.append((members, context, call_params))
+
+    def ask(call):
+        members, context, call_params = call
+        messages = prompts.checklist_messages(members, context)
+        return llm.complete(backend, model, messages, call_params, api_key, stage="checklist",
+                            priority="interactive")
+
+    REGISTRY.incr("checklist_questions", len(questions))
+    REGISTRY.incr("checklist_calls", len(calls))
+    with REGISTRY.timer("checklist_total", questions=len(questions), calls=len(calls)):
+        workers = max_workers or max(1, min(len(calls), SCHEDULER.limits["interactive"]))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyseur-checklist") as pool:
+            raws = list(pool.map(budget.carry(ask), calls))
+
+    rows = {}
+    for number, ((members, _, _), raw) in enumerate(zip(calls, raws), start=1):
+        for question, answer in zip(members, parse_answers(raw, len(members))):
+            rows[question] = {"question": question, **answer, "groupe": number}
+    sent = sum(len(context) for _, context, _ in calls)
+    separate = sum(len(context) * len(members) for members, context, _ in calls)
+    REGISTRY.observe_value("checklist_context_ratio", sent / max(separate, 1))
+    stats = {"questions": len(questions), "calls": len(calls), "context_chars": sent, "separate_chars": separate}
+    return [rows[q] for q in questions if q in rows], stats
+
+
+def to_csv(rows):
+    """Tableau de réponses en CSV (pages séparées par des virgules)"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({**row, "pages": ", ".join(str(p) for p in row["pages"])})
+    return output.getvalue()
+
+
+def to_json(rows):
+    return json.dumps(rows, ensure_ascii=False, indent=2)
@@ -0,0 +1,186 @@
+"""Export de l'archive en jeux de données Parquet partitionnés (pyarrow).
+
+Quatre jeux, un dossier chacun sous ``ANALYSEUR_DATASETS`` (défaut
+``data/datasets``) :
+
+- ``documents`` : identifiant, nom, pages, caractères, date d'archivage
+- ``figures`` : indicateurs repérés (valeur, unité, échelle, période, page)
+- ``summary_sections`` : résumés générés découpés selon leurs titres Markdown
+- ``answers`` : questions/réponses avec modèle, durée et tokens
+
+Partitionnement Hive par jour d'archivage (``date=2025-01-31/``). Chaque
+export ajoute un fichier par partition touchée, sans réécrire l'existant :
+seules les lignes archivées depuis le précédent export sont écrites
+(``_state.json`` garde le dernier rowid exporté par table).
+
+Lecture : ``pyarrow.dataset.dataset(root / "figures", partitioning="hive")``
+ou ``pandas.read_parquet``. Hors interface : ``python -m analyseur.dataset``.
+"""
+import argparse
+import json
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from . import store
+from .metrics import REGISTRY
+
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent / "data" / "datasets"
+
+_TIMESTAMP = pa.timestamp("ms", tz="UTC")
+
+SCHEMAS = {
+    "documents": pa.schema([
+        ("document_id", pa.string()), ("name", pa.string()), ("pages", pa.int32()), ("chars", pa.int64()),
+        ("created", _TIMESTAMP), ("date", pa.string()),
+    ]),
+    "figures": pa.schema([
+        ("document_id", pa.string()), ("indicator", pa.string()), ("value", pa.float64()), ("unit", pa.string()),
+        ("scale", pa.float64()), ("period", pa.string()), ("page", pa.int32()), ("raw", pa.string()),
+        ("created", _TIMESTAMP), ("date", pa.string()),
+    ]),
+    "summary_sections": pa.schema([
+        ("document_id", pa.string()), ("model", pa.string()), ("params", pa.string()), ("position", pa.int32()),
+        ("level", pa.int8()), ("heading", pa.string()), ("text", pa.string()),
+        ("created", _TIMESTAMP), ("date", pa.string()),
+    ]),
+    "answers": pa.schema([
+        ("document_id", pa.string()), ("question", pa.string()), ("answer", pa.string()), ("model", pa.string()),
+        ("backend", pa.string()), ("seconds", pa.float64()), ("cached", pa.bool_()),
+        ("prompt_tokens", pa.int64()), ("completion_tokens", pa.int64()),
+        ("created", _TIMESTAMP), ("date", pa.string()),
+    ]),
+}
+
+# Jeu de données -> table de l'archive qui l'alimente
+SOURCES = {"documents": "documents", "figures": "figures", "summary_sections": "summaries", "answers": "answers"}
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$|^\*\*([^*]+)\*\*:?$")
+
+
+def dataset_root():
+    return Path(os.getenv("ANALYSEUR_DATASETS", str(DEFAULT_ROOT)))
+
+
+def split_summary(summary):
+    """Résumé Markdown -> ``[(niveau, titre, texte)]`` ; le texte avant le premier titre a un titre vide"""
+    sections = []
+    level, heading, lines = 0, "", []
+    for line in summary.splitlines():
+        match = _HEADING.match(line.strip())
+        if match:
+            if heading or "".join(lines).strip():
+                sections.append((level, heading, "\n".join(lines).strip()))
+            level = len(match.group(1)) if match.group(1) else 3
+            heading = (match.group(2) or match.group(3)).strip()
+            lines = []
+        else:
+            lines.append(line)
+    if heading or "".join(lines).strip():
+        sections.append((level, heading, "\n".join(lines).strip()))
+    return sections
+
+
+def _dated(row):
+    created = row.get("created") or 0.0
+    moment = datetime.fromtimestamp(created, tz=timezone.utc)
+    return {**row, "created": moment, "date": moment.strftime("%Y-%m-%d")}
+
+
+def _records(name, rows):
+    """Lignes de l'archive -> lignes du jeu ``name``"""
+    if name == "documents":
+        return [_dated({**row, "document_id": row["id"]}) for row in rows]
+    if name == "summary_sections":
+        return [
+            _dated({**row, "position": position, "level": level, "heading": heading, "text": text})
+            for row in rows
+            for position, (level, heading, text) in enumerate(split_summary(row["summary"]))
+        ]
+    if name == "answers":
+        return [_dated({**row, "cached": bool(row["cached"])}) for row in rows]
+    return [_dated(row) for row in rows]
+
+
+def write(name, records, root=None):
+    """Ajoute ``records`` au jeu ``name`` (nouveaux fichiers, partitions par jour) ; renvoie le nombre de lignes"""
+    if not records:
+        return 0
+    schema = SCHEMAS[name]
+    table = pa.Table.from_pylist(records, schema=schema)
+    if name == "figures":
+        # Tri par indicateur : statistiques min/max des groupes de lignes utiles aux filtres
+        table = table.sort_by([("indicator", "ascending"), ("document_id", "ascending")])
+    with REGISTRY.timer("dataset_write", dataset=name, rows=table.num_rows):
+        ds.write_dataset(
+            table,
+            Path(root or dataset_root()) / name,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_rows_per_group=128 * 1024,
+        )
+    REGISTRY.incr(f"dataset_rows_{name}", table.num_rows)
+    return table.num_rows
+
+
+def _state_path(root):
+    return Path(root) / "_state.json"
+
+
+def export_archive(root=None, datasets=None, full=False, batch=50000):
+    """Exporte les lignes archivées depuis le dernier export ; renvoie ``{jeu: lignes écrites}``.
+
+    ``full=True`` repart de zéro (à utiliser sur un dossier vide, sinon les
+    lignes déjà exportées sont dupliquées).
+    """
+    archive = store.get_store()
+    if archive is None:
+        raise RuntimeError("Archive désactivée (ANALYSEUR_DB=off) : rien à exporter")
+    root = Path(root or dataset_root())
+    root.mkdir(parents=True, exist_ok=True)
+    state_path = _state_path(root)
+    state = {} if full or not state_path.is_file() else json.loads(state_path.read_text(encoding="utf-8"))
+
+    written = {}
+    with REGISTRY.timer("dataset_export"):
+        for name in datasets or SCHEMAS:
+            written[name] = 0
+            for rows in archive.export_rows(SOURCES[name], state.get(name, 0), batch):
+                written[name] += write(name, _records(name, rows), root)
+                # Avancée du repère après chaque lot écrit : un export interrompu reprend au lot suivant
+                state[name] = rows[-1]["_rowid"]
+                tmp = state_path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(state), encoding="utf-8")
+                os.replace(tmp, state_path)
+    return written
+
+
+def load(name, root=None, filter=None, columns=None):
+    """Jeu ``name`` en table pyarrow (``filter`` : expression ``pyarrow.dataset``)"""
+    path = Path(root or dataset_root()) / name
+    if not path.is_dir():
+        return SCHEMAS[name].empty_table()
+    dataset = ds.dataset(path, format="parquet", partitioning="hive", schema=SCHEMAS[name])
+    return dataset.to_table(filter=filter, columns=columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Parquet de l'archive (ajout incrémental)")
+    parser.add_argument("--root", type=Path, help=f"dossier des jeux de données (défaut {DEFAULT_ROOT})")
+    parser.add_argument("--dataset", action="append", choices=list(SCHEMAS), help="jeu à exporter (répétable)")
+    parser.add_argument("--full", action="store_true", help="réexporte toute l'archive")
+    args = parser.parse_args(argv)
+    written = export_archive(args.root, args.dataset, args.full)
+    for name, rows in written.items():
+        print(f"{name:<18}: +{rows:,} lignes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""Plongements (embeddings) des pages et index vectoriel sur disque.
+
+Les pages sont découpées en passages, envoyés par lots au modèle
+d'embeddings (``ANALYSEUR_EMBED_BATCH`` passages par appel,
+``ANALYSEUR_EMBED_CONCURRENCY`` appels simultanés). Les vecteurs, normalisés,
+sont écrits par document dans ``ANALYSEUR_VECTORS`` (défaut ``data/vectors``) :
+
+- ``<id>.npy`` : matrice ``passages x dimension`` (float16 par défaut,
+  ``ANALYSEUR_VECTOR_DTYPE=float32`` pour la pleine précision)
+- ``<id>.pages.npy`` : page de chaque passage
+- ``<id>.json`` : modèle, dimension, type
+
+Les matrices sont ouvertes en ``mmap_mode="r"`` : charger un index ne copie
+rien. Chaque mémoire mappée garde un descripteur de fichier, donc au plus
+``ANALYSEUR_VECTOR_OPEN`` documents restent ouverts entre deux recherches
+(défaut : le quart de la limite de descripteurs du processus, au plus 200) ;
+les plus anciens sont relâchés, et la limite est abaissée si le système refuse
+d'ouvrir un fichier. La recherche regroupe les passages de plusieurs documents
+dans un même bloc, scoré en une seule opération.
+"""
+import bisect
+import errno
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from . import store
+from .cache import LRUCache
+from .metrics import REGISTRY
+
+DEFAULT_ROOT = Path(__file__).resolve().parent.parent / "data" / "vectors"
+DEFAULT_MODELS = {"ollama": "nomic-embed-text", "mock": "mock"}
+
+# Passages d'environ ``CHUNK_CHARS`` caractères, chevauchés de ``CHUNK_OVERLAP``
+CHUNK_CHARS = 1500
+CHUNK_OVERLAP = 200
+# Mémoire du bloc de recherche (float32) : son nombre de lignes dépend de la dimension
+SEARCH_BLOCK_BYTES = 16 * 1024 * 1024
+MOCK_DIMENSION = 256
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def open_limit():
+    """Documents gardés ouverts : ``ANALYSEUR_VECTOR_OPEN``, sinon d'après ``ulimit -n``"""
+    configured = os.getenv("ANALYSEUR_VECTOR_OPEN")
+    if configured:
+        return int(configured)
+    try:
+        import resource
+
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        # Windows : pas de module resource
+        return 200
+    if soft == resource.RLIM_INFINITY:
+        return 200
+    # Deux descripteurs par document ; la moitié de la limite reste au reste du
+    # processus (archive SQLite, PDF ouverts, sockets)
+    return max(1, min(200, soft // 4))
+
+
+def enabled():
+    return os.getenv("ANALYSEUR_EMBEDDINGS", "off").lower() in ("on", "1", "true")
+
+
+def default_backend():
+    backend = os.getenv("ANALYSEUR_EMBED_BACKEND", "ollama")
+    return backend, os.getenv("ANALYSEUR_EMBED_MODEL", DEFAULT_MODELS.get(backend, ""))
+
+
+def chunk_pages(pages, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """``{page: texte}`` -> liste de ``(page, passage)`` ; un passage ne déborde pas de sa page"""
+    chunks = []
+    step = max(1, chunk_chars - overlap)
+    for number in sorted(pages):
+        text = " ".join(pages[number].split())
+        for start in range(0, max(len(text) - overlap, 1), step):
+            piece = text[start:start + chunk_chars]
+            if piece.strip():
+                chunks.append((number, piece))
+    return chunks
+
+
+# ======================================================
+# BACKENDS : liste de textes -> liste de vecteurs
+# ======================================================
+def ollama_embed(model, texts):
+    import ollama
+
+    return ollama.embed(model=model, input=texts)["embeddings"]
+
+
+def mock_embed(model, texts):
+    """Sac de mots haché : hors ligne, déterministe, et des textes proches restent proches"""
+    vectors = np.zeros((len(texts), MOCK_DIMENSION), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest()
+            vectors[row, int.from_bytes(digest, "little") % MOCK_DIMENSION] += 1.0
+    return vectors
+
+
+BACKENDS = {"ollama": ollama_embed, "mock": mock_embed}
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def embed_texts(texts, backend="ollama", model=None, batch_size=None, concurrency=None):
+    """Vecteurs normalisés (float32) de ``texts``, calculés par lots en parallèle"""
+    embed = BACKENDS[backend]
+    model = model or DEFAULT_MODELS.get(backend)
+    batch_size = batch_size or int(os.getenv("ANALYSEUR_EMBED_BATCH", "32"))
+    concurrency = concurrency or int(os.getenv("ANALYSEUR_EMBED_CONCURRENCY", "2"))
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def run(batch):
+        with REGISTRY.timer("embed_batch", size=len(batch), backend=backend):
+            return _normalize(embed(model, batch))
+
+    if not batches:
+        return np.zeros((0, 0), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(batches)), thread_name_prefix="analyseur-embed") as pool:
+        vectors = np.concatenate(list(pool.map(run, batches)))
+    REGISTRY.incr("embedded_chunks", len(texts))
+    return vectors
+
+
+# ======================================================
+# INDEX SUR DISQUE
+# ======================================================
+class VectorStore:
+    """Index vectoriel : un jeu de fichiers ``.npy`` par document, lus en mémoire mappée"""
+
+    def __init__(self, root, dtype=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dtype = np.dtype(dtype or os.getenv("ANALYSEUR_VECTOR_DTYPE", "float16"))
+        self._lock = threading.Lock()
+        # Métadonnées déjà lues (document -> dict)
+        self._meta = {}
+        # Matrices ouvertes (document -> (vecteurs, pages)) : deux descripteurs par
+        # document, rendus dès que l'entrée sort du cache et n'est plus lue ailleurs
+        self._opened = LRUCache("vector_files", maxsize=open_limit())
+
+    def _paths(self, document_id):
+        return self.root / f"{document_id}.npy", self.root / f"{document_id}.pages.npy", self.root / f"{document_id}.json"
+
+    def save(self, document_id, vectors, pages, model):
+        """Écrit l'index d'un document (remplacement atomique des fichiers)"""
+        vectors_path, pages_path, meta_path = self._paths(document_id)
+        meta = {"model": model, "dimension": int(vectors.shape[1]), "dtype": self.dtype.name, "count": len(pages)}
+        with self._lock:
+            for path, array in ((vectors_path, vectors.astype(self.dtype)), (pages_path, np.asarray(pages, np.int32))):
+                tmp = path.with_suffix(".tmp.npy")
+                np.save(tmp, array)
+                os.replace(tmp, path)
+            # Métadonnées en dernier : un index sans ``.json`` est incomplet et ignoré
+            tmp = meta_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, meta_path)
+            self._meta.pop(document_id, None)
+            self._opened.pop(document_id)
+
+    def meta(self, document_id):
+        meta = self._meta.get(document_id)
+        if meta is None:
+            meta_path = self._paths(document_id)[2]
+            if not meta_path.is_file():
+                return None
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            self._meta[document_id] = meta
+        return meta
+
+    def load(self, document_id):
+        """``(vecteurs, pages)`` en mémoire mappée (lecture seule), ou None"""
+        opened = self._opened.get(document_id)
+        if opened is None:
+            if self.meta(document_id) is None:
+                return None
+            vectors_path, pages_path, _ = self._paths(document_id)
+            try:
+                opened = self._open(vectors_path, pages_path)
+            except FileNotFoundError:
+                # Index supprimé entre-temps
+                return None
+            self._opened.put(document_id, opened)
+        return opened
+
+    def _open(self, vectors_path, pages_path):
+        try:
+            return np.load(vectors_path, mmap_mode="r"), np.load(pages_path, mmap_mode="r")
+        except OSError as e:
+            if e.errno != errno.EMFILE or not len(self._opened):
+                raise
+        # Plus de descripteurs libres : la moitié des documents ouverts sont
+        # relâchés, et la limite reste abaissée pour la suite
+        REGISTRY.incr("vector_files_exhausted")
+        self._opened.resize(max(1, len(self._opened) // 2))
+        return np.load(vectors_path, mmap_mode="r"), np.load(pages_path, mmap_mode="r")
+
+    def documents(self, model=None):
+        ids = [path.stem for path in self.root.glob("*.json")]
+        return [i for i in ids if model is None or (self.meta(i) or {}).get("model") == model]
+
+    def delete(self, document_id):
+        with self._lock:
+            self._meta.pop(document_id, None)
+            self._opened.pop(document_id)
+            for path in reversed(self._paths(document_id)):
+                path.unlink(missing_ok=True)
+
+    def search(self, query, k=10, document_ids=None, model=None):
+        """Meilleurs passages pour un vecteur ``query`` (normalisé), tous documents confondus.
+
+        Les passages des documents sont copiés (en float32) dans un bloc de
+        ``SEARCH_BLOCK_BYTES`` octets ; chaque bloc plein donne un produit
+        matrice-vecteur et un ``argpartition``, fusionnés dans un tas de
+        taille ``k``.
+        """
+        k = max(1, k)
+        query = np.asarray(query, dtype=np.float32).ravel()
+        rows = max(1, SEARCH_BLOCK_BYTES // (4 * max(1, query.shape[0])))
+        block = np.empty((rows, query.shape[0]), dtype=np.float32)
+        block_pages = np.empty(rows, dtype=np.int32)
+        # Segments du bloc : (première ligne du bloc, document, première ligne dans le document)
+        segments = []
+        best = []
+        fill = scanned = 0
+
+        def flush():
+            scores = block[:fill] @ query
+            top = np.argpartition(-scores, k - 1)[:k] if fill > k else np.arange(fill)
+            starts = [segment[0] for segment in segments]
+            for row, score, page in zip(top.tolist(), scores[top].tolist(), block_pages[top].tolist()):
+                offset, document_id, first = segments[bisect.bisect_right(starts, row) - 1]
+                item = (score, document_id, first + row - offset, page)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+
+        ids = document_ids or self.documents(model)
+        # Documents déjà ouverts d'abord : ceux ouverts ensuite n'évincent que des
+        # documents déjà parcourus par cette recherche
+        ids = sorted(ids, key=lambda document_id: document_id not in self._opened)
+        with REGISTRY.timer("vector_search", k=k):
+            for document_id in ids:
+                index = self.load(document_id)
+                if index is None or index[0].shape[1] != query.shape[0]:
+                    continue
+                vectors, pages = index
+                for start in range(0, len(vectors), rows):
+                    count = min(rows, len(vectors) - start)
+                    if fill + count > rows:
+                        flush()
+                        segments, fill = [], 0
+                    block[fill:fill + count] = vectors[start:start + count]
+                    block_pages[fill:fill + count] = pages[start:start + count]
+                    segments.append((fill, document_id, start))
+                    fill += count
+                    scanned += count
+            if fill:
+                flush()
+        REGISTRY.observe_value("vector_search_rows", scanned)
+        return [
+            {"document_id": document_id, "page": page, "chunk": row, "score": score}
+            for score, document_id, row, page in sorted(best, reverse=True)
+        ]
+
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+
+def get_vector_store():
+    """Index du processus (``ANALYSEUR_VECTORS``)"""
+    global _vector_store
+    root = os.getenv("ANALYSEUR_VECTORS", str(DEFAULT_ROOT))
+    with _vector_store_lock:
+        if _vector_store is None or str(_vector_store.root) != root:
+            _vector_store = VectorStore(root)
+        return _vector_store
+
+
+def index_document(document_id, pages, backend=None, model=None):
+    """Calcule et enregistre l'index d'un document ``{page: texte}`` ; sans effet s'il existe pour ce modèle"""
+    if backend is None:
+        backend, model = default_backend()
+    model = model or DEFAULT_MODELS.get(backend)
+    vector_store = get_vector_store()
+    if (vector_store.meta(document_id) or {}).get("model") == model:
+        return vector_store.meta(document_id)["count"]
+    chunks = chunk_pages(pages)
+    if not chunks:
+        return 0
+    with REGISTRY.timer("embed_document", chunks=len(chunks)):
+        vectors = embed_texts([text for _, text in chunks], backend, model)
+    vector_store.save(document_id, vectors, [page for page, _ in chunks], model)
+    return len(chunks)
+
+
+def search(query, k=10, document_ids=None, backend=None, model=None):
+    """Passages les plus proches de ``query`` (texte), avec nom du document et extrait"""
+    if backend is None:
+        backend, model = default_backend()
+    model = model or DEFAULT_MODELS.get(backend)
+    vector = embed_texts([query], backend, model)[0]
+    vector_store = get_vector_store()
+    hits = vector_store.search(vector, k, document_ids, model)
+    archive = store.get_store()
+    for hit in hits:
+        document = archive.document(hit["document_id"]) if archive else None
+        text = archive.page(hit["document_id"], hit["page"]) if document else None
+        hit["name"] = document["name"] if document else None
+        hit["snippet"] = ""
+        index = vector_store.load(hit["document_id"]) if text else None
+        if index is not None:
+            # Rang du passage dans sa page : les passages d'un document sont rangés par page
+            pages = index[1]
+            position = hit["chunk"] - int(np.searchsorted(pages, hit["page"]))
+            passages = chunk_pages({hit["page"]: text})
+            hit["snippet"] = passages[min(position, len(passages) - 1)][1][:300] if passages else ""
+    return hits
@@ -0,0 +1,254 @@
+"""Extraction du texte des PDF, instrumentée et mise en cache par contenu."""
+import hashlib
+import threading
+import time
+from collections import deque
+
+from . import lazy, ocr, store
+from . import sections as sectioning
+from .cache import LRUCache
+from .metrics import REGISTRY, log_event
+
+# Documents extraits gardés en mémoire (clé : hash du contenu et longueur max)
+EXTRACTION_CACHE = LRUCache("extraction", maxsize=8)
+
+# Un verrou par document en cours d'extraction : un second appel concurrent
+# (précalcul + clic, deux sessions) attend le premier au lieu de relire le PDF
+_extracting = {}
+_extracting_lock = threading.Lock()
+
+
+def document_hash(data):
+    """Empreinte SHA-256 du contenu d'un PDF"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_upload(pdf_file):
+    """Lit le contenu d'un fichier uploadé (ou renvoie directement des bytes)"""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    with REGISTRY.timer("upload_read"):
+        if hasattr(pdf_file, "getvalue"):
+            # UploadedFile / BytesIO : pas de dépendance à la position du curseur
+            return pdf_file.getvalue()
+        return pdf_file.read()
+
+
+def page_marker(number):
+    return f"\n\n=== [PAGE {number}] ===\n"
+
+
+def clean_page(page_text):
+    """Nettoie le texte d'une page (espaces en début/fin de ligne)"""
+    return "\n".join(line.strip() for line in page_text.strip().splitlines())
+
+
+def assemble_text(pages, max_length=120000):
+    """Texte complet avec repères ``=== [PAGE X] ===`` ; renvoie ``(texte, tronque)``"""
+    text = "".join(page_marker(i) + page for i, page in enumerate(pages, start=1))
+    if text.endswith("\n"):
+        # Dernière page vide : même résultat qu'un nettoyage ligne à ligne du texte entier
+        text = text[:-1]
+    with REGISTRY.timer("truncation"):
+        truncated = len(text) > max_length
+        if truncated:
+            text = text[:max_length]
+    return text, truncated
+
+
+def open_pdf(data):
+    """Document ``fitz`` ouvert sur le contenu d'un PDF (bytes)"""
+    import fitz  # PyMuPDF
+
+    with REGISTRY.timer("fitz_open", size=len(data)):
+        return fitz.open(stream=data, filetype="pdf")
+
+
+def iter_pages(data, pdf=None):
+    """Textes nettoyés des pages d'un PDF (bytes), produits au fil de la lecture.
+
+    Les pages scannées (module ``ocr``) partent à l'OCR dans un pool de
+    processus pendant que la lecture continue ; les pages restent produites
+    dans l'ordre, avec au plus ``ocr.workers()`` x 2 pages lues d'avance.
+    Avec ``pdf`` (déjà ouvert), le document n'est ni rouvert ni refermé.
+    """
+    owned = pdf is None
+    if owned:
+        pdf = open_pdf(data)
+
+    ocr_on = ocr.enabled()
+    lookahead = ocr.workers() * 2 if ocr_on else 0
+    pending = deque()
+    count = 0
+    cleanup = 0.0
+
+    def ready(block):
+        nonlocal cleanup
+        number, native, future = pending[0]
+        if future is not None and not block and not future.done() and len(pending) <= lookahead:
+            return None
+        pending.popleft()
+        page_text = native if future is None else ocr.text_or(future, native, number)
+        start = time.perf_counter()
+        cleaned = clean_page(page_text)
+        cleanup += time.perf_counter() - start
+        if not cleaned:
+            REGISTRY.incr("pages_empty")
+        return cleaned
+
+    try:
+        for i, page in enumerate(pdf, start=1):
+            with REGISTRY.timer("page_get_text", page=i):
+                page_text = page.get_text()
+            future = ocr.submit(pdf, page) if ocr_on and ocr.needs_ocr(page, page_text) else None
+            pending.append((i, page_text, future))
+            while pending:
+                cleaned = ready(block=False)
+                if cleaned is None:
+                    break
+                count += 1
+                yield cleaned
+        while pending:
+            count += 1
+            yield ready(block=True)
+    finally:
+        if owned:
+            pdf.close()
+        REGISTRY.observe("cleanup", cleanup)
+        REGISTRY.incr("pages_extracted", count)
+
+
+def extract_pages(data, pdf=None):
+    """Textes nettoyés de toutes les pages d'un PDF (bytes)"""
+    return list(iter_pages(data, pdf))
+
+
+def extract_document(pdf_file, max_length=120000, name=None):
+    """Extrait un PDF et renvoie sa description complète.
+
+    Dictionnaire : ``id`` (hash du contenu), ``name``, ``text``,
+    ``truncated``, ``chars``, ``pages``, ``sections`` (module ``sections``).
+    Le résultat est mis en cache par hash : un rerun Streamlit ne relit pas
+    le PDF ; un document déjà archivé (``store``) est rouvert sans nouvelle
+    extraction. Un très gros PDF est ouvert à la demande (module ``lazy``,
+    ``lazy: True``) : seules ses premières pages sont lues ici.
+    """
+    name = name or getattr(pdf_file, "name", None)
+    data = read_upload(pdf_file)
+    document_id = document_hash(data)
+    key = (document_id, max_length)
+
+    cached = EXTRACTION_CACHE.get(key)
+    if cached is not None:
+        if cached.get("lazy"):
+            # Document refermé depuis (registre plein) : rouvert pour les sections
+            lazy.reopen(document_id, data, name)
+        return cached
+
+    with _extracting_lock:
+        # [verrou, nombre de threads qui l'attendent ou le tiennent]
+        entry = _extracting.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+        lock = entry[0]
+    try:
+        with lock:
+            cached = EXTRACTION_CACHE.peek(key)
+            if cached is not None:
+                return cached
+
+            pages = archived_pages(document_id)
+            if pages is None:
+                # Une seule ouverture du PDF : taille, pages puis sections
+                pdf = open_pdf(data)
+                large = lazy.open_large(document_id, data, name, pdf)
+                if large is not None:
+                    # Très gros PDF : premières pages seulement, le reste à la demande (non archivé)
+                    document = lazy.describe(large, max_length)
+                    EXTRACTION_CACHE.put(key, document)
+                    return document
+                try:
+                    pages = extract_pages(data, pdf)
+                    sections = document_sections(data, pdf)
+                finally:
+                    pdf.close()
+                return remember(document_id, name, pages, max_length, sections=sections)
+            archive = store.get_store()
+            if not archive.sections_known(document_id):
+                # Document archivé avant le découpage en sections : complété au passage
+                archive.save_sections(document_id, document_sections(data))
+            return remember(document_id, name, pages, max_length, archive=False)
+    finally:
+        with _extracting_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _extracting[key]
+
+
+def archived_pages(document_id):
+    """Pages déjà archivées d'un document, ou None"""
+    archive = store.get_store()
+    return archive.load_pages(document_id) if archive else None
+
+
+def document_sections(data, pdf=None):
+    """Sections d'un PDF ; liste vide si le découpage échoue (l'extraction reste valable)"""
+    try:
+        return sectioning.build_sections(data, pdf)
+    except Exception as e:
+        REGISTRY.incr("sections_failed")
+        log_event("sections_failed", error=str(e))
+        return []
+
+
+def remember(document_id, name, pages, max_length=120000, archive=True, sections=None):
+    """Archive les pages extraites et met la description en cache ; la renvoie.
+
+    Sans ``sections``, celles de l'archive sont reprises (document déjà connu).
+    """
+    target = store.get_store()
+    if archive and target:
+        target.save_document(document_id, name, pages, sections=sections)
+    if sections is None:
+        sections = target.sections(document_id) if target else []
+    document = _describe(document_id, name, pages, max_length, sections)
+    EXTRACTION_CACHE.put((document_id, max_length), document)
+    return document
+
+
+def reopen_document(document_id, max_length=120000):
+    """Rouvre un document archivé sans le PDF ; None s'il est inconnu"""
+    key = (document_id, max_length)
+    cached = EXTRACTION_CACHE.get(key)
+    if cached is not None:
+        return cached
+    archive = store.get_store()
+    info = archive.document(document_id) if archive else None
+    if info is None:
+        return None
+    document = _describe(
+        document_id, info["name"], archive.load_pages(document_id), max_length, archive.sections(document_id)
+    )
+    EXTRACTION_CACHE.put(key, document)
+    return document
+
+
+def _describe(document_id, name, pages, max_length, sections=None):
+    text, truncated = assemble_text(pages, max_length)
+    REGISTRY.observe_value("extracted_chars", len(text))
+    return {
+        "id": document_id,
+        "name": name,
+        "text": text,
+        "truncated": truncated,
+        "chars": len(text),
+        "pages": len(pages),
+        "sections": sections or [],
+        # Pages restées sans texte (scannées sans OCR, ou OCR en échec)
+        "empty_pages": [number for number, page in enumerate(pages, start=1) if not page.strip()],
+    }
+
+
+def extract_pdf_text(pdf_file, max_length=120000):
+    """Extrait le texte d'un PDF avec repères de pages ; renvoie ``(texte, tronque)``"""
+    document = extract_document(pdf_file, max_length)
+    return document["text"], document["truncated"]
@@ -0,0 +1,148 @@
+"""Repérage des indicateurs chiffrés (valeur, unité, période, page) dans le texte."""
+import re
+
+# Indicateur normalisé -> motifs (insensibles à la casse) qui l'annoncent
+INDICATORS = {
+    "chiffre_affaires": [r"chiffre d['’]affaires", r"\brevenues?\b", r"\bproduit net bancaire\b", r"\bPNB\b"],
+    "ebitda": [r"\bEBITDA\b", r"\bEBE\b", r"excédent brut d['’]exploitation"],
+    "ebit": [r"\bEBIT\b", r"résultat d['’]exploitation", r"résultat opérationnel", r"operating income"],
+    "resultat_net": [r"résultat net", r"net income", r"bénéfice net"],
+    "marge": [r"\bmarge\b(?: opérationnelle| nette| brute)?", r"\bmargin\b"],
+    "dette_brute": [r"dette (?:financière )?brute", r"endettement brut", r"total debt"],
+    "dette_nette": [r"dette (?:financière )?nette", r"endettement (?:financier )?net", r"net debt"],
+    "tresorerie": [r"trésorerie(?: et équivalents)?", r"\bcash and cash equivalents\b"],
+    "capex": [r"\bCAPEX\b", r"investissements? corporels", r"capital expenditures?"],
+    "fcf": [r"\bFCF\b", r"free cash[- ]flow", r"flux de trésorerie disponible"],
+    "total_actif": [r"total (?:de l['’])?actif", r"total assets"],
+    "total_passif": [r"total (?:du )?passif", r"total liabilities(?! and)"],
+    "capitaux_propres": [r"capitaux propres", r"shareholders['’]? equity", r"total equity"],
+    "cout_du_risque": [r"coût du risque"],
+    "cet1": [r"\bCET1\b", r"common equity tier 1"],
+    "lcr": [r"\bLCR\b"],
+    "nsfr": [r"\bNSFR\b"],
+}
+
+# Échelles reconnues -> multiplicateur
+_SCALES = [
+    (r"(?:milliards?|mds?|md€|bn|billions?)", 1e9),
+    (r"(?:millions?|mio|m€|mn|m\b)", 1e6),
+    (r"(?:milliers|k€|k\b|thousands?)", 1e3),
+]
+_CURRENCIES = {"€": "EUR", "eur": "EUR", "euros": "EUR", "euro": "EUR", "$": "USD", "usd": "USD", "dollars": "USD"}
+
+_NUMBER = r"[-−–(]?\d{1,3}(?:[ \u00a0\u202f.,]\d{3}(?!\d))+(?:[.,]\d+)?\)?|[-−–(]?\d+(?:[.,]\d+)?\)?"
+_VALUE = re.compile(
+    rf"(?<![\w.,])(?P<number>{_NUMBER})\s*(?P<scale>milliards?|mds?|md€|bn|billions?|millions?|mio|m€|mn|milliers|k€|thousands?|[mk](?![a-z]))?\s*(?:de\s+|d['’])?"
+    r"(?P<unit>%|€|\$|eur\b|euros?\b|usd\b|dollars\b|pts?\b|points?\b)?",
+    re.IGNORECASE,
+)
+_PERIOD = re.compile(r"\b(?:(?P<quarter>[TQ][1-4]|[SH][12])[ -]?)?(?P<year>(?:19|20)\d{2})\b")
+_ALIASES = [
+    (name, re.compile(pattern, re.IGNORECASE)) for name, patterns in INDICATORS.items() for pattern in patterns
+]
+# Distance maximale (caractères) entre le libellé et la valeur sur la même ligne
+MAX_GAP = 80
+
+
+def parse_number(raw):
+    """Convertit ``1 234,5`` / ``1,234.5`` / ``(12)`` en float (None si illisible)"""
+    raw = raw.strip()
+    negative = raw.startswith(("-", "−", "–")) or (raw.startswith("(") and raw.endswith(")"))
+    digits = re.sub(r"[ \u00a0\u202f]", "", raw.strip("-−–()"))
+    if "," in digits and "." in digits:
+        # Le dernier séparateur rencontré est le séparateur décimal
+        if digits.rfind(",") > digits.rfind("."):
+            digits = digits.replace(".", "").replace(",", ".")
+        else:
+            digits = digits.replace(",", "")
+    elif digits.count(",") == 1 and len(digits.rpartition(",")[2]) != 3:
+        digits = digits.replace(",", ".")
+    elif "," in digits:
+        digits = digits.replace(",", "")
+    elif digits.count(".") > 1:
+        digits = digits.replace(".", "")
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _scale(raw):
+    if not raw:
+        return 1.0
+    for pattern, multiplier in _SCALES:
+        if re.fullmatch(pattern, raw, re.IGNORECASE):
+            return multiplier
+    return 1.0
+
+
+def _unit(raw_unit, raw_scale):
+    raw_unit = (raw_unit or "").lower()
+    if raw_unit == "%":
+        return "%"
+    if raw_unit.startswith(("pt", "point")):
+        return "pts"
+    if raw_unit in _CURRENCIES:
+        return _CURRENCIES[raw_unit]
+    if raw_scale and raw_scale.lower().endswith("€"):
+        return "EUR"
+    return ""
+
+
+def indicators_in(text):
+    """Indicateurs cités dans ``text`` (une question, par exemple)"""
+    return list(dict.fromkeys(indicator for indicator, alias in _ALIASES if alias.search(text)))
+
+
+def extract_figures(pages):
+    """Liste des indicateurs repérés dans ``pages`` (textes nettoyés, page 1 en tête).
+
+    Chaque élément : ``indicator``, ``value`` (en unités, échelle appliquée),
+    ``unit`` (EUR, USD, %, pts ou vide), ``scale`` (multiplicateur lu),
+    ``period``, ``page`` et ``raw`` (ligne d'origine).
+    """
+    figures = []
+    for number, text in enumerate(pages, start=1):
+        for line in text.splitlines():
+            if not line or not any(c.isdigit() for c in line):
+                continue
+            seen = set()
+            for indicator, alias in _ALIASES:
+                if indicator in seen:
+                    continue
+                label = alias.search(line)
+                if not label:
+                    continue
+                tail = line[label.end():label.end() + MAX_GAP]
+                value = _first_value(tail)
+                if value is None:
+                    continue
+                seen.add(indicator)
+                period = _PERIOD.search(line)
+                figures.append({
+                    "indicator": indicator,
+                    "value": value[0],
+                    "unit": value[1],
+                    "scale": value[2],
+                    "period": period.group(0) if period else "",
+                    "page": number,
+                    "raw": line[:200],
+                })
+    return figures
+
+
+def _first_value(tail):
+    for match in _VALUE.finditer(tail):
+        number = match.group("number")
+        if not number or not any(c.isdigit() for c in number):
+            continue
+        # Une année seule n'est pas une valeur
+        if _PERIOD.fullmatch(number.strip("()")) and not match.group("scale") and not match.group("unit"):
+            continue
+        value = parse_number(number)
+        if value is None:
+            continue
+        scale = _scale(match.group("scale"))
+        return value * scale, _unit(match.group("unit"), match.group("scale")), scale
+    return None
@@ -0,0 +1,206 @@
+"""Très gros PDF ouverts à la demande : une page n'est extraite que si on la lit.
+
+Au-delà de ``ANALYSEUR_LAZY_PAGES`` pages (défaut 400, ``0`` désactive),
+``extract_document`` ne lit plus tout le PDF avant de rendre la main : un
+``LazyDocument`` garde le document PyMuPDF ouvert, et les pages ne sont
+extraites (OCR compris) que lorsque le résumé, une question ou la checklist
+en ont besoin — les pages des sections utiles, via ``focus_text``.
+
+Les pages extraites vont dans un cache LRU commun à tous les documents
+(``ANALYSEUR_PAGE_CACHE`` pages, défaut 512) : les pages froides en sortent
+et seront relues au besoin. Au plus ``ANALYSEUR_LAZY_DOCUMENTS`` documents
+(défaut 4) restent ouverts : un document sorti du registre est refermé, et
+les descriptions mises en cache ne gardent que son identifiant.
+"""
+import os
+import threading
+
+from . import extraction, ocr
+from . import sections as sectioning
+from .cache import LRUCache
+from .metrics import REGISTRY, log_event
+
+# Textes nettoyés des pages, clé (document, numéro de page)
+PAGE_CACHE = LRUCache("pages", maxsize=int(os.getenv("ANALYSEUR_PAGE_CACHE", "512")))
+
+_documents = LRUCache(
+    "lazy_documents", maxsize=int(os.getenv("ANALYSEUR_LAZY_DOCUMENTS", "4")),
+    on_evict=lambda document_id, document: document.close(),
+)
+_opening = threading.Lock()
+
+
+def threshold():
+    """Nombre de pages au-delà duquel un PDF est ouvert à la demande (0 : jamais)"""
+    return int(os.getenv("ANALYSEUR_LAZY_PAGES", "400"))
+
+
+class LazySections(list):
+    """Sections d'un document ouvert à la demande.
+
+    Une liste ordinaire (sérialisable, archivable), qui ne garde que
+    l'identifiant du document : ``focus_text`` lit par ``read_pages`` les
+    pages absentes du texte extrait, tant que le document est ouvert.
+    """
+
+    def __init__(self, sections, document_id, max_length):
+        super().__init__(sections)
+        self.document_id = document_id
+        self.max_length = max_length
+
+    def read_pages(self, pages):
+        """Texte des pages ``pages`` avec repères, ou None si le document a été refermé"""
+        document = _documents.get(self.document_id)
+        if document is None:
+            REGISTRY.incr("lazy_document_closed")
+            return None
+        return document.text(pages, self.max_length)[0]
+
+
+class LazyDocument:
+    """PDF ouvert dont les pages sont extraites et mises en cache à la lecture"""
+
+    def __init__(self, document_id, data, name=None, pdf=None):
+        self.id = document_id
+        self.name = name
+        # PyMuPDF lit le flux au fil des pages : les bytes doivent rester en vie
+        self._data = data
+        self._pdf = pdf if pdf is not None else extraction.open_pdf(data)
+        self.page_count = self._pdf.page_count
+        # Un document PyMuPDF ne se partage pas entre threads sans verrou
+        self._lock = threading.Lock()
+        self.empty_pages = set()
+
+    def page(self, number):
+        """Texte nettoyé de la page ``number`` (1 = première), extrait au premier accès"""
+        key = (self.id, number)
+        cached = PAGE_CACHE.get(key)
+        if cached is not None:
+            return cached
+        future = None
+        with self._lock:
+            closed = self._pdf is None
+            if not closed:
+                page = self._pdf[number - 1]
+                with REGISTRY.timer("page_get_text", page=number):
+                    native = page.get_text()
+                if ocr.enabled() and ocr.needs_ocr(page, native):
+                    future = ocr.submit(self._pdf, page)
+        if closed:
+            # Refermé (sorti du registre) pendant qu'un traitement le lisait encore :
+            # lu via le document du registre, qui sera refermé à son tour
+            return reopen(self.id, self._data, self.name).page(number)
+        # Attente de l'OCR hors verrou : les autres pages restent lisibles
+        text = extraction.clean_page(native if future is None else ocr.text_or(future, native, number))
+        if not text:
+            REGISTRY.incr("pages_empty")
+            self.empty_pages.add(number)
+        REGISTRY.incr("pages_extracted")
+        PAGE_CACHE.put(key, text)
+        return text
+
+    def text(self, numbers=None, max_length=None):
+        """Pages ``numbers`` (toutes par défaut) avec repères ; renvoie ``(texte, tronque)``.
+
+        La lecture s'arrête dès ``max_length`` caractères atteints.
+        """
+        numbers = sorted(n for n in (numbers or range(1, self.page_count + 1)) if 1 <= n <= self.page_count)
+        pieces, total = [], 0
+        for number in numbers:
+            if max_length is not None and total >= max_length:
+                return "".join(pieces)[:max_length], True
+            piece = extraction.page_marker(number) + self.page(number)
+            pieces.append(piece)
+            total += len(piece)
+        text = "".join(pieces)
+        if max_length is not None and len(text) > max_length:
+            return text[:max_length], True
+        return text, False
+
+    def iter_pages(self, numbers=None):
+        """Toutes les pages dans l'ordre ; hors ``numbers``, une page vide sans extraction"""
+        for number in range(1, self.page_count + 1):
+            yield self.page(number) if numbers is None or number in numbers else ""
+
+    def outline(self):
+        """Sections d'après le sommaire du PDF (les titres ne sont pas cherchés page à page)"""
+        try:
+            with self._lock:
+                return sectioning.outline_sections(self._pdf)
+        except Exception as e:
+            REGISTRY.incr("sections_failed")
+            log_event("sections_failed", error=str(e))
+            return []
+
+    def close(self):
+        """Referme le document PyMuPDF ; les bytes partent avec le dernier détenteur"""
+        with self._lock:
+            if self._pdf is not None:
+                self._pdf.close()
+                self._pdf = None
+
+
+def open_large(document_id, data, name=None, pdf=None):
+    """``LazyDocument`` si le PDF dépasse le seuil (ou est déjà ouvert), sinon None.
+
+    ``pdf`` (déjà ouvert par l'appelant) est repris par le document, ou
+    refermé si celui-ci était déjà ouvert ; avec None en retour, il reste à
+    l'appelant.
+    """
+    limit = threshold()
+    if limit <= 0:
+        return None
+    with _opening:
+        document = _documents.get(document_id)
+        if document is not None:
+            if pdf is not None:
+                pdf.close()
+            return document
+        if pdf is None:
+            pdf = extraction.open_pdf(data)
+            owned = True
+        else:
+            owned = False
+        if pdf.page_count <= limit:
+            if owned:
+                pdf.close()
+            return None
+        document = LazyDocument(document_id, data, name, pdf=pdf)
+        _documents.put(document_id, document)
+    REGISTRY.incr("lazy_documents_opened")
+    log_event("lazy_open", document=document_id[:12], pages=document.page_count)
+    return document
+
+
+def reopen(document_id, data, name=None):
+    """Document du registre, rouvert et réinscrit s'il a été refermé entre-temps (rerun)"""
+    with _opening:
+        document = _documents.peek(document_id)
+        if document is None:
+            document = LazyDocument(document_id, data, name)
+            _documents.put(document_id, document)
+            REGISTRY.incr("lazy_documents_reopened")
+        return document
+
+
+def describe(document, max_length=120000):
+    """Description au format d'``extract_document``, sans lire tout le PDF.
+
+    ``text`` ne contient que les premières pages (jusqu'à ``max_length``) ;
+    les autres sont lues via les sections quand un traitement les demande.
+    """
+    sections = LazySections(document.outline(), document.id, max_length)
+    text, truncated = document.text(max_length=max_length) if document.page_count else ("", False)
+    REGISTRY.observe_value("extracted_chars", len(text))
+    return {
+        "id": document.id,
+        "name": document.name,
+        "text": text,
+        "truncated": truncated,
+        "chars": len(text),
+        "pages": document.page_count,
+        "sections": sections,
+        # Seules les pages déjà lues sont connues ; les autres ne sont pas vérifiées
+        "empty_pages": sorted(document.empty_pages),
+        "lazy": True,
+    }
@@ -0,0 +1,379 @@
+"""Appels aux modèles (Ollama, OpenRouter, simulé) en streaming, instrumentés.
+
+Chaque appel passe par la file à priorités de ``scheduler`` (questions
+interactives avant précalculs et résumés) : l'attente dans cette file, le
+délai avant le premier token, le débit et les tokens consommés sont
+enregistrés dans ``metrics.REGISTRY``.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from . import budget
+from .cache import ANSWERS, make_key
+from .metrics import REGISTRY, log_event
+from .scheduler import SCHEDULER, Ticket, priority_for
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+_PAGE_NUMBER = re.compile(r"=== \[PAGE (\d+)\] ===")
+_QUESTION_NUMBER = re.compile(r"^\d+\. ", re.MULTILINE)
+
+
+# ======================================================
+# BACKENDS : flux d'événements ("text", str) / ("usage", dict)
+# ======================================================
+def ollama_events(model, messages, options=None):
+    import ollama
+
+    for chunk in ollama.chat(model=model, messages=messages, options=options or {}, stream=True):
+        content = chunk["message"]["content"]
+        if content:
+            yield "text", content
+        if chunk.get("done"):
+            yield "usage", {
+                "prompt_tokens": chunk.get("prompt_eval_count") or 0,
+                "completion_tokens": chunk.get("eval_count") or 0,
+                "eval_seconds": (chunk.get("eval_duration") or 0) / 1e9,
+            }
+
+
+def openrouter_events(api_key, model, messages, params=None):
+    import requests
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "http://localhost:8888/",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "usage": {"include": True},
+        **(params or {}),
+    }
+    with requests.post(OPENROUTER_URL, json=payload, headers=headers, stream=True) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"OpenRouter {response.status_code}: {response.text[:500]}")
+        for line in response.iter_lines(decode_unicode=True):
+            # Les lignes ": ..." sont des commentaires SSE (keep-alive)
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if "error" in chunk:
+                raise RuntimeError(f"OpenRouter: {chunk['error']}")
+            for choice in chunk.get("choices") or []:
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    yield "text", content
+            if chunk.get("usage"):
+                yield "usage", {
+                    "prompt_tokens": chunk["usage"].get("prompt_tokens") or 0,
+                    "completion_tokens": chunk["usage"].get("completion_tokens") or 0,
+                }
+
+
+_mock_active = 0
+_mock_lock = threading.Lock()
+
+
+def mock_events(model, messages, params=None):
+    """Modèle simulé, hors ligne, au débit réaliste (tests, charge, démo).
+
+    ``ANALYSEUR_MOCK_TTFT`` (s), ``ANALYSEUR_MOCK_TPS`` (tokens/s) et
+    ``ANALYSEUR_MOCK_TOKENS`` (longueur maximale) règlent la latence du premier
+    token, le débit et la taille des réponses. Pour simuler un serveur
+    partagé : ``ANALYSEUR_MOCK_PREFILL`` (tokens de prompt lus par seconde,
+    le premier token arrive plus tard pour un long document) et
+    ``ANALYSEUR_MOCK_CAPACITY`` (tokens/s au total, partagés entre les
+    générations simultanées).
+    """
+    global _mock_active
+    ttft = float(os.getenv("ANALYSEUR_MOCK_TTFT", "0.2"))
+    tokens_per_second = float(os.getenv("ANALYSEUR_MOCK_TPS", "40"))
+    prefill = float(os.getenv("ANALYSEUR_MOCK_PREFILL", "0"))
+    capacity = float(os.getenv("ANALYSEUR_MOCK_CAPACITY", "0"))
+    max_tokens = int((params or {}).get("num_predict") or (params or {}).get("max_tokens") or 120)
+    max_tokens = min(max_tokens, int(os.getenv("ANALYSEUR_MOCK_TOKENS", "120")))
+
+    prompt = "\n".join(m["content"] for m in messages)
+    pages = sorted(set(int(p) for p in _PAGE_NUMBER.findall(prompt)))[:3]
+    reference = ", ".join(f"page {p}" for p in pages) or "non précisé"
+    if '{"reponses"' in prompt:
+        # Checklist : réponse JSON structurée, une entrée par question numérotée
+        count = len(_QUESTION_NUMBER.findall(prompt.split("Texte PDF :")[0]))
+        words = json.dumps({"reponses": [
+            {"id": i, "reponse": f"Réponse simulée ({model}) : non précisé", "valeur": "", "pages": pages}
+            for i in range(1, count + 1)
+        ]}, ensure_ascii=False).split(" ")
+    else:
+        words = (
+            f"Réponse simulée ({model}) : l'information demandée est non précisé "
+            f"dans ce mode hors ligne. Références : {reference}."
+        ).split()
+        words = (words * (max_tokens // len(words) + 1))[:max_tokens]
+
+    time.sleep(ttft + (len(prompt) / 4 / prefill if prefill > 0 else 0))
+    with _mock_lock:
+        _mock_active += 1
+    try:
+        for i, word in enumerate(words):
+            if i and tokens_per_second > 0:
+                rate = min(tokens_per_second, capacity / _mock_active) if capacity > 0 else tokens_per_second
+                time.sleep(1 / rate)
+            yield "text", word if i == 0 else " " + word
+    finally:
+        with _mock_lock:
+            _mock_active -= 1
+    yield "usage", {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words)}
+
+
+# ======================================================
+# FLUX INSTRUMENTÉ
+# ======================================================
+class ChatStream:
+    """Réponse d'un modèle consommable morceau par morceau.
+
+    L'appel n'est lancé qu'à la première itération, quand la file à
+    priorités lui attribue une place (classe ``priority``, déduite de
+    ``stage`` par défaut). Après consommation, ``usage`` contient les
+    tokens du prompt et de la complétion.
+    """
+
+    def __init__(self, events, stage="llm", priority=None):
+        self._events = events
+        self.stage = stage
+        self.ticket = Ticket(priority or priority_for(stage))
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        self._pieces = []
+        self._done = False
+
+    def __iter__(self):
+        if self._done:
+            yield from self._pieces
+            return
+        SCHEDULER.acquire(self.ticket)
+        REGISTRY.add_gauge("llm_in_flight", 1)
+        start = time.perf_counter()
+        first = None
+        try:
+            for kind, payload in self._events:
+                if kind == "usage":
+                    self.usage.update(payload)
+                    continue
+                if first is None:
+                    first = time.perf_counter()
+                    REGISTRY.observe("llm_ttft", first - start)
+                self._pieces.append(payload)
+                yield payload
+            self._done = True
+        finally:
+            SCHEDULER.release(self.ticket)
+            REGISTRY.add_gauge("llm_in_flight", -1)
+            self._record(start, first)
+
+    def _record(self, start, first):
+        total = time.perf_counter() - start
+        prompt_tokens = self.usage.get("prompt_tokens", 0)
+        completion_tokens = self.usage.get("completion_tokens", 0)
+        REGISTRY.observe("llm_total", total)
+        REGISTRY.observe(f"llm_total_{self.stage}", total)
+        REGISTRY.incr("llm_calls")
+        REGISTRY.incr("llm_prompt_tokens", prompt_tokens)
+        REGISTRY.incr("llm_completion_tokens", completion_tokens)
+        # Débit de génération : durée côté serveur si connue, sinon depuis le 1er token
+        generation = self.usage.get("eval_seconds") or (time.perf_counter() - first if first else 0)
+        if completion_tokens and generation > 0:
+            REGISTRY.observe_value("llm_tokens_per_second", completion_tokens / generation)
+        log_event(
+            "llm_call", stage=self.stage, priority=self.ticket.klass, seconds=round(total, 6),
+            ttft=round(first - start, 6) if first else None,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        )
+
+    def promote(self, priority):
+        """Remonte l'appel dans la file s'il n'a pas encore démarré"""
+        SCHEDULER.promote(self.ticket, priority)
+
+    def text(self):
+        """Consomme le flux et renvoie la réponse complète"""
+        for _ in self:
+            pass
+        return "".join(self._pieces)
+
+
+def chat_ollama(model, messages, options=None, stage="llm", priority=None):
+    return ChatStream(ollama_events(model, messages, options), stage, priority)
+
+
+def chat_openrouter(api_key, model, messages, params=None, stage="llm", priority=None):
+    return ChatStream(openrouter_events(api_key, model, messages, params), stage, priority)
+
+
+BACKENDS = ("ollama", "openrouter", "mock")
+
+
+def chat(backend, model, messages, params=None, api_key=None, stage="llm", priority=None):
+    """Flux de réponse pour le backend demandé"""
+    if backend == "ollama":
+        return chat_ollama(model, messages, params, stage, priority)
+    if backend == "openrouter":
+        return chat_openrouter(api_key, model, messages, params, stage, priority)
+    if backend == "mock":
+        return ChatStream(mock_events(model, messages, params), stage, priority)
+    raise ValueError(f"Backend LLM inconnu : {backend}")
+
+
+def answer_key(backend, model, messages, params=None):
+    return make_key(backend, model, messages, params or {})
+
+
+def is_cached(backend, model, messages, params=None):
+    """Réponse déjà en cache pour cet appel (sans compter de succès ni d'échec de cache)"""
+    return ANSWERS.peek(answer_key(backend, model, messages, params)) is not None
+
+
+# ======================================================
+# MUTUALISATION DES APPELS IDENTIQUES
+# ======================================================
+class SharedStream:
+    """Appel en cours partagé par tous les demandeurs d'une même réponse.
+
+    Un thread consomme le flux du modèle dans un tampon ; chaque lecteur
+    (le premier comme ceux qui se rattachent en cours de route) relit le
+    tampon depuis le début puis suit les nouveaux morceaux.
+    """
+
+    def __init__(self, stream=None, text=None, on_done=None):
+        self._stream = stream
+        self._on_done = on_done
+        self._pieces = [] if text is None else [text]
+        self._done = text is not None
+        self._error = None
+        self._changed = threading.Condition()
+        self.readers = 1
+
+    def promote(self, priority):
+        if self._stream:
+            self._stream.promote(priority)
+
+    @property
+    def usage(self):
+        return self._stream.usage if self._stream else {"prompt_tokens": 0, "completion_tokens": 0}
+
+    def start(self):
+        threading.Thread(target=self._pump, name="analyseur-llm", daemon=True).start()
+        return self
+
+    def _pump(self):
+        try:
+            for piece in self._stream:
+                with self._changed:
+                    self._pieces.append(piece)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            if self._on_done:
+                self._on_done(self)
+            with self._changed:
+                self._done = True
+                self._changed.notify_all()
+
+    def __iter__(self):
+        position = 0
+        while True:
+            with self._changed:
+                while position >= len(self._pieces) and not self._done:
+                    self._changed.wait()
+                pieces = self._pieces[position:]
+                finished = self._done
+            position += len(pieces)
+            yield from pieces
+            if finished:
+                # Plus aucun morceau après la fin : tout a été lu
+                if self._error:
+                    raise self._error
+                return
+
+    def text(self):
+        """Attend la fin de l'appel et renvoie la réponse complète"""
+        for _ in self:
+            pass
+        return "".join(self._pieces)
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _join(key, stage, priority):
+    """Appel identique en cours, ou réponse arrivée entre-temps en cache (sous ``_inflight_lock``)"""
+    shared = _inflight.get(key)
+    if shared is not None:
+        shared.readers += 1
+        shared.promote(priority or priority_for(stage))
+        REGISTRY.incr("llm_coalesced")
+        REGISTRY.incr(f"llm_coalesced_{stage}")
+        log_event("llm_coalesced", stage=stage, readers=shared.readers)
+        return shared
+    cached = ANSWERS.peek(key)
+    if cached is not None:
+        return SharedStream(text=cached)
+    return None
+
+
+def stream(backend, model, messages, params=None, api_key=None, stage="llm", priority=None):
+    """Réponse en flux : depuis le cache, sinon rattachée à un appel identique en cours.
+
+    La clé couvre backend, modèle, messages (donc le texte du document) et
+    paramètres. Un seul appel part vers le modèle ; les suivants lisent le
+    même flux, déjà produit puis à venir ; un demandeur plus prioritaire
+    remonte l'appel dans la file s'il n'a pas encore démarré. Un nouvel
+    appel passe par le budget de l'appelant (module ``budget``), qui peut le
+    réduire, le remplacer par une réponse archivée ou le refuser.
+    """
+    key = answer_key(backend, model, messages, params)
+    cached = ANSWERS.get(key)
+    if cached is not None:
+        return SharedStream(text=cached)
+    with _inflight_lock:
+        shared = _join(key, stage, priority)
+    if shared is not None:
+        return shared
+
+    who = budget.current()
+    model, messages, fallback, action = budget.govern(who, backend, model, messages, params, stage)
+    if fallback is not None:
+        return SharedStream(text=fallback)
+    if action != "full":
+        key = answer_key(backend, model, messages, params)
+
+    with _inflight_lock:
+        shared = _join(key, stage, priority)
+        if shared is not None:
+            return shared
+
+        def finished(done):
+            with _inflight_lock:
+                if done._error is None:
+                    ANSWERS.put(key, "".join(done._pieces))
+                _inflight.pop(key, None)
+                REGISTRY.set_gauge("llm_shared_in_flight", len(_inflight))
+            budget.record(who, backend, model, stage, done.usage, action)
+
+        shared = SharedStream(chat(backend, model, messages, params, api_key, stage, priority), on_done=finished)
+        _inflight[key] = shared
+        REGISTRY.set_gauge("llm_shared_in_flight", len(_inflight))
+    return shared.start()
+
+
+def complete(backend, model, messages, params=None, api_key=None, stage="llm", priority=None):
+    """Réponse complète, depuis le cache ``ANSWERS`` ou un appel identique en cours"""
+    return stream(backend, model, messages, params, api_key, stage, priority).text()
@@ -0,0 +1,272 @@
+"""Instrumentation des étapes critiques : chronos, compteurs, taux de cache.
+
+Un registre unique (``REGISTRY``) vit au niveau du processus : il survit aux
+reruns Streamlit et est partagé par toutes les sessions. Les mesures peuvent
+être exportées en JSON (logs structurés) ou au format texte OpenMetrics.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("analyseur.metrics")
+
+# Nombre d'échantillons conservés par série pour le calcul des percentiles
+MAX_SAMPLES = 512
+
+
+def _percentile(values, q):
+    """Percentile par rang le plus proche (valeurs déjà triées)"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+class _Series:
+    """Distribution d'une mesure : totaux cumulés + fenêtre d'échantillons"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "total": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50": round(_percentile(ordered, 0.50), 6),
+            "p95": round(_percentile(ordered, 0.95), 6),
+            "p99": round(_percentile(ordered, 0.99), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class Metrics:
+    """Registre thread-safe des mesures de performance"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._values = {}
+        self._counters = {}
+        self._gauges = {}
+
+    # ------------------------------------------------------------------
+    # Enregistrement
+    # ------------------------------------------------------------------
+    def observe(self, stage, seconds):
+        """Enregistre la durée (en secondes) d'une étape"""
+        with self._lock:
+            self._timings.setdefault(stage, _Series()).add(seconds)
+
+    def observe_value(self, name, value):
+        """Enregistre une valeur quelconque (débit, tailles...)"""
+        with self._lock:
+            self._values.setdefault(name, _Series()).add(value)
+
+    def incr(self, name, value=1):
+        """Incrémente un compteur"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Fixe la valeur instantanée d'une jauge"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        """Ajoute ``delta`` à une jauge (files d'attente, appels en cours)"""
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + delta
+
+    def cache_hit(self, cache):
+        self.incr(f"cache_{cache}_hits")
+
+    def cache_miss(self, cache):
+        self.incr(f"cache_{cache}_misses")
+
+    @contextmanager
+    def timer(self, stage, **fields):
+        """Chronomètre un bloc et émet un événement JSON à la sortie"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(stage, elapsed)
+            log_event(stage, seconds=round(elapsed, 6), **fields)
+
+    # ------------------------------------------------------------------
+    # Lecture / export
+    # ------------------------------------------------------------------
+    def snapshot(self):
+        """Photographie de toutes les mesures (dictionnaire sérialisable)"""
+        with self._lock:
+            counters = dict(self._counters)
+            snapshot = {
+                "timings": {k: s.summary() for k, s in sorted(self._timings.items())},
+                "values": {k: s.summary() for k, s in sorted(self._values.items())},
+                "counters": dict(sorted(counters.items())),
+                "gauges": dict(sorted(self._gauges.items())),
+            }
+        rates = {}
+        for name in counters:
+            if name.startswith("cache_") and name.endswith("_hits"):
+                cache = name[len("cache_"):-len("_hits")]
+                hits = counters[name]
+                total = hits + counters.get(f"cache_{cache}_misses", 0)
+                rates[cache] = round(hits / total, 4) if total else 0.0
+        for name in counters:
+            if name.startswith("cache_") and name.endswith("_misses"):
+                rates.setdefault(name[len("cache_"):-len("_misses")], 0.0)
+        snapshot["cache_hit_rates"] = dict(sorted(rates.items()))
+        return snapshot
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_openmetrics(self):
+        """Export au format texte OpenMetrics (scrapable par Prometheus)"""
+        snap = self.snapshot()
+        lines = []
+
+        def summary_family(family, label, series, unit=""):
+            if not series:
+                return
+            lines.append(f"# TYPE {family} summary")
+            if unit:
+                lines.append(f"# UNIT {family} {unit}")
+            for name, s in series.items():
+                tag = f'{label}="{_escape(name)}"'
+                lines.append(f'{family}{{{tag},quantile="0.5"}} {s["p50"]}')
+                lines.append(f'{family}{{{tag},quantile="0.95"}} {s["p95"]}')
+                lines.append(f'{family}{{{tag},quantile="0.99"}} {s["p99"]}')
+                lines.append(f"{family}_sum{{{tag}}} {s['total']}")
+                lines.append(f"{family}_count{{{tag}}} {s['count']}")
+
+        summary_family("analyseur_stage_seconds", "stage", snap["timings"], "seconds")
+        summary_family("analyseur_value", "name", snap["values"])
+
+        if snap["counters"]:
+            lines.append("# TYPE analyseur_events counter")
+            for name, value in snap["counters"].items():
+                lines.append(f'analyseur_events_total{{name="{_escape(name)}"}} {value}')
+        if snap["gauges"]:
+            lines.append("# TYPE analyseur_gauge gauge")
+            for name, value in snap["gauges"].items():
+                lines.append(f'analyseur_gauge{{name="{_escape(name)}"}} {value}')
+        if snap["cache_hit_rates"]:
+            lines.append("# TYPE analyseur_cache_hit_ratio gauge")
+            for name, value in snap["cache_hit_rates"].items():
+                lines.append(f'analyseur_cache_hit_ratio{{cache="{_escape(name)}"}} {value}')
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._values.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Registre partagé par tout le processus
+REGISTRY = Metrics()
+
+
+def timer(stage, **fields):
+    return REGISTRY.timer(stage, **fields)
+
+
+def log_event(event, **fields):
+    """Émet un log JSON structuré (silencieux tant que le logger n'est pas configuré)"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"ts": time.time(), "event": event, **fields}, ensure_ascii=False, default=str))
+
+
+# ======================================================
+# EXPORT : LOGS JSON ET ENDPOINT OPENMETRICS
+# ======================================================
+_export_lock = threading.Lock()
+_server = None
+
+
+def configure_json_logging(target=None):
+    """Active les logs JSON vers un fichier ou stderr (``ANALYSEUR_METRICS_LOG``)"""
+    target = target or os.getenv("ANALYSEUR_METRICS_LOG")
+    if not target:
+        return
+    with _export_lock:
+        if any(getattr(h, "_analyseur", False) for h in logger.handlers):
+            return
+        handler = logging.StreamHandler() if target == "stderr" else logging.FileHandler(target, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler._analyseur = True
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Expose ``/metrics`` (OpenMetrics) sur un thread dédié ; idempotent.
+
+    Le port vient de ``ANALYSEUR_METRICS_PORT`` si non fourni ; sans port,
+    aucun serveur n'est lancé.
+    """
+    global _server
+    port = port or os.getenv("ANALYSEUR_METRICS_PORT")
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.to_openmetrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _export_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _Handler)
+            except OSError as e:
+                # Port déjà pris (autre application du dépôt lancée en parallèle)
+                logger.warning("Endpoint /metrics indisponible sur le port %s : %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="analyseur-metrics", daemon=True).start()
+        return _server
+
+
+def setup_exports():
+    """Active les exports configurés par variables d'environnement"""
+    configure_json_logging()
+    start_metrics_server()
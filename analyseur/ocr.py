@@ -0,0 +1,176 @@
+"""OCR des pages sans texte (rapports scannés), dans un pool de processus.
+
+Une page dont ``get_text()`` renvoie moins de ``ANALYSEUR_OCR_MIN_CHARS``
+caractères mais qui contient des images est reconnue par Tesseract, via
+l'intégration de PyMuPDF (``get_textpage_ocr``). La page seule est copiée
+dans un PDF d'une page et envoyée à un processus du pool
+(``ANALYSEUR_OCR_WORKERS``) : l'OCR, très coûteux en CPU, ne bloque ni le
+GIL ni la lecture des pages suivantes.
+
+Réglages : ``ANALYSEUR_OCR`` (``on`` / ``off``), ``ANALYSEUR_OCR_DPI``
+(défaut 300), ``ANALYSEUR_OCR_LANG`` (langues Tesseract, défaut
+``fra+eng``). Le texte reconnu est mis en cache par empreinte de la page
+(contenu et images), en mémoire et dans l'archive.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import store
+from .cache import LRUCache
+from .metrics import REGISTRY, log_event
+
+OCR_CACHE = LRUCache("ocr", maxsize=2048)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def enabled():
+    return os.getenv("ANALYSEUR_OCR", "on").lower() not in ("off", "0", "false")
+
+
+def settings():
+    """``(dpi, langues)`` de l'OCR"""
+    return int(os.getenv("ANALYSEUR_OCR_DPI", "300")), os.getenv("ANALYSEUR_OCR_LANG", "fra+eng")
+
+
+def workers():
+    return int(os.getenv("ANALYSEUR_OCR_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+
+def needs_ocr(page, text):
+    """Page sans texte exploitable mais avec des images : probablement scannée"""
+    if len(text.strip()) >= int(os.getenv("ANALYSEUR_OCR_MIN_CHARS", "20")):
+        return False
+    return bool(page.get_images(full=False))
+
+
+def page_hash(pdf, page):
+    """Empreinte du contenu d'une page et de ses images (identique d'un PDF à l'autre)"""
+    digest = hashlib.sha256(page.read_contents())
+    for image in page.get_images(full=False):
+        digest.update(pdf.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # « spawn » : pas de fork d'un processus multi-thread (Streamlit, API)
+            _pool = ProcessPoolExecutor(max_workers=workers(), mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset(broken):
+    """Abandonne un pool cassé (processus Tesseract tué) ; le suivant est recréé à la demande"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+        else:
+            return
+    REGISTRY.incr("ocr_pool_reset")
+    log_event("ocr_pool_reset")
+    broken.shutdown(wait=False)
+
+
+def _recognize(page_pdf, dpi, language):
+    """Exécuté dans un processus du pool : OCR d'un PDF d'une page ; renvoie (texte, durée)"""
+    import fitz  # PyMuPDF
+
+    start = time.perf_counter()
+    pdf = fitz.open(stream=page_pdf, filetype="pdf")
+    try:
+        page = pdf[0]
+        textpage = page.get_textpage_ocr(dpi=dpi, language=language, full=True)
+        text = page.get_text(textpage=textpage)
+    finally:
+        pdf.close()
+    return text, time.perf_counter() - start
+
+
+def submit(pdf, page):
+    """Lance l'OCR d'une page ; renvoie un Future du texte (immédiat si déjà en cache).
+
+    Ne lève pas : une erreur (copie de la page, pool cassé...) est portée par
+    le Future, et ``text_or`` retombe sur le texte natif.
+    """
+    try:
+        return _submit(pdf, page)
+    except Exception as e:
+        failed = Future()
+        failed.set_exception(e)
+        return failed
+
+
+def _submit(pdf, page):
+    import fitz  # PyMuPDF
+
+    dpi, language = settings()
+    key = (page_hash(pdf, page), dpi, language)
+    text = OCR_CACHE.get(key)
+    archive = store.get_store()
+    if text is None and archive is not None:
+        text = archive.ocr_text(*key)
+        if text is not None:
+            OCR_CACHE.put(key, text)
+    if text is not None:
+        future = Future()
+        future.set_result(text)
+        return future
+
+    single = fitz.open()
+    try:
+        single.insert_pdf(pdf, from_page=page.number, to_page=page.number)
+        page_pdf = single.tobytes()
+    finally:
+        single.close()
+    pool = _executor()
+    try:
+        submitted = pool.submit(_recognize, page_pdf, dpi, language)
+    except BrokenProcessPool:
+        # Pool cassé par un OCR précédent : un nouveau pool, un seul nouvel essai
+        _reset(pool)
+        pool = _executor()
+        submitted = pool.submit(_recognize, page_pdf, dpi, language)
+    result = Future()
+
+    def done(future):
+        try:
+            text, elapsed = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                _reset(pool)
+            result.set_exception(e)
+            return
+        # Texte rendu d'abord : un échec du cache ou de l'archive (base verrouillée...)
+        # ne doit pas bloquer l'extraction qui attend ce Future
+        result.set_result(text)
+        try:
+            REGISTRY.observe("page_ocr", elapsed)
+            REGISTRY.incr("pages_ocr")
+            OCR_CACHE.put(key, text)
+            if archive is not None:
+                archive.save_ocr(*key, text)
+        except Exception as e:
+            log_event("ocr_save_failed", error=str(e))
+
+    submitted.add_done_callback(done)
+    return result
+
+
+def text_or(future, fallback, number):
+    """Texte reconnu, ou ``fallback`` (texte natif) si l'OCR a échoué"""
+    try:
+        return future.result()
+    except Exception as e:
+        # Tesseract absent, langue non installée... : la page reste vide, mais on sait pourquoi
+        REGISTRY.incr("ocr_failed")
+        log_event("ocr_failed", page=number, error=str(e))
+        return fallback
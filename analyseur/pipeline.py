@@ -0,0 +1,286 @@
+"""Résumé en flux : la lecture des pages et les appels au modèle se recouvrent.
+
+    lecture (thread) --file bornée--> lots de pages --appels bornés--> notes --> synthèse
+
+Les pages sont lues dans un thread producteur et traversent une file bornée
+(``ANALYSEUR_PIPELINE_QUEUE`` pages). Dès qu'un lot atteint ``chunk_chars``
+caractères, ses notes sont demandées au modèle pendant que la lecture
+continue. Au-delà de ``ANALYSEUR_PIPELINE_INFLIGHT`` lots en cours, le
+consommateur attend le plus ancien : la file se remplit et la lecture se met
+en pause, ce qui borne la mémoire. Les notes sont enfin condensées en une
+synthèse unique, diffusée au fil de la génération.
+"""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import budget, extraction, lazy, llm, prompts, store
+from . import sections as sectioning
+from .metrics import REGISTRY
+
+DEFAULT_CHUNK_CHARS = 12000
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSEUR_PIPELINE_INFLIGHT", "2")), thread_name_prefix="analyseur-pipeline"
+)
+
+
+def prefetch(iterable, maxsize=None):
+    """Parcourt ``iterable`` dans un thread producteur, à travers une file bornée.
+
+    Le producteur se bloque quand la file est pleine ; si le consommateur
+    s'arrête avant la fin, le producteur est interrompu (et ``iterable``
+    fermé s'il s'agit d'un générateur).
+    """
+    maxsize = maxsize or int(os.getenv("ANALYSEUR_PIPELINE_QUEUE", "8"))
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(("item", item)):
+                    break
+            else:
+                put(("done", None))
+        except Exception as e:
+            put(("error", e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+
+    threading.Thread(target=produce, name="analyseur-prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, item = items.get()
+            REGISTRY.set_gauge("pipeline_queued_pages", items.qsize())
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def chunk_pages(pages, chunk_chars=DEFAULT_CHUNK_CHARS, max_length=None, sections=None):
+    """Regroupe les pages en lots d'environ ``chunk_chars`` caractères.
+
+    Produit ``((première page, dernière page), texte)`` avec les repères
+    ``=== [PAGE X] ===``. Au-delà de ``max_length`` caractères, les pages
+    restantes sont encore parcourues (pour l'archive) mais plus envoyées.
+    Avec ``sections``, seules les pages utiles à la synthèse sont gardées et
+    un lot à moitié plein est clos au début d'une section, pour ne pas
+    couper un état financier de ses notes.
+    """
+    keep = sectioning.pages_for(sections, sectioning.SUMMARY_KINDS)
+    starts = {s["start"] for s in sections or [] if s["level"] <= 2}
+    batch, size, total = [], 0, 0
+    first = last = None
+    for number, page in enumerate(pages, start=1):
+        if keep and number not in keep:
+            continue
+        piece = extraction.page_marker(number) + page
+        if max_length is not None:
+            piece = piece[:max(0, max_length - total)]
+        if not piece:
+            continue
+        total += len(piece)
+        if batch and (size + len(piece) > chunk_chars or (number in starts and size >= chunk_chars // 2)):
+            yield (first, last), "".join(batch)
+            batch, size = [], 0
+        if not batch:
+            first = number
+        batch.append(piece)
+        size += len(piece)
+        last = number
+    if batch:
+        yield (first, last), "".join(batch)
+
+
+def summarize_pages(pages, backend, model, summary_length=300, params=None, api_key=None,
+                    chunk_params=None, chunk_chars=DEFAULT_CHUNK_CHARS, max_length=None,
+                    max_inflight=None, single_text=None, sections=None):
+    """Résumé map-reduce d'un flux de pages ; générateur d'événements ``(type, contenu)``.
+
+    - ``("page", n)`` : page ``n`` reçue
+    - ``("chunk", (première, dernière))`` : lot envoyé au modèle
+    - ``("notes", ((première, dernière), notes))`` : notes d'un lot reçues
+    - ``("text", morceau)`` : synthèse finale, au fil de la génération
+    - ``("summary", texte)`` : synthèse complète (dernier événement)
+
+    Un document tenant en un seul lot est résumé directement, avec les
+    mêmes messages qu'un résumé classique : ``single_text()`` fournit alors
+    le texte à résumer (par défaut, celui du lot), ce qui retombe sur la
+    même entrée du cache de réponses. ``sections`` (voir ``chunk_pages``)
+    écarte les pages inutiles et complète la synthèse du sommaire.
+    """
+    max_inflight = max_inflight or int(os.getenv("ANALYSEUR_PIPELINE_INFLIGHT", "2"))
+    chunk_params = params if chunk_params is None else chunk_params
+    start = time.perf_counter()
+    events = deque()
+    pending = deque()
+    notes = []
+
+    def counted(source):
+        for number, page in enumerate(source, start=1):
+            events.append(("page", number))
+            yield page
+
+    def dispatch(span, text):
+        if not pending and not notes:
+            REGISTRY.observe("pipeline_first_dispatch", time.perf_counter() - start)
+        # Contre-pression : pas plus de ``max_inflight`` lots en cours
+        while len(pending) >= max_inflight:
+            collect(block=True)
+        future = _executor.submit(
+            budget.carry(llm.complete), backend, model, prompts.chunk_messages(text), chunk_params, api_key, "chunk"
+        )
+        pending.append((span, future))
+        REGISTRY.set_gauge("pipeline_inflight_chunks", len(pending))
+        events.append(("chunk", span))
+
+    def collect(block):
+        span, future = pending[0]
+        if not block and not future.done():
+            return False
+        pending.popleft()
+        REGISTRY.set_gauge("pipeline_inflight_chunks", len(pending))
+        notes.append((span, future.result()))
+        events.append(("notes", notes[-1]))
+        return True
+
+    # Le premier lot n'est envoyé qu'à l'arrivée du second : un document
+    # tenant en un seul lot est résumé directement, sans notes intermédiaires
+    first, count = None, 0
+    for span, text in chunk_pages(counted(pages), chunk_chars, max_length, sections):
+        count += 1
+        if count == 1:
+            first = (span, text)
+        else:
+            if count == 2:
+                dispatch(*first)
+                first = None
+            dispatch(span, text)
+        while pending and collect(block=False):
+            pass
+        yield from _drain(events)
+    REGISTRY.observe("pipeline_extract", time.perf_counter() - start)
+    yield from _drain(events)
+
+    if count <= 1:
+        text = single_text() if single_text else (first[1] if first else "")
+        messages = prompts.summary_messages(text, summary_length, sections)
+    else:
+        while pending:
+            collect(block=True)
+            yield from _drain(events)
+        messages = prompts.reduce_messages(notes, summary_length, sections)
+
+    response = llm.stream(backend, model, messages, params, api_key, "summary")
+    for piece in response:
+        yield "text", piece
+    summary = response.text()
+    REGISTRY.observe("pipeline_total", time.perf_counter() - start)
+    yield "summary", summary
+
+
+def _drain(events):
+    while events:
+        yield events.popleft()
+
+
+def stream_summary(pdf_file, backend, model, summary_length=300, params=None, api_key=None,
+                   max_length=120000, name=None, **options):
+    """Résumé en flux d'un PDF : la génération commence avant la fin de la lecture.
+
+    Mêmes événements que ``summarize_pages``, plus ``("document", description)``
+    dès la lecture terminée (description identique à ``extract_document`` ;
+    le document est archivé et mis en cache pour les questions suivantes).
+    Un document déjà extrait ou archivé n'est pas relu ; d'un très gros PDF
+    (module ``lazy``), seules les pages utiles à la synthèse sont lues.
+    """
+    name = name or getattr(pdf_file, "name", None)
+    data = extraction.read_upload(pdf_file)
+    document_id = extraction.document_hash(data)
+
+    document = extraction.EXTRACTION_CACHE.get((document_id, max_length))
+    archived = extraction.archived_pages(document_id)
+    large = pdf = None
+    if archived is None and document is None:
+        # Document nouveau : une ouverture sert à la taille, au sommaire et aux
+        # titres (la lecture des pages, dans un autre thread, a la sienne)
+        pdf = extraction.open_pdf(data)
+        large = lazy.open_large(document_id, data, name, pdf)
+        if large is not None:
+            pdf = None
+    elif archived is None and document.get("lazy"):
+        large = lazy.open_large(document_id, data, name)
+    if large is not None:
+        # Très gros PDF : seules les pages utiles à la synthèse (à défaut les
+        # premières) sont extraites, les autres passent sans être lues
+        if document is None:
+            document = lazy.describe(large, max_length)
+            extraction.EXTRACTION_CACHE.put((document_id, max_length), document)
+        sections = document["sections"]
+        wanted = sectioning.pages_for(sections, sectioning.SUMMARY_KINDS) or set(
+            sectioning.split_pages(document["text"])
+        )
+        pages = large.iter_pages(wanted)
+    elif document is not None:
+        sections = document["sections"]
+    elif archived is not None:
+        sections = store.get_store().sections(document_id)
+    else:
+        # Seul le sommaire est lu d'avance ; la détection des titres demanderait
+        # de parcourir toutes les pages avant d'envoyer le premier lot
+        try:
+            sections = sectioning.outline_sections(pdf)
+        except Exception:
+            sections = []
+    if large is None:
+        pages = archived if archived is not None else prefetch(extraction.iter_pages(data))
+    received = []
+
+    def recorded():
+        for page in pages:
+            received.append(page)
+            yield page
+
+    def single_text():
+        if large is not None:
+            return document["text"]
+        return extraction.assemble_text(received, max_length)[0]
+
+    announced = False
+    try:
+        for event in summarize_pages(recorded(), backend, model, summary_length, params, api_key,
+                                     max_length=max_length, single_text=single_text, sections=sections, **options):
+            if not announced and event[0] in ("text", "summary"):
+                if document is None:
+                    if pdf is not None and not sections:
+                        # PDF sans sommaire : titres détectés une fois la lecture finie (PyMuPDF
+                        # ne se partage pas entre threads), comme à l'extraction, avant l'archivage
+                        sections = extraction.document_sections(data, pdf)
+                    document = extraction.remember(
+                        document_id, name, received, max_length, archive=archived is None, sections=sections
+                    )
+                announced = True
+                yield "document", document
+            yield event
+    finally:
+        if pdf is not None:
+            pdf.close()
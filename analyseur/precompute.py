@@ -0,0 +1,202 @@
+"""Précalcul spéculatif dès l'upload : extraction, indexation, résumé, questions types.
+
+Les appels sont lancés en tâche de fond avec exactement les messages et
+paramètres qu'utilisera l'interface : le clic sur « Analyser » et les
+questions suggérées sont alors servis par le cache de réponses, ou se
+rattachent à l'appel déjà en cours (``llm.stream``) au lieu d'en lancer un
+second.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from . import budget, extraction, llm
+from .cache import ANSWERS, LRUCache, make_key
+from .metrics import REGISTRY
+from .sections import split_pages
+
+# Questions posées par défaut ; ``ANALYSEUR_PRECOMPUTE_QUESTIONS`` (séparées par « ; »)
+DEFAULT_QUESTIONS = [
+    "Quel est le chiffre d'affaires ?",
+    "Quel est le résultat net ?",
+    "Quelle est la dette nette ?",
+    "Quelle est la trésorerie disponible ?",
+    "Quelle est la guidance (perspectives) communiquée ?",
+]
+
+# Appels au modèle (bloquants, parfois plusieurs minutes) ; l'extraction et
+# l'indexation ont leur propre pool pour ne pas attendre derrière eux
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSEUR_PRECOMPUTE_WORKERS", "2")), thread_name_prefix="analyseur-precompute"
+)
+_readers = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSEUR_PRECOMPUTE_READERS", "2")), thread_name_prefix="analyseur-precompute-read"
+)
+_handles = LRUCache("precompute", maxsize=32)
+# Fichier uploadé (identifiant Streamlit) -> clé du document : un rerun ne rehashe pas le PDF
+_uploads = LRUCache("precompute_uploads", maxsize=64)
+# Précalculs soumis et pas encore terminés : un rerun ne les resoumet pas
+_submitted = {}
+_submitted_lock = threading.Lock()
+
+
+def standard_questions():
+    configured = os.getenv("ANALYSEUR_PRECOMPUTE_QUESTIONS")
+    if configured:
+        return [q.strip() for q in configured.split(";") if q.strip()]
+    return list(DEFAULT_QUESTIONS)
+
+
+def enabled():
+    return os.getenv("ANALYSEUR_PRECOMPUTE", "on").lower() not in ("off", "0", "false")
+
+
+class Precomputation:
+    """Suivi des calculs lancés pour un document"""
+
+    def __init__(self, document):
+        self.document = document
+        self.summary = None
+        self.answers = {}
+        # Réglages déjà lancés : un rerun aux réglages inchangés ne refait rien
+        self.launched = set()
+
+    def ready(self):
+        """Liste des questions dont la réponse est déjà disponible"""
+        return [q for q, future in self.answers.items() if future.done() and not future.exception()]
+
+
+def _submit_llm(backend, model, messages, params, api_key, stage):
+    key = llm.answer_key(backend, model, messages, params)
+    with _submitted_lock:
+        if key in _submitted:
+            return _submitted[key]
+        cached = ANSWERS.peek(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+        who = budget.current()
+        if not budget.precompute_allowed(who, budget.estimate(messages, params)):
+            # Budget entamé par cet appel : abandonné sans passer par ``govern``,
+            # donc sans ligne « rejected » au registre
+            REGISTRY.incr("precompute_skipped_budget")
+            future = Future()
+            future.set_exception(budget.BudgetExceeded("Précalcul suspendu : budget de tokens entamé"))
+            return future
+
+        def run():
+            try:
+                return llm.complete(backend, model, messages, params, api_key, stage=f"precompute_{stage}")
+            finally:
+                with _submitted_lock:
+                    _submitted.pop(key, None)
+
+        future = _executor.submit(budget.carry(run))
+        _submitted[key] = future
+    REGISTRY.incr("precompute_calls")
+    return future
+
+
+def _index(future):
+    """Index vectoriel du document extrait, en tâche de fond (``ANALYSEUR_EMBEDDINGS=on``)"""
+    from . import embeddings
+
+    if future.exception() or not embeddings.enabled():
+        return
+    document = future.result()
+    pages = extraction.archived_pages(document["id"])
+    if pages:
+        pages = dict(enumerate(pages, start=1))
+    else:
+        # Archive désactivée : pages du texte extrait, sans leur repère
+        pages = {number: text.split("] ===", 1)[-1] for number, text in split_pages(document["text"]).items()}
+    _readers.submit(embeddings.index_document, document["id"], pages)
+
+
+def _document_key(pdf_file, max_length):
+    """``((hash, max_length), bytes ou None)`` ; les bytes ne sont lus que pour un fichier inconnu"""
+    upload_id = getattr(pdf_file, "file_id", None)
+    if upload_id is not None:
+        key = _uploads.peek((upload_id, max_length))
+        if key is not None:
+            return key, None
+    data = extraction.read_upload(pdf_file)
+    key = (extraction.document_hash(data), max_length)
+    if upload_id is not None:
+        _uploads.put((upload_id, max_length), key)
+    return key, data
+
+
+def _settings_key(backend, model, summary_messages, summary_params, question_messages, question_params, questions):
+    """Empreinte des réglages : les consignes (messages sur un texte vide) portent la longueur du résumé"""
+    return make_key(
+        backend, model, summary_params, question_params, questions,
+        summary_messages("") if summary_messages else None,
+        question_messages("", "") if question_messages else None,
+    )
+
+
+def start(pdf_file, max_length=120000, backend=None, model=None, api_key=None,
+          summary_messages=None, summary_params=None,
+          question_messages=None, question_params=None, questions=None):
+    """Lance le précalcul pour un PDF ; peut être rappelé à chaque rerun.
+
+    L'extraction n'est lancée qu'une fois par fichier, les appels au modèle
+    une fois par document et réglages : un rerun aux réglages inchangés
+    rend aussitôt la main, sans relire ni rehasher le PDF. Sans ``backend``, seules l'extraction
+    et l'indexation sont anticipées (plus l'index vectoriel avec
+    ``ANALYSEUR_EMBEDDINGS=on``). ``summary_messages(text)`` et
+    ``question_messages(question, text)`` construisent les messages
+    exactement comme l'interface ; ils reçoivent aussi les sections du
+    document (argument nommé ``sections``).
+    """
+    name = getattr(pdf_file, "name", None)
+    key, data = _document_key(pdf_file, max_length)
+    handle = _handles.peek(key)
+    if handle is None:
+        if data is None:
+            data = extraction.read_upload(pdf_file)
+        handle = Precomputation(_readers.submit(extraction.extract_document, data, max_length, name))
+        _handles.put(key, handle)
+        handle.document.add_done_callback(_index)
+        REGISTRY.incr("precompute_started")
+
+    if backend and (summary_messages or question_messages):
+        questions = standard_questions() if questions is None else questions
+        settings = _settings_key(
+            backend, model, summary_messages, summary_params, question_messages, question_params, questions
+        )
+        if settings in handle.launched:
+            return handle
+        if not budget.precompute_allowed(budget.current()):
+            # Budget de l'appelant entamé : rien n'est lancé (ni compté) ; un rerun
+            # après le changement de fenêtre reprend le précalcul
+            REGISTRY.incr("precompute_skipped_budget")
+            return handle
+        handle.launched.add(settings)
+
+        def launch(future):
+            if future.exception():
+                return
+            document = future.result()
+            text, sections = document["text"], document["sections"]
+            with budget.caller(document=document["id"]):
+                if summary_messages:
+                    handle.summary = _submit_llm(
+                        backend, model, summary_messages(text, sections=sections), summary_params, api_key, "summary"
+                    )
+                if question_messages:
+                    handle.answers = {
+                        question: _submit_llm(
+                            backend, model, question_messages(question, text, sections=sections),
+                            question_params, api_key, "question"
+                        )
+                        for question in questions
+                    }
+
+        # Précalcul décompté du budget de la session qui a envoyé le document ;
+        # messages construits hors du thread du script, même si l'extraction est finie
+        carried = budget.carry(launch)
+        handle.document.add_done_callback(lambda future: _readers.submit(carried, future))
+    return handle
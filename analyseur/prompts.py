@@ -0,0 +1,121 @@
+"""Consignes envoyées aux modèles, communes à l'interface et à l'API."""
+from . import sections as sectioning
+
+
+def summary_prompt(summary_length=300):
+    """Consigne de synthèse financière structurée"""
+    return f"""Tu es analyste financier expert. On te fournit le texte d'un document financier
+(rapport annuel, trimestriel, comptes, bilan, annexes).
+
+Produis une synthèse **précise et chiffrée** en Markdown selon ce cadre :
+
+- **Société / Période / Devise** : (si repérable)
+- **Résumé exécutif** : activité, faits marquants, contexte ({summary_length//4}-{summary_length//3} lignes)
+- **Chiffres clés** (tableau) :
+ | Indicateur | Valeur | Évolution/Contexte | Période | Page |
+ |---|---:|---|---|---:|
+ (exemples : Chiffre d'affaires, EBIT/EBITDA, Résultat net, Marge, FCF, CAPEX,
+ Dette nette, Trésorerie, etc.)
+- **Analyse** :
+ - Performance (croissance, marges, cash)
+ - Structure financière (dette, liquidité)
+ - Risques & incertitudes (marché, réglementation, change)
+ - Outlook / Guidance (si communiqué)
+- **Références internes** : pages/sections à relire
+
+Exigences :
+- **N'invente aucun chiffre**. Si une valeur n'apparaît pas clairement : `non précisé`.
+- Cite la **Page** d'origine quand c'est possible (repère `=== [PAGE X] ===`).
+- 6 à 12 **indicateurs quantitatifs** maximum (les plus utiles).
+- Reste concis : {summary_length-50}-{summary_length+50} mots hors tableau."""
+
+
+QUESTION_PROMPT = """Tu es analyste financier. On te donne un extrait de rapport financier.
+Réponds uniquement à la question posée, sans inventer de données.
+Si la réponse n'est pas claire dans le texte, écris : 'non précisé'.
+Quand c'est possible, indique aussi la page d'origine (repère '=== [PAGE X] ===').
+Sois concis et précis."""
+
+
+def summary_context(text, sections=None):
+    """Texte à synthétiser : avec des sections connues, sommaire puis pages utiles seulement"""
+    if not sections:
+        return text
+    focused = sectioning.focus_text(text, sections, sectioning.SUMMARY_KINDS)
+    return f"Sommaire du document :\n{sectioning.table_of_contents(sections)}\n{focused}"
+
+
+def question_context(question, text, sections=None):
+    """Texte utile pour une question : pages des sections concernées, sinon tout le texte"""
+    if not sections:
+        return text
+    return sectioning.focus_text(text, sections, sectioning.kinds_for_question(question))
+
+
+def summary_messages(text, summary_length=300, sections=None):
+    return [
+        {"role": "system", "content": summary_prompt(summary_length)},
+        {"role": "user", "content": summary_context(text, sections)}
+    ]
+
+
+def question_messages(question, text, sections=None):
+    return [
+        {"role": "system", "content": QUESTION_PROMPT},
+        {"role": "user", "content": f"Question : {question}\n\nTexte PDF :\n{question_context(question, text, sections)}"}
+    ]
+
+
+def question_of(messages):
+    """Question posée dans des messages de ``question_messages`` (None pour un autre appel)"""
+    content = messages[-1]["content"] if messages else ""
+    if not content.startswith("Question : "):
+        return None
+    return content[len("Question : "):].split("\n\nTexte PDF :", 1)[0]
+
+
+CHUNK_PROMPT = """Tu es analyste financier. On te donne un extrait (quelques pages) d'un rapport financier.
+Relève uniquement les faits utiles à une synthèse : indicateurs chiffrés (valeur, unité, période),
+faits marquants, risques et perspectives. Une ligne par fait, avec sa page (repère '=== [PAGE X] ===').
+N'invente rien ; si l'extrait ne contient rien d'utile, réponds : 'rien à signaler'."""
+
+
+def chunk_messages(text):
+    """Notes intermédiaires sur un lot de pages (étape « map » du résumé en flux)"""
+    return [
+        {"role": "system", "content": CHUNK_PROMPT},
+        {"role": "user", "content": text}
+    ]
+
+
+def reduce_messages(notes, summary_length=300, sections=None):
+    """Synthèse finale à partir des notes de chaque lot (étape « reduce »)"""
+    text = "Notes extraites du document, lot par lot :\n\n" + "\n\n".join(
+        f"--- Notes (pages {first}-{last}) ---\n{note}" for (first, last), note in notes
+    )
+    if sections:
+        text = f"Sommaire du document :\n{sectioning.table_of_contents(sections)}\n\n{text}"
+    return [
+        {"role": "system", "content": summary_prompt(summary_length)},
+        {"role": "user", "content": text}
+    ]
+
+
+CHECKLIST_PROMPT = """Tu es analyste financier. On te donne un extrait de rapport financier et une liste
+de questions numérotées. Réponds à chaque question uniquement à partir du texte, sans inventer de données.
+
+Réponds exclusivement en JSON, sans texte autour, au format :
+{"reponses": [{"id": 1, "reponse": "...", "valeur": "...", "pages": [12, 13]}]}
+
+- "reponse" : phrase courte ; 'non précisé' si le texte ne permet pas de répondre
+- "valeur" : le chiffre clé avec son unité et sa période (ex. "96,8 Md$ (2023)"), sinon ""
+- "pages" : pages d'origine (repères '=== [PAGE X] ==='), liste vide si inconnues"""
+
+
+def checklist_messages(questions, text):
+    """Plusieurs questions sur un même extrait, réponses structurées en un seul appel"""
+    numbered = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, start=1))
+    return [
+        {"role": "system", "content": CHECKLIST_PROMPT},
+        {"role": "user", "content": f"Questions :\n{numbered}\n\nTexte PDF :\n{text}"}
+    ]
@@ -0,0 +1,146 @@
+"""File d'attente à priorités devant les modèles.
+
+Trois classes d'appels se partagent ``ANALYSEUR_LLM_CONCURRENCY`` places :
+
+- ``interactive`` : questions posées par un utilisateur qui attend la réponse
+- ``precompute`` : précalculs spéculatifs lancés à l'upload
+- ``batch`` : résumés complets, lots du résumé en flux, tâches de l'API
+
+Une place libérée va à la demande la plus prioritaire, dans la limite de
+sa classe (``ANALYSEUR_LLM_LIMITS``, ex. ``interactive=4,precompute=2,batch=2``).
+Pour éviter la famine, la priorité d'une demande augmente d'un cran toutes
+les ``ANALYSEUR_LLM_AGING`` secondes d'attente. Un résumé découpé en lots
+libère sa place entre deux lots : une question passe alors devant la suite.
+"""
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import REGISTRY
+
+# Classe -> rang (0 = la plus prioritaire)
+PRIORITIES = {"interactive": 0, "precompute": 1, "batch": 2}
+
+
+def priority_for(stage):
+    """Classe par défaut d'un appel d'après son étape"""
+    if stage.startswith("precompute"):
+        return "precompute"
+    if stage in ("question", "questions", "chat"):
+        return "interactive"
+    return "batch"
+
+
+def _parse_limits(spec, total):
+    limits = {"interactive": total, "precompute": max(1, total // 2), "batch": max(1, total // 2)}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, value = item.partition("=")
+        if name.strip() not in PRIORITIES:
+            raise ValueError(f"Classe de priorité inconnue : {name}")
+        limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+class Ticket:
+    """Demande de place en attente (ou servie)"""
+
+    def __init__(self, klass):
+        if klass not in PRIORITIES:
+            raise ValueError(f"Classe de priorité inconnue : {klass}")
+        self.klass = klass
+        self.order = None
+        self.queued = None
+        self.started = None
+
+    def rank(self, now, aging):
+        """Priorité effective : rang de la classe moins les crans gagnés en attendant"""
+        bonus = (now - self.queued) / aging if aging > 0 else 0
+        return PRIORITIES[self.klass] - bonus, self.order
+
+
+class Scheduler:
+    """Places d'appel au modèle, attribuées par priorité avec vieillissement"""
+
+    def __init__(self, total=None, limits=None, aging=None):
+        self.total = int(total or os.getenv("ANALYSEUR_LLM_CONCURRENCY", "4"))
+        self.limits = dict(limits) if limits else _parse_limits(os.getenv("ANALYSEUR_LLM_LIMITS"), self.total)
+        self.aging = float(aging if aging is not None else os.getenv("ANALYSEUR_LLM_AGING", "30"))
+        self._changed = threading.Condition()
+        self._waiting = []
+        self._running = dict.fromkeys(PRIORITIES, 0)
+        self._order = itertools.count()
+
+    def _eligible(self, ticket, now):
+        if sum(self._running.values()) >= self.total or self._running[ticket.klass] >= self.limits[ticket.klass]:
+            return False
+        # Seule la meilleure demande parmi celles dont la classe a une place libre passe
+        candidates = [t for t in self._waiting if self._running[t.klass] < self.limits[t.klass]]
+        return min(candidates, key=lambda t: t.rank(now, self.aging)) is ticket
+
+    def acquire(self, ticket):
+        """Attend une place pour ``ticket`` (ou une classe) ; renvoie le ticket à rendre"""
+        if isinstance(ticket, str):
+            ticket = Ticket(ticket)
+        with self._changed:
+            ticket.order = next(self._order)
+            ticket.queued = time.perf_counter()
+            self._waiting.append(ticket)
+            self._publish()
+            while not self._eligible(ticket, time.perf_counter()):
+                # Réveil périodique : le vieillissement change l'ordre sans autre événement
+                self._changed.wait(timeout=min(1.0, self.aging or 1.0))
+            self._waiting.remove(ticket)
+            self._running[ticket.klass] += 1
+            ticket.started = time.perf_counter()
+            self._publish()
+            self._changed.notify_all()
+
+        waited = ticket.started - ticket.queued
+        REGISTRY.observe("llm_queue_wait", waited)
+        REGISTRY.observe(f"llm_queue_wait_{ticket.klass}", waited)
+        if self.aging > 0 and waited >= self.aging and ticket.klass != "interactive":
+            REGISTRY.incr("llm_aged_dispatch")
+        return ticket
+
+    def release(self, ticket):
+        with self._changed:
+            self._running[ticket.klass] -= 1
+            self._publish()
+            self._changed.notify_all()
+
+    def promote(self, ticket, klass):
+        """Passe une demande pas encore servie dans une classe plus prioritaire"""
+        with self._changed:
+            if ticket.started is None and PRIORITIES[klass] < PRIORITIES[ticket.klass]:
+                ticket.klass = klass
+                self._publish()
+                self._changed.notify_all()
+
+    @contextmanager
+    def slot(self, klass):
+        ticket = self.acquire(klass)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _publish(self):
+        for klass in PRIORITIES:
+            REGISTRY.set_gauge(f"llm_queued_{klass}", sum(1 for t in self._waiting if t.klass == klass))
+            REGISTRY.set_gauge(f"llm_running_{klass}", self._running[klass])
+
+    def snapshot(self):
+        with self._changed:
+            return {
+                klass: {
+                    "running": self._running[klass],
+                    "queued": sum(1 for t in self._waiting if t.klass == klass),
+                    "limit": self.limits[klass],
+                }
+                for klass in PRIORITIES
+            }
+
+
+SCHEDULER = Scheduler()
@@ -0,0 +1,234 @@
+"""Découpage des rapports en sections (sommaire du PDF ou titres détectés).
+
+Chaque section est un dictionnaire ``title``, ``level`` (1 = chapitre),
+``kind`` (famille reconnue : ``compte_resultat``, ``bilan``, ``risques``...,
+ou None), ``start`` et ``end`` (pages, incluses). La liste est ordonnée
+comme le document ; ``level`` en donne l'arborescence.
+
+Les sections servent à n'envoyer au modèle que les pages utiles : états
+financiers pour les chiffres clés, section « Risques » pour une question
+sur les risques, etc.
+"""
+import re
+from collections import Counter
+
+from .figures import INDICATORS
+from .metrics import REGISTRY
+
+# Famille de section -> motifs (insensibles à la casse) reconnus dans le titre
+SECTION_KINDS = {
+    "chiffres_cles": [r"chiffres?[- ]cl[ée]s", r"faits marquants", r"highlights", r"key figures"],
+    "rapport_gestion": [r"rapport (?:de|sur la) gestion", r"commentaires? sur (?:les résultats|l['’]activité)",
+                        r"management['’]s discussion", r"\bMD&A\b", r"analyse (?:des résultats|financière)"],
+    "compte_resultat": [r"compte de résultat", r"income statement", r"statements? of (?:operations|income)",
+                        r"profit (?:and|&) loss", r"résultats? consolidés?"],
+    "bilan": [r"\bbilan", r"balance sheet", r"(?:statement of )?financial position", r"situation financière"],
+    "flux_tresorerie": [r"flux de trésorerie", r"cash[- ]flows?", r"tableau de financement"],
+    "capitaux_propres": [r"variation des capitaux propres", r"changes in (?:shareholders['’]? )?equity"],
+    "risques": [r"\brisques?\b", r"risk factors", r"\brisks?\b", r"gestion des risques"],
+    "perspectives": [r"perspectives", r"\boutlook\b", r"\bguidance\b", r"objectifs"],
+    "notes": [r"\bnotes?\b(?: annexes?| to the)", r"\bannexes?\b", r"méthodes comptables", r"accounting policies"],
+    "gouvernance": [r"gouvernance", r"governance", r"rémunération", r"conseil d['’]administration"],
+}
+
+# Indicateur (``figures.INDICATORS``) -> sections où le chercher
+INDICATOR_KINDS = {
+    "chiffre_affaires": ["chiffres_cles", "compte_resultat", "rapport_gestion"],
+    "ebitda": ["chiffres_cles", "compte_resultat", "rapport_gestion"],
+    "ebit": ["chiffres_cles", "compte_resultat", "rapport_gestion"],
+    "resultat_net": ["chiffres_cles", "compte_resultat", "rapport_gestion"],
+    "marge": ["chiffres_cles", "compte_resultat", "rapport_gestion"],
+    "dette_brute": ["chiffres_cles", "bilan", "notes"],
+    "dette_nette": ["chiffres_cles", "bilan", "rapport_gestion"],
+    "tresorerie": ["chiffres_cles", "bilan", "flux_tresorerie"],
+    "capex": ["flux_tresorerie", "rapport_gestion"],
+    "fcf": ["chiffres_cles", "flux_tresorerie", "rapport_gestion"],
+    "total_actif": ["bilan"],
+    "total_passif": ["bilan"],
+    "capitaux_propres": ["bilan", "capitaux_propres"],
+    "cout_du_risque": ["chiffres_cles", "risques", "compte_resultat"],
+    "cet1": ["chiffres_cles", "risques"],
+    "lcr": ["chiffres_cles", "risques"],
+    "nsfr": ["chiffres_cles", "risques"],
+}
+
+# Sections utiles à la synthèse et au tableau « Chiffres clés »
+SUMMARY_KINDS = (
+    "chiffres_cles", "rapport_gestion", "compte_resultat", "bilan", "flux_tresorerie", "risques", "perspectives",
+)
+
+_KIND_PATTERNS = [
+    (kind, re.compile(pattern, re.IGNORECASE)) for kind, patterns in SECTION_KINDS.items() for pattern in patterns
+]
+_INDICATOR_PATTERNS = [
+    (name, re.compile(pattern, re.IGNORECASE)) for name, patterns in INDICATORS.items() for pattern in patterns
+]
+_PAGE_MARKER = re.compile(r"\n\n=== \[PAGE (\d+)\] ===\n")
+_NOT_A_TITLE = re.compile(r"^[\d\s.,%()€$–—-]+$")
+
+# Titre détecté : police au moins 15 % plus grande que le corps de texte
+HEADING_SCALE = 1.15
+MAX_TITLE_CHARS = 90
+# Texte répété sur plus de cette part des pages : en-tête ou pied de page courant
+RUNNING_HEADER_SHARE = 0.3
+
+
+def classify(title):
+    """Famille d'une section d'après son titre (None si non reconnue)"""
+    for kind, pattern in _KIND_PATTERNS:
+        if pattern.search(title):
+            return kind
+    return None
+
+
+def _with_ranges(entries, page_count):
+    """``(niveau, titre, page)`` -> sections avec pages de début et de fin"""
+    sections = []
+    for i, (level, title, start) in enumerate(entries):
+        end = page_count
+        for next_level, _, next_start in entries[i + 1:]:
+            if next_level <= level:
+                # Une section suivante commençant sur la même page la partage
+                end = max(start, next_start - 1)
+                break
+        sections.append({"title": title, "level": level, "kind": classify(title), "start": start, "end": end})
+    return sections
+
+
+def outline_sections(pdf):
+    """Sections d'après le sommaire (signets) d'un document ``fitz`` ouvert"""
+    entries = [
+        (level, " ".join(title.split()), page)
+        for level, title, page, *_ in pdf.get_toc(simple=True)
+        if page >= 1 and title.strip()
+    ]
+    return _with_ranges(entries, pdf.page_count)
+
+
+def detect_headings(pdf, max_levels=3):
+    """Titres repérés par la taille et la graisse de police (``get_text("dict")``)"""
+    sizes = Counter()
+    candidates = []
+    for number, page in enumerate(pdf, start=1):
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if not spans:
+                    continue
+                text = " ".join(" ".join(span["text"].split()) for span in spans)
+                size = round(max(span["size"] for span in spans), 1)
+                sizes[size] += len(text)
+                if len(text) <= MAX_TITLE_CHARS and not _NOT_A_TITLE.match(text):
+                    bold = all(span["flags"] & 16 or "bold" in span["font"].lower() for span in spans)
+                    candidates.append((number, text, size, bold))
+    if not sizes:
+        return []
+
+    body = sizes.most_common(1)[0][0]
+    headings = [
+        (index, number, text, size) for index, (number, text, size, bold) in enumerate(candidates)
+        if size >= body * HEADING_SCALE or (bold and size >= body and len(text) >= 4)
+    ]
+    pages_per_text = Counter(text for _, text in {(h[1], h[2].lower()) for h in headings})
+    running = {text for text, count in pages_per_text.items() if count > RUNNING_HEADER_SHARE * pdf.page_count}
+    headings = [h for h in headings if h[2].lower() not in running]
+
+    # Plus grande police = niveau 1 ; titres en gras à la taille du corps : dernier niveau
+    levels = {size: i + 1 for i, size in enumerate(sorted({h[3] for h in headings if h[3] > body}, reverse=True))}
+    entries = []
+    previous = None
+    for index, number, text, size in headings:
+        level = min(levels.get(size, len(levels) + 1), max_levels)
+        if entries and previous == index - 1 and entries[-1][0] == level:
+            # Titre sur plusieurs lignes consécutives
+            entries[-1] = (level, f"{entries[-1][1]} {text}", number)
+        else:
+            entries.append((level, text, number))
+        previous = index
+    return _with_ranges(entries, pdf.page_count)
+
+
+def build_sections(data, pdf=None):
+    """Sections d'un PDF (bytes) : sommaire du document, sinon titres détectés.
+
+    Avec ``pdf`` (document ``fitz`` déjà ouvert), il n'est ni rouvert ni refermé.
+    """
+    import fitz  # PyMuPDF
+
+    with REGISTRY.timer("sections", size=len(data)):
+        opened = pdf if pdf is not None else fitz.open(stream=data, filetype="pdf")
+        try:
+            sections = outline_sections(opened)
+            source = "outline"
+            if not sections:
+                sections = detect_headings(opened)
+                source = "headings"
+        finally:
+            if pdf is None:
+                opened.close()
+    REGISTRY.incr(f"sections_from_{source}")
+    return sections
+
+
+# ----------------------------------------------------------------------
+# Sélection des pages utiles
+# ----------------------------------------------------------------------
+def kinds_for_question(question):
+    """Familles de sections pertinentes pour une question (vide si inconnue)"""
+    kinds = []
+    for name, pattern in _INDICATOR_PATTERNS:
+        if pattern.search(question):
+            kinds.extend(INDICATOR_KINDS.get(name, []))
+    kind = classify(question)
+    if kind:
+        kinds.append(kind)
+    return list(dict.fromkeys(kinds))
+
+
+def pages_for(sections, kinds):
+    """Pages couvertes par les sections des familles ``kinds``"""
+    pages = set()
+    for section in sections or []:
+        if section["kind"] in kinds:
+            pages.update(range(section["start"], section["end"] + 1))
+    return pages
+
+
+def split_pages(text):
+    """Texte avec repères ``=== [PAGE X] ===`` -> {numéro: texte de la page, repère compris}"""
+    markers = list(_PAGE_MARKER.finditer(text))
+    return {
+        int(marker.group(1)): text[marker.start():markers[i + 1].start() if i + 1 < len(markers) else len(text)]
+        for i, marker in enumerate(markers)
+    }
+
+
+def focus_text(text, sections, kinds):
+    """Ne garde que les pages des sections ``kinds`` (texte complet si aucune)"""
+    pages = pages_for(sections, kinds)
+    if not pages:
+        return text
+    read_pages = getattr(sections, "read_pages", None)
+    if read_pages is not None:
+        # Document ouvert à la demande (module ``lazy``) : les pages utiles sont
+        # lues dans le PDF, le texte ne contenant que les premières ; refermé
+        # entre-temps, on retombe sur ces premières pages
+        focused = read_pages(pages)
+        if focused:
+            return focused
+    by_page = split_pages(text)
+    kept = [by_page[number] for number in sorted(by_page) if number in pages]
+    if not kept:
+        return text
+    focused = "".join(kept)
+    REGISTRY.observe_value("sections_focus_ratio", len(focused) / max(len(text), 1))
+    return focused
+
+
+def table_of_contents(sections, max_level=2, limit=40):
+    """Sommaire lisible (``- Titre (p. 3-7)``) pour les consignes du modèle"""
+    lines = [
+        f"{'  ' * (s['level'] - 1)}- {s['title']} (p. {s['start']}-{s['end']})"
+        for s in sections or [] if s["level"] <= max_level
+    ]
+    return "\n".join(lines[:limit])
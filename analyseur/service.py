@@ -0,0 +1,269 @@
+"""Pipeline d'analyse sans interface : documents, tâches de fond, résultats.
+
+Un ``AnalyzerService`` regroupe le pool de workers et les caches du
+processus. L'API HTTP l'utilise directement ; lancée dans le même processus
+que Streamlit (``ANALYSEUR_API_PORT``), elle partage aussi les caches
+d'extraction et de réponses avec l'interface.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import budget, checklist, extraction, llm, prompts, store
+from .cache import ANSWERS, LRUCache
+from .metrics import REGISTRY
+
+DEFAULT_MODELS = {
+    "ollama": "llama3.1:8b",
+    "openrouter": "mistralai/mistral-7b-instruct",
+    "mock": "mock",
+}
+
+# Nombre de tâches terminées conservées pour ``GET /jobs/{id}``
+MAX_FINISHED_JOBS = 1000
+
+
+class ServiceBusy(RuntimeError):
+    """File de tâches pleine : le client doit réessayer plus tard"""
+
+
+class UnknownDocument(KeyError):
+    """Document absent (jamais envoyé ou évincé du cache)"""
+
+
+class Job:
+    """Tâche de fond (résumé) suivie par identifiant"""
+
+    def __init__(self, kind, document_id):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.document_id = document_id
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "document_id": self.document_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "cached": self.cached,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class AnalyzerService:
+    """Extraction, résumé et questions/réponses avec concurrence bornée"""
+
+    def __init__(self, backend=None, model=None, api_key=None, workers=None, max_pending=None):
+        self.backend = backend or os.getenv("ANALYSEUR_BACKEND", "ollama")
+        if self.backend not in llm.BACKENDS:
+            raise ValueError(f"Backend LLM inconnu : {self.backend}")
+        self.model = model or os.getenv("ANALYSEUR_MODEL") or DEFAULT_MODELS[self.backend]
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+        self.workers = int(workers or os.getenv("ANALYSEUR_WORKERS", "4"))
+        self.max_pending = int(max_pending or os.getenv("ANALYSEUR_MAX_PENDING", "64"))
+
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analyseur")
+        self.documents = LRUCache("documents", maxsize=32)
+        self._jobs = {}
+        # Résumé et réponses déjà calculés, par document (les plus anciens sortent)
+        self._results = LRUCache("api_results", maxsize=int(os.getenv("ANALYSEUR_RESULTS_CACHE", "256")))
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Documents
+    # ------------------------------------------------------------------
+    def add_document(self, data, name=None, max_length=120000):
+        """Extrait un PDF (bytes) et l'enregistre ; renvoie sa description"""
+        document = extraction.extract_document(data, max_length, name)
+        self.documents.put(document["id"], document)
+        return document
+
+    def document(self, document_id):
+        """Document envoyé à ce service, sinon rouvert depuis l'archive"""
+        document = self.documents.peek(document_id)
+        if document is None:
+            document = extraction.reopen_document(document_id)
+            if document is None:
+                raise UnknownDocument(document_id)
+            self.documents.put(document_id, document)
+        return document
+
+    @staticmethod
+    def describe(document):
+        """Description publique d'un document (sans le texte)"""
+        return {k: v for k, v in document.items() if k != "text"}
+
+    # ------------------------------------------------------------------
+    # Tâches de fond
+    # ------------------------------------------------------------------
+    def submit(self, kind, document_id, fn, *args):
+        """Planifie ``fn(*args)`` sur le pool ; lève ``ServiceBusy`` si saturé"""
+        job = Job(kind, document_id)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                REGISTRY.incr("jobs_rejected")
+                raise ServiceBusy(f"{self._pending} tâches en attente")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._prune_jobs()
+        REGISTRY.set_gauge("jobs_pending", self._pending)
+        self.executor.submit(budget.carry(self._run), job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        job.started = time.time()
+        REGISTRY.observe("job_queue_wait", job.started - job.created)
+        try:
+            job.result = fn(*args)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+            REGISTRY.incr("jobs_failed")
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+            REGISTRY.set_gauge("jobs_pending", self._pending)
+
+    def _prune_jobs(self):
+        finished = [j for j in self._jobs.values() if j.finished]
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def job(self, job_id):
+        return self._jobs.get(job_id)
+
+    # ------------------------------------------------------------------
+    # Résumé et questions
+    # ------------------------------------------------------------------
+    def _summary_call(self, document_id, summary_length, temperature, model):
+        document = self.document(document_id)
+        messages = prompts.summary_messages(document["text"], summary_length, document["sections"])
+        params = {"temperature": temperature, "num_predict": 2000}
+        return model or self.model, messages, params
+
+    def _question_call(self, document_id, question, temperature, model):
+        document = self.document(document_id)
+        messages = prompts.question_messages(question, document["text"], document["sections"])
+        params = {"temperature": temperature, "num_predict": 500}
+        return model or self.model, messages, params
+
+    def _result(self, document_id):
+        """Résultats du document, créés au premier usage"""
+        with self._lock:
+            result = self._results.get(document_id)
+            if result is None:
+                result = {"summary": None, "answers": {}}
+                self._results.put(document_id, result)
+            return result
+
+    def summarize(self, document_id, summary_length=300, temperature=0.3, model=None):
+        model, messages, params = self._summary_call(document_id, summary_length, temperature, model)
+        with budget.caller(document=document_id):
+            summary = llm.complete(self.backend, model, messages, params, self.api_key, stage="summary")
+        store.save_summary(document_id, summary, model, {"summary_length": summary_length, **params})
+        self._result(document_id)["summary"] = summary
+        return summary
+
+    def submit_summary(self, document_id, summary_length=300, temperature=0.3, model=None):
+        """Résumé en tâche de fond ; immédiatement terminé si déjà en cache"""
+        self.document(document_id)
+        call = self._summary_call(document_id, summary_length, temperature, model)
+        cached = ANSWERS.peek(llm.answer_key(self.backend, *call))
+        if cached is not None:
+            job = Job("summary", document_id)
+            job.status, job.result, job.cached = "done", cached, True
+            job.started = job.finished = job.created
+            REGISTRY.cache_hit("answers")
+            with self._lock:
+                self._jobs[job.id] = job
+            self._result(document_id)["summary"] = cached
+            return job
+        return self.submit("summary", document_id, self.summarize, document_id, summary_length, temperature, model)
+
+    def answer(self, document_id, question, temperature=0.1, model=None):
+        return "".join(self.stream_answer(document_id, question, temperature, model))
+
+    def stream_answer(self, document_id, question, temperature=0.1, model=None):
+        """Réponse morceau par morceau (un seul morceau si déjà en cache).
+
+        Un appel identique déjà en cours (autre client, précalcul) est suivi
+        au lieu d'être relancé.
+        """
+        model, messages, params = self._question_call(document_id, question, temperature, model)
+        cached = llm.is_cached(self.backend, model, messages, params)
+        start = time.perf_counter()
+        with budget.caller(document=document_id):
+            response = llm.stream(self.backend, model, messages, params, self.api_key, stage="question")
+        yield from response
+        answer = response.text()
+        self._result(document_id)["answers"][question] = answer
+        store.save_answer(
+            document_id, question, answer, model, self.backend, time.perf_counter() - start, cached, response.usage
+        )
+
+    def checklist(self, document_id, questions, temperature=0.1, model=None):
+        """Liste de questions, groupées par contexte partagé : ``(lignes, statistiques)``"""
+        document = self.document(document_id)
+        with budget.caller(document=document_id):
+            rows, stats = checklist.answer_checklist(
+                questions, document["text"], document["sections"], self.backend, model or self.model,
+                {"temperature": temperature}, self.api_key,
+            )
+        answers = self._result(document_id)["answers"]
+        for row in rows:
+            answers[row["question"]] = row["reponse"]
+        return rows, stats
+
+    def results(self, document_id):
+        """Résultats déjà calculés pour un document (résumé, réponses)"""
+        document = self.document(document_id)
+        results = dict(self._results.peek(document_id) or {"summary": None, "answers": {}})
+        archive = store.get_store()
+        if results["summary"] is None and archive:
+            results["summary"] = archive.latest_summary(document_id)
+        return {"document": self.describe(document), **results}
+
+    def search(self, query, limit=20):
+        """Recherche plein texte dans l'archive (pages classées par pertinence)"""
+        archive = store.get_store()
+        return archive.search(query, limit) if archive else []
+
+    def semantic_search(self, query, k=10):
+        """Passages les plus proches par le sens (index vectoriel, ``analyseur.embeddings``)"""
+        from . import embeddings
+
+        return embeddings.search(query, k)
+
+    def usage(self, by="user", days=None):
+        """Tokens consommés par session, utilisateur, document, modèle... (``analyseur.budget``)"""
+        return budget.report(by, days)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """Service du processus, configuré par variables d'environnement"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AnalyzerService()
+        return _service
@@ -0,0 +1,450 @@
+"""Archive locale SQLite (FTS5) des documents analysés.
+
+Pages, sections, indicateurs repérés, résumés générés, questions/réponses,
+tokens consommés et texte reconnu par OCR sont conservés d'une session à
+l'autre : un rapport déjà analysé se rouvre sans nouvelle extraction, et une
+recherche plein texte (``coût du risque``) couvre toute l'archive.
+
+Emplacement : ``ANALYSEUR_DB`` (défaut ``data/analyseur.sqlite3`` à la racine
+du dépôt) ; ``ANALYSEUR_DB=off`` désactive l'archive.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .figures import extract_figures
+from .metrics import REGISTRY
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "data" / "analyseur.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    pages INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    number INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (document_id, number)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    text, content='pages', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS figures (
+    document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    indicator TEXT NOT NULL,
+    value REAL NOT NULL,
+    unit TEXT,
+    scale REAL,
+    period TEXT,
+    page INTEGER NOT NULL,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS figures_document ON figures(document_id);
+CREATE INDEX IF NOT EXISTS figures_indicator ON figures(indicator);
+CREATE TABLE IF NOT EXISTS sections (
+    document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    kind TEXT,
+    start_page INTEGER NOT NULL,
+    end_page INTEGER NOT NULL,
+    UNIQUE (document_id, position)
+);
+-- Documents dont le découpage a été fait, même sans section trouvée
+CREATE TABLE IF NOT EXISTS sections_done (
+    document_id TEXT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    model TEXT,
+    params TEXT,
+    summary TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS answers (
+    document_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    model TEXT,
+    backend TEXT,
+    seconds REAL,
+    cached INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    created REAL NOT NULL,
+    session TEXT,
+    user TEXT,
+    document_id TEXT,
+    backend TEXT,
+    model TEXT,
+    stage TEXT,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_created ON usage(created);
+CREATE TABLE IF NOT EXISTS ocr_pages (
+    page_hash TEXT NOT NULL,
+    dpi INTEGER NOT NULL,
+    language TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (page_hash, dpi, language)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+    summary, content='summaries', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text):
+    """Requête FTS5 sûre : chaque mot de l'utilisateur devient un terme exigé.
+
+    À plusieurs mots, l'expression exacte est ajoutée en alternative : les
+    pages qui la contiennent (« dette nette ») remontent devant celles où les
+    mots sont dispersés.
+    """
+    tokens = _TOKEN.findall(text)
+    terms = " AND ".join(f'"{token}"' for token in tokens)
+    if len(tokens) < 2:
+        return terms
+    phrase = " ".join(tokens)
+    return f'"{phrase}" OR ({terms})'
+
+
+class DocumentStore:
+    """Accès thread-safe à l'archive (une connexion, mode WAL)"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+    def save_document(self, document_id, name, pages, figures=None, sections=None):
+        """Archive les pages (sections, indicateurs) d'un document ; sans effet s'il existe déjà"""
+        if figures is None:
+            figures = extract_figures(pages)
+        with REGISTRY.timer("store_save", pages=len(pages)), self._lock, self._conn:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO documents (id, name, pages, chars, created) VALUES (?, ?, ?, ?, ?)",
+                (document_id, name, len(pages), sum(len(p) for p in pages), time.time()),
+            ).rowcount
+            if not inserted:
+                return False
+            for number, text in enumerate(pages, start=1):
+                rowid = self._conn.execute(
+                    "INSERT INTO pages (document_id, number, text) VALUES (?, ?, ?)",
+                    (document_id, number, text),
+                ).lastrowid
+                self._conn.execute("INSERT INTO pages_fts (rowid, text) VALUES (?, ?)", (rowid, text))
+            self._conn.executemany(
+                "INSERT INTO figures (document_id, indicator, value, unit, scale, period, page, raw) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(document_id, f["indicator"], f["value"], f["unit"], f["scale"], f["period"], f["page"], f["raw"])
+                 for f in figures],
+            )
+            if sections is not None:
+                self._save_sections(document_id, sections)
+        return True
+
+    def save_sections(self, document_id, sections):
+        """Remplace les sections d'un document déjà archivé"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sections WHERE document_id = ?", (document_id,))
+            self._save_sections(document_id, sections)
+
+    def _save_sections(self, document_id, sections):
+        self._conn.execute("INSERT OR IGNORE INTO sections_done (document_id) VALUES (?)", (document_id,))
+        self._conn.executemany(
+            "INSERT INTO sections (document_id, position, title, level, kind, start_page, end_page) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(document_id, i, s["title"], s["level"], s["kind"], s["start"], s["end"])
+             for i, s in enumerate(sections)],
+        )
+
+    def save_summary(self, document_id, summary, model=None, params=None):
+        with self._lock, self._conn:
+            if not self._conn.execute("SELECT 1 FROM documents WHERE id = ?", (document_id,)).fetchone():
+                return False
+            rowid = self._conn.execute(
+                "INSERT INTO summaries (document_id, model, params, summary, created) VALUES (?, ?, ?, ?, ?)",
+                (document_id, model, json.dumps(params or {}, sort_keys=True), summary, time.time()),
+            ).lastrowid
+            self._conn.execute("INSERT INTO summaries_fts (rowid, summary) VALUES (?, ?)", (rowid, summary))
+        return True
+
+    def save_answer(self, document_id, question, answer, model=None, backend=None, seconds=None,
+                    cached=False, usage=None):
+        usage = usage or {}
+        with self._lock, self._conn:
+            if not self._conn.execute("SELECT 1 FROM documents WHERE id = ?", (document_id,)).fetchone():
+                return False
+            self._conn.execute(
+                "INSERT INTO answers (document_id, question, answer, model, backend, seconds, cached, "
+                "prompt_tokens, completion_tokens, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_id, question, answer, model, backend, seconds, int(cached),
+                 usage.get("prompt_tokens"), usage.get("completion_tokens"), time.time()),
+            )
+        return True
+
+    def save_usage(self, who, backend, model, stage, prompt_tokens, completion_tokens, action="full"):
+        """Tokens d'un appel au modèle, attribués à ``who`` (session, utilisateur, document)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO usage (created, session, user, document_id, backend, model, stage, "
+                "prompt_tokens, completion_tokens, action) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), who.get("session"), who.get("user"), who.get("document"), backend, model, stage,
+                 prompt_tokens, completion_tokens, action),
+            )
+
+    def save_ocr(self, page_hash, dpi, language, text):
+        """Texte reconnu d'une page scannée, par empreinte de page (partagé entre documents)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_pages (page_hash, dpi, language, text) VALUES (?, ?, ?, ?)",
+                (page_hash, dpi, language, text),
+            )
+
+    def delete_document(self, document_id):
+        with self._lock, self._conn:
+            for table, column in (("pages", "text"), ("summaries", "summary")):
+                # Tables FTS « external content » : suppression explicite de l'index
+                self._conn.execute(
+                    f"INSERT INTO {table}_fts ({table}_fts, rowid, {column}) "
+                    f"SELECT 'delete', rowid, {column} FROM {table} WHERE document_id = ?",
+                    (document_id,),
+                )
+            self._conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+    def load_pages(self, document_id):
+        """Pages archivées d'un document, ou None s'il n'a jamais été analysé"""
+        with REGISTRY.timer("store_load"), self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM pages WHERE document_id = ? ORDER BY number", (document_id,)
+            ).fetchall()
+        if not rows:
+            REGISTRY.cache_miss("store")
+            return None
+        REGISTRY.cache_hit("store")
+        return [row["text"] for row in rows]
+
+    def page(self, document_id, number):
+        """Texte d'une page archivée, ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM pages WHERE document_id = ? AND number = ?", (document_id, number)
+            ).fetchone()
+        return row["text"] if row else None
+
+    def ocr_text(self, page_hash, dpi, language):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text FROM ocr_pages WHERE page_hash = ? AND dpi = ? AND language = ?",
+                (page_hash, dpi, language),
+            ).fetchone()
+        return row["text"] if row else None
+
+    def sections(self, document_id):
+        """Sections archivées d'un document, dans l'ordre (liste vide si inconnues)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, level, kind, start_page, end_page FROM sections "
+                "WHERE document_id = ? ORDER BY position", (document_id,)
+            ).fetchall()
+        return [
+            {"title": row["title"], "level": row["level"], "kind": row["kind"],
+             "start": row["start_page"], "end": row["end_page"]}
+            for row in rows
+        ]
+
+    def sections_known(self, document_id):
+        """Découpage déjà fait (et archivé) pour ce document, même s'il n'a donné aucune section"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM sections_done WHERE document_id = ?", (document_id,)
+            ).fetchone() is not None
+
+    def document(self, document_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE id = ?", (document_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_documents(self, limit=200):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM documents ORDER BY created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_summary(self, document_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE document_id = ? ORDER BY created DESC LIMIT 1",
+                (document_id,),
+            ).fetchone()
+        return row["summary"] if row else None
+
+    def find_answer(self, document_id, question):
+        """Dernière réponse archivée à la même question sur ce document, ou None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE document_id = ? AND question = ? ORDER BY created DESC LIMIT 1",
+                (document_id, question),
+            ).fetchone()
+        return row["answer"] if row else None
+
+    # Regroupements possibles des rapports de consommation
+    USAGE_GROUPS = {
+        "session": "session", "user": "user", "document": "document_id", "backend": "backend",
+        "model": "model", "stage": "stage", "action": "action", "day": "date(created, 'unixepoch')",
+    }
+
+    def usage_report(self, by="user", since=0):
+        """Appels et tokens consommés depuis ``since``, groupés par ``by`` (plus gros consommateurs d'abord)"""
+        column = self.USAGE_GROUPS[by]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {column} AS key, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+                "SUM(completion_tokens) AS completion_tokens, "
+                "SUM(prompt_tokens + completion_tokens) AS tokens, "
+                "SUM(action NOT IN ('full', 'rejected')) AS degraded, SUM(action = 'rejected') AS rejected "
+                f"FROM usage WHERE created >= ? GROUP BY {column} ORDER BY tokens DESC",
+                (since,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def figures(self, document_id=None, indicator=None):
+        clauses, args = [], []
+        if document_id:
+            clauses.append("document_id = ?")
+            args.append(document_id)
+        if indicator:
+            clauses.append("indicator = ?")
+            args.append(indicator)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM figures {where} ORDER BY document_id, page", args
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # Lignes ajoutées depuis ``after`` (rowid de la table source), pour les exports incrémentaux
+    EXPORTS = {
+        "documents": "SELECT rowid AS _rowid, * FROM documents WHERE rowid > ?",
+        "figures": (
+            "SELECT f.rowid AS _rowid, f.*, d.created FROM figures f JOIN documents d ON d.id = f.document_id "
+            "WHERE f.rowid > ?"
+        ),
+        "summaries": "SELECT rowid AS _rowid, * FROM summaries WHERE rowid > ?",
+        "answers": "SELECT rowid AS _rowid, * FROM answers WHERE rowid > ?",
+    }
+
+    def export_rows(self, table, after=0, batch=50000):
+        """Lots de lignes de ``table`` de rowid supérieur à ``after``, dans l'ordre d'insertion"""
+        sql = self.EXPORTS[table] + " ORDER BY _rowid LIMIT ?"
+        while True:
+            with self._lock:
+                rows = [dict(row) for row in self._conn.execute(sql, (after, batch)).fetchall()]
+            if not rows:
+                return
+            yield rows
+            after = rows[-1]["_rowid"]
+
+    def search(self, query, limit=20, document_id=None):
+        """Pages les plus pertinentes (BM25) pour ``query``, avec extrait surligné"""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT p.document_id, d.name, p.number AS page, "
+            "snippet(pages_fts, 0, '**', '**', '…', 16) AS snippet, bm25(pages_fts) AS score "
+            "FROM pages_fts JOIN pages p ON p.rowid = pages_fts.rowid "
+            "JOIN documents d ON d.id = p.document_id "
+            "WHERE pages_fts MATCH ?"
+        )
+        args = [match]
+        if document_id:
+            sql += " AND p.document_id = ?"
+            args.append(document_id)
+        sql += " ORDER BY score LIMIT ?"
+        args.append(limit)
+        with REGISTRY.timer("store_search"), self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [dict(row) for row in rows]
+
+    def search_summaries(self, query, limit=20):
+        match = fts_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.document_id, d.name, snippet(summaries_fts, 0, '**', '**', '…', 16) AS snippet, "
+                "bm25(summaries_fts) AS score "
+                "FROM summaries_fts JOIN summaries s ON s.rowid = summaries_fts.rowid "
+                "JOIN documents d ON d.id = s.document_id "
+                "WHERE summaries_fts MATCH ? ORDER BY score LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Archive du processus, ou None si désactivée (``ANALYSEUR_DB=off``)"""
+    global _store
+    path = os.getenv("ANALYSEUR_DB", str(DEFAULT_PATH))
+    if path.lower() in ("off", "none", "0", ""):
+        return None
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = DocumentStore(path)
+        return _store
+
+
+def save_summary(document_id, summary, model=None, params=None):
+    """Archive un résumé généré (sans effet si l'archive est désactivée)"""
+    archive = get_store()
+    if archive is not None and document_id and summary:
+        archive.save_summary(document_id, summary, model, params)
+
+
+def save_answer(document_id, question, answer, model=None, backend=None, seconds=None, cached=False, usage=None):
+    """Archive une question et sa réponse (sans effet si l'archive est désactivée)"""
+    archive = get_store()
+    if archive is not None and document_id and answer:
+        archive.save_answer(document_id, question, answer, model, backend, seconds, cached, usage)
@@ -0,0 +1,219 @@
+"""Composants Streamlit communs aux applications."""
+import os
+import uuid
+from pathlib import Path
+
+import streamlit as st
+
+from . import budget, checklist, extraction, metrics, store
+from .sections import table_of_contents
+from .metrics import REGISTRY
+
+# Libellés des étapes affichées dans le panneau, dans l'ordre du pipeline
+STAGE_LABELS = {
+    "upload_read": "Lecture upload",
+    "fitz_open": "Ouverture PDF",
+    "page_get_text": "get_text (par page)",
+    "page_ocr": "OCR (par page)",
+    "cleanup": "Nettoyage",
+    "truncation": "Troncature",
+    "prompt_build": "Construction prompt",
+    "llm_queue_wait": "Attente file LLM",
+    "llm_queue_wait_interactive": "Attente file LLM (questions)",
+    "llm_queue_wait_precompute": "Attente file LLM (précalcul)",
+    "llm_queue_wait_batch": "Attente file LLM (résumés)",
+    "llm_ttft": "Premier token",
+    "llm_total": "Appel LLM (total)",
+    "analysis_total": "Analyse complète",
+    "checklist_total": "Questions en lot",
+    "script_run": "Exécution du script (rerun)",
+}
+
+
+@st.cache_resource(show_spinner=False)
+def bootstrap():
+    """Exports de métriques et API embarquée : une seule fois par processus"""
+    from . import api
+
+    metrics.setup_exports()
+    api.start_api_server()
+    return True
+
+
+def identify():
+    """Appelant des appels au modèle de ce rerun (décompte des tokens) : session, utilisateur, document"""
+    session = st.session_state.setdefault("budget_session", uuid.uuid4().hex)
+    try:
+        # Derrière un proxy d'authentification ; ``st.context`` selon la version de Streamlit
+        user = st.context.headers.get("X-Forwarded-User")
+    except Exception:
+        user = None
+    budget.set_caller(
+        session=session,
+        user=user or os.getenv("ANALYSEUR_USER", "local"),
+        document=lambda: st.session_state.get("document_id"),
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def load_env(app_dir, override=False):
+    """Charge le premier ``.env`` trouvé en remontant depuis ``app_dir``.
+
+    Mis en cache par processus : ``find_dotenv`` parcourt le disque à chaque
+    appel. Une modification du ``.env`` nécessite de relancer Streamlit.
+    """
+    from dotenv import load_dotenv
+
+    for directory in (Path(app_dir), *Path(app_dir).parents):
+        candidate = directory / ".env"
+        if candidate.is_file():
+            load_dotenv(candidate, override=override)
+            return str(candidate)
+    return None
+
+
+def render_sections(sections):
+    """Arborescence des sections repérées dans le document (repliée)"""
+    if not sections:
+        return
+    with st.expander(f"🗂️ Sections du document ({len(sections)})", expanded=False):
+        st.markdown(table_of_contents(sections, max_level=3, limit=200))
+
+
+def render_checklist(document_id, answer):
+    """Questions en lot : ``answer(questions)`` renvoie ``(lignes, statistiques)``"""
+    with st.expander("📋 Questions en lot", expanded=False):
+        pasted = st.text_area(
+            "Une question par ligne",
+            placeholder="Quel est le chiffre d'affaires ?\nQuelle est la dette nette ?\nQuels sont les principaux risques ?",
+            height=180,
+            key="checklist_text",
+        )
+        questions = checklist.parse_questions(pasted)
+        if st.button(f"📋 Répondre aux {len(questions)} questions", disabled=not questions, key="checklist_run"):
+            with st.spinner("Réponses groupées en cours..."):
+                try:
+                    st.session_state["checklist_result"] = (document_id, *answer(questions))
+                except Exception as e:
+                    st.error(f"❌ Erreur lors de la génération des réponses: {str(e)}")
+
+        result = st.session_state.get("checklist_result")
+        if not result or result[0] != document_id:
+            return
+        _, rows, stats = result
+        st.caption(
+            f"{stats['questions']} questions en {stats['calls']} appel(s) — extraits envoyés : "
+            f"{stats['context_chars']:,} caractères (au lieu de {stats['separate_chars']:,} question par question)"
+        )
+        st.dataframe(
+            [{**row, "pages": ", ".join(str(p) for p in row["pages"])} for row in rows],
+            hide_index=True, use_container_width=True,
+        )
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "CSV", checklist.to_csv(rows), file_name="questions.csv",
+            mime="text/csv", use_container_width=True
+        )
+        col2.download_button(
+            "JSON", checklist.to_json(rows), file_name="questions.json",
+            mime="application/json", use_container_width=True
+        )
+
+
+def render_metrics_panel():
+    """Panneau optionnel de performances (à appeler dans ``st.sidebar``)"""
+    if not st.checkbox("⏱️ Afficher les performances", value=False, key="show_metrics_panel"):
+        return
+
+    snap = REGISTRY.snapshot()
+    with st.expander("⏱️ Performances", expanded=True):
+        rows = []
+        for stage, s in snap["timings"].items():
+            rows.append({
+                "Étape": STAGE_LABELS.get(stage, stage),
+                "Appels": s["count"],
+                "Moy. (ms)": round(s["mean"] * 1000, 1),
+                "p95 (ms)": round(s["p95"] * 1000, 1),
+                "Total (s)": round(s["total"], 2),
+            })
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("Aucune mesure pour l'instant")
+
+        counters = snap["counters"]
+        col1, col2 = st.columns(2)
+        col1.metric("Tokens prompt", f"{counters.get('llm_prompt_tokens', 0):,}")
+        col2.metric("Tokens réponse", f"{counters.get('llm_completion_tokens', 0):,}")
+        col1, col2 = st.columns(2)
+        speed = snap["values"].get("llm_tokens_per_second")
+        if speed:
+            col1.metric("Débit (tokens/s)", f"{speed['mean']:.1f}")
+        col2.metric(
+            "Appels mutualisés", f"{counters.get('llm_coalesced', 0):,}",
+            help="Demandes identiques rattachées à un appel déjà en cours au lieu d'en lancer un nouveau"
+        )
+
+        for cache, rate in snap["cache_hit_rates"].items():
+            st.progress(rate, text=f"Cache {cache} : {rate:.0%}")
+
+        for scope, (used, limit) in budget.remaining().items():
+            st.progress(min(used / limit, 1.0), text=f"Budget {scope} : {used:,} / {limit:,} tokens")
+
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "JSON", REGISTRY.to_json(), file_name="metrics.json",
+            mime="application/json", use_container_width=True
+        )
+        col2.download_button(
+            "OpenMetrics", REGISTRY.to_openmetrics(), file_name="metrics.txt",
+            mime="text/plain", use_container_width=True
+        )
+
+
+def render_archive_panel(max_length=120000):
+    """Recherche dans l'archive et réouverture d'un rapport déjà analysé.
+
+    Renvoie le document rouvert (avec son dernier résumé sous ``summary``)
+    quand l'utilisateur clique sur « Rouvrir », sinon None.
+    """
+    archive = store.get_store()
+    if archive is None:
+        return None
+
+    with st.expander("🗄️ Archive des rapports", expanded=False):
+        query = st.text_input("Rechercher dans l'archive", placeholder="Ex: coût du risque", key="archive_query")
+        if query.strip():
+            from . import embeddings
+
+            semantic = embeddings.enabled() and st.checkbox(
+                "Recherche sémantique", key="archive_semantic",
+                help="Passages proches par le sens (index vectoriel) plutôt que par les mots exacts"
+            )
+            try:
+                hits = embeddings.search(query, k=10) if semantic else archive.search(query, limit=10)
+                if not hits:
+                    st.caption("Aucun résultat")
+            except Exception as e:
+                # Modèle d'embeddings injoignable, index illisible : le reste du panneau reste utilisable
+                st.error(f"❌ Erreur lors de la recherche: {str(e)}")
+                hits = []
+            for hit in hits:
+                st.markdown(f"**{hit['name'] or hit['document_id'][:12]}** — page {hit['page']}  \n{hit['snippet']}")
+
+        documents = archive.list_documents()
+        if not documents:
+            st.caption("Aucun rapport archivé")
+            return None
+        choice = st.selectbox(
+            "Rapports archivés",
+            documents,
+            format_func=lambda d: f"{d['name'] or d['id'][:12]} ({d['pages']} p.)",
+            key="archive_choice",
+        )
+        if st.button("📂 Rouvrir", key="archive_open", use_container_width=True):
+            document = extraction.reopen_document(choice["id"], max_length)
+            if document is not None:
+                return {**document, "summary": archive.latest_summary(choice["id"])}
+    return None
+
@@ -0,0 +1,85 @@
+"""Audit de cohérence (``analyseur.audit``) sur des milliers de documents en une passe.
+
+Génère des indicateurs synthétiques (chiffre d'affaires, résultat, bilan,
+dette sur plusieurs années) avec une part d'anomalies injectées, puis mesure
+la durée de ``run_audit`` et le nombre d'anomalies trouvées par contrôle.
+
+Usage : ``python benchmarks/audit.py --documents 5000 --years 3``
+(``--archive`` pour auditer l'archive SQLite à la place).
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from analyseur import audit  # noqa: E402
+
+
+def synthetic_figures(documents, years, anomalies, seed=0):
+    rng = np.random.default_rng(seed)
+    figures = []
+    for d in range(documents):
+        document_id = f"{d:064x}"
+        revenue = rng.uniform(1e8, 1e11)
+        # Ratios propres au document, légèrement bruités d'une année à l'autre
+        ratios = rng.uniform([0.05, 0.3, 0.5, 0.2, 0.05], [0.15, 1.0, 2.0, 0.5, 0.15])
+        for y in range(years):
+            period = str(2024 - y)
+            revenue *= rng.uniform(0.9, 1.1)
+            net, equity, liabilities, gross, cash = revenue * ratios * rng.uniform(0.9, 1.1, size=5)
+            values = {
+                "chiffre_affaires": revenue, "resultat_net": net, "total_actif": equity + liabilities,
+                "total_passif": liabilities, "capitaux_propres": equity, "dette_brute": gross,
+                "tresorerie": cash, "dette_nette": gross - cash,
+            }
+            if rng.random() < anomalies:
+                values["dette_nette"] *= 1.5
+            if rng.random() < anomalies:
+                values["total_actif"] *= 1.2
+            for page, (indicator, value) in enumerate(values.items(), start=2 + 10 * y):
+                figures.append({"document_id": document_id, "indicator": indicator, "value": value, "unit": "EUR",
+                                "scale": 1e6, "period": period, "page": page, "raw": ""})
+            figures.append({"document_id": document_id, "indicator": "marge", "value": 100 * net / revenue,
+                            "unit": "%", "scale": 1.0, "period": period, "page": 2 + 10 * y, "raw": ""})
+            if rng.random() < anomalies:
+                # Même chiffre d'affaires repris plus loin sans son échelle
+                figures.append({"document_id": document_id, "indicator": "chiffre_affaires", "value": revenue / 1e3,
+                                "unit": "EUR", "scale": 1.0, "period": period, "page": 90, "raw": ""})
+    return figures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--anomalies", type=float, default=0.05, help="part de lignes faussées par contrôle")
+    parser.add_argument("--archive", action="store_true", help="audite l'archive SQLite")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.archive:
+        from analyseur import store
+
+        figures = store.get_store().figures()
+    else:
+        figures = synthetic_figures(args.documents, args.years, args.anomalies)
+    frame = audit.figures_frame(figures)
+    prepared = time.perf_counter() - start
+
+    start = time.perf_counter()
+    violations = audit.run_audit(frame)
+    elapsed = time.perf_counter() - start
+
+    print(f"Indicateurs          : {len(frame):,} ({frame['document_id'].nunique():,} documents)")
+    print(f"Préparation          : {prepared:7.2f} s")
+    print(f"Audit (une passe)    : {elapsed:7.2f} s  ({len(frame) / elapsed / 1e3:,.0f} k indicateurs/s)")
+    for check, count in violations["check"].value_counts().items():
+        print(f"  {check:<18} : {count:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Très gros PDF : extraction complète contre ouverture à la demande.
+
+Mesure, pour une question posée juste après l'upload, le temps jusqu'au
+premier morceau de réponse : extraction de tout le PDF puis question, contre
+ouverture à la demande (module ``lazy``) où seules les premières pages et
+celles de la section concernée sont lues. Affiche aussi le nombre de pages
+extraites dans chaque cas.
+
+Usage (PyMuPDF requis) :
+
+- ``python benchmarks/lazy.py --pdf gros_rapport.pdf``
+- ``python benchmarks/lazy.py --pages 3000`` : PDF synthétique avec sommaire
+  (rapport de gestion, états financiers, risques, notes)
+
+Le modèle simulé est utilisé par défaut ; sa latence se règle avec
+``ANALYSEUR_MOCK_TTFT`` / ``ANALYSEUR_MOCK_TPS``.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ANALYSEUR_DB", "off")
+
+from analyseur import extraction, lazy, llm, prompts  # noqa: E402
+from analyseur.cache import ANSWERS  # noqa: E402
+from analyseur.metrics import REGISTRY  # noqa: E402
+
+
+def synthetic_pdf(count, chars=2500):
+    """PDF de ``count`` pages de texte, avec un sommaire en quatre sections"""
+    import fitz  # PyMuPDF
+
+    pdf = fitz.open()
+    line = "Chiffre d'affaires, résultat net, dette nette et trésorerie de l'exercice. "
+    for number in range(1, count + 1):
+        page = pdf.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), f"Page {number}\n" + line * (chars // len(line)),
+                            fontsize=7)
+    quarter = max(1, count // 4)
+    pdf.set_toc([
+        [1, "Rapport de gestion", 1],
+        [1, "Compte de résultat consolidé", quarter + 1],
+        [1, "Facteurs de risques", 2 * quarter + 1],
+        [1, "Notes annexes", 3 * quarter + 1],
+    ])
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+def reset():
+    extraction.EXTRACTION_CACHE.clear()
+    lazy.PAGE_CACHE.clear()
+    lazy._documents.clear()
+    ANSWERS.clear()
+
+
+def first_answer(data, question, args):
+    """``(secondes jusqu'au premier morceau, pages extraites, pages du document)``"""
+    before = REGISTRY.snapshot()["counters"].get("pages_extracted", 0)
+    start = time.perf_counter()
+    document = extraction.extract_document(data, args.max_length, name="benchmark.pdf")
+    messages = prompts.question_messages(question, document["text"], document["sections"])
+    for _ in llm.stream(args.backend, args.model, messages):
+        break
+    elapsed = time.perf_counter() - start
+    extracted = REGISTRY.snapshot()["counters"].get("pages_extracted", 0) - before
+    return elapsed, extracted, document["pages"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", type=Path, help="PDF à lire (sinon PDF synthétique)")
+    parser.add_argument("--pages", type=int, default=2000, help="pages du PDF synthétique")
+    parser.add_argument("--question", default="Quels sont les principaux risques identifiés ?")
+    parser.add_argument("--backend", default="mock", choices=["mock", "ollama"])
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--max-length", type=int, default=120000)
+    args = parser.parse_args(argv)
+
+    data = args.pdf.read_bytes() if args.pdf else synthetic_pdf(args.pages)
+
+    os.environ["ANALYSEUR_LAZY_PAGES"] = "0"
+    reset()
+    full, full_pages, count = first_answer(data, args.question, args)
+
+    # Seuil à 1 page : ouverture à la demande quelle que soit la taille du PDF
+    os.environ["ANALYSEUR_LAZY_PAGES"] = "1"
+    reset()
+    opened, lazy_pages, _ = first_answer(data, args.question, args)
+
+    print(f"Pages du document       : {count}")
+    print(f"Extraction complète     : {full:7.2f} s jusqu'à la réponse, {full_pages} pages lues")
+    print(f"Ouverture à la demande  : {opened:7.2f} s jusqu'à la réponse, {lazy_pages} pages lues")
+    print(f"Gain                    : {full / opened:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Test de charge : N sessions d'analystes simultanées contre le modèle simulé.
+
+Chaque session est un thread, comme un script Streamlit : elle envoie un
+document (taille tirée parmi ``--pages``), demande parfois un résumé, puis
+pose quelques questions d'un mélange type, avec un temps de réflexion entre
+deux actions. Le modèle simulé suit ``--ttft``, ``--tps`` et, pour un
+serveur partagé, ``--capacity`` (tokens/s au total) et ``--prefill``
+(tokens de prompt lus par seconde).
+
+Rapport par palier : débit, latences p50 / p95 / p99 par étape (côté
+session et côté serveur), mémoire résidente et profondeur de la file LLM.
+
+Usage :
+
+- ``python benchmarks/load.py --sessions 1,4,16 --duration 30`` : paliers
+  successifs, pour repérer le nombre de sessions où la latence décroche
+- ``--pdf-dir data/`` : vrais PDF (PyMuPDF) au lieu de pages synthétiques
+- ``--json load.json`` : résultats bruts, à comparer d'une version à l'autre
+
+Les places d'appel au modèle suivent ``ANALYSEUR_LLM_CONCURRENCY`` et
+``ANALYSEUR_LLM_LIMITS``, comme en production.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ANALYSEUR_DB", "off")
+
+from analyseur import extraction  # noqa: E402
+from analyseur.cache import ANSWERS  # noqa: E402
+from analyseur.metrics import REGISTRY  # noqa: E402
+from analyseur.scheduler import SCHEDULER  # noqa: E402
+from analyseur.service import AnalyzerService  # noqa: E402
+
+QUESTIONS = [
+    "Quel est le chiffre d'affaires de l'exercice ?",
+    "Quelle est la dette nette et comment a-t-elle évolué ?",
+    "Quels sont les principaux risques identifiés ?",
+    "Quelle est la marge opérationnelle ?",
+    "Quelles sont les perspectives annoncées par la direction ?",
+    "Quel est le montant du résultat net ?",
+    "Quel dividende est proposé aux actionnaires ?",
+    "Comment a évolué la trésorerie ?",
+]
+
+# Étapes mesurées côté serveur (``REGISTRY``), reprises dans le rapport
+SERVER_STAGES = ("llm_queue_wait_interactive", "llm_queue_wait_batch", "llm_ttft", "llm_total")
+
+
+def rss_mb():
+    """Mémoire résidente actuelle (Linux), sinon le pic du processus"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {"count": len(ordered), "p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": ordered[-1]}
+
+
+# ======================================================
+# DOCUMENTS
+# ======================================================
+def synthetic_pages(index, count, chars=2500):
+    """Pages brutes d'un rapport synthétique (texte propre au document ``index``)"""
+    body = "Chiffre d'affaires, résultat net, dette nette, trésorerie.  \n  " + "texte du rapport " * (chars // 17)
+    return [f"Rapport {index} page {number}\n{body}" for number in range(1, count + 1)]
+
+
+class Corpus:
+    """Documents envoyés par les sessions : vrais PDF, ou pages synthétiques"""
+
+    def __init__(self, args):
+        self.args = args
+        self.pdfs = sorted(args.pdf_dir.glob("*.pdf")) if args.pdf_dir else []
+        if args.pdf_dir and not self.pdfs:
+            raise SystemExit(f"Aucun PDF dans {args.pdf_dir}")
+
+    def upload(self, service, rng):
+        """Envoie un document comme un upload ; renvoie son identifiant"""
+        if self.pdfs:
+            path = rng.choice(self.pdfs)
+            return service.add_document(path.read_bytes(), path.name, self.args.max_length)["id"]
+
+        # Un document tiré dans un lot de ``--documents`` : un ré-upload est servi par le cache
+        index = rng.randrange(self.args.documents)
+        raw = synthetic_pages(index, self.args.pages[index % len(self.args.pages)])
+        document_id = extraction.document_hash("".join(raw).encode("utf-8"))
+        document = extraction.EXTRACTION_CACHE.get((document_id, self.args.max_length))
+        if document is None:
+            pages = []
+            for page in raw:
+                time.sleep(self.args.page_delay)  # lecture PyMuPDF (hors GIL)
+                pages.append(extraction.clean_page(page))
+            document = extraction.remember(document_id, f"rapport-{index}.pdf", pages, self.args.max_length)
+        service.documents.put(document_id, document)
+        return document_id
+
+
+# ======================================================
+# SESSIONS
+# ======================================================
+class Recorder:
+    """Durées et erreurs par étape, partagées par les sessions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.errors = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def fail(self, stage):
+        with self._lock:
+            self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    def timed(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            self.fail(stage)
+            return None
+        self.record(stage, time.perf_counter() - start)
+        return result
+
+
+def ask(service, recorder, document_id, question):
+    """Question en flux ; enregistre le délai avant le premier morceau"""
+    start = time.perf_counter()
+    first = None
+    for _ in service.stream_answer(document_id, question):
+        if first is None:
+            first = time.perf_counter() - start
+            recorder.record("question_first_chunk", first)
+
+
+def session(number, service, corpus, recorder, deadline, args):
+    rng = random.Random(args.seed * 10007 + number)
+    time.sleep(args.ramp * number / max(1, args.level))
+    while time.perf_counter() < deadline:
+        document_id = recorder.timed("upload", corpus.upload, service, rng)
+        if document_id is None:
+            continue
+        if rng.random() < args.summary_share:
+            recorder.timed("summary", service.summarize, document_id)
+        for _ in range(rng.randint(1, args.questions)):
+            if time.perf_counter() >= deadline:
+                return
+            time.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+            question = rng.choice(QUESTIONS)
+            if rng.random() < args.novel:
+                # Formulation propre à l'analyste : pas de réponse en cache à réutiliser
+                question = f"{question} (analyste {number}, {rng.randrange(10 ** 6)})"
+            recorder.timed("question", ask, service, recorder, document_id, question)
+
+
+def sample(samples, stop, interval):
+    """Relevés périodiques : mémoire, file d'attente du modèle, appels en cours"""
+    while not stop.wait(interval):
+        queues = SCHEDULER.snapshot()
+        samples.append({
+            "rss": rss_mb(),
+            "queued": {klass: state["queued"] for klass, state in queues.items()},
+            "running": sum(state["running"] for state in queues.values()),
+        })
+
+
+def run_level(level, args, corpus):
+    """Un palier de ``level`` sessions pendant ``args.duration`` secondes"""
+    REGISTRY.reset()
+    ANSWERS.clear()
+    extraction.EXTRACTION_CACHE.clear()
+    service = AnalyzerService(backend="mock", model="mock")
+    recorder = Recorder()
+    args.level = level
+
+    samples = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample, args=(samples, stop, args.sample_interval), daemon=True)
+    rss_start = rss_mb()
+    sampler.start()
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [
+        threading.Thread(target=session, args=(i, service, corpus, recorder, deadline, args), name=f"session-{i}")
+        for i in range(level)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    service.executor.shutdown(wait=False)
+
+    snapshot = REGISTRY.snapshot()
+    counters = snapshot["counters"]
+    rss = [s["rss"] for s in samples] or [rss_start]
+    queues = {}
+    for klass in SCHEDULER.snapshot():
+        depths = [s["queued"][klass] for s in samples] or [0]
+        queues[klass] = {"max": max(depths), "mean": sum(depths) / len(depths)}
+    return {
+        "sessions": level,
+        "seconds": elapsed,
+        "throughput": {
+            "documents_per_min": len(recorder.durations.get("upload", [])) / elapsed * 60,
+            "questions_per_s": len(recorder.durations.get("question", [])) / elapsed,
+            "summaries_per_min": len(recorder.durations.get("summary", [])) / elapsed * 60,
+            "completion_tokens_per_s": counters.get("llm_completion_tokens", 0) / elapsed,
+            "llm_calls": counters.get("llm_calls", 0),
+            "llm_coalesced": counters.get("llm_coalesced", 0),
+        },
+        "stages": {stage: percentiles(values) for stage, values in sorted(recorder.durations.items())},
+        "server": {stage: snapshot["timings"][stage] for stage in SERVER_STAGES if stage in snapshot["timings"]},
+        "memory_mb": {"start": rss_start, "peak": max(rss), "end": rss[-1], "growth": rss[-1] - rss_start},
+        "queue": queues,
+        "max_running": max((s["running"] for s in samples), default=0),
+        "errors": recorder.errors,
+    }
+
+
+def print_level(result):
+    throughput = result["throughput"]
+    print(f"\n=== {result['sessions']} session(s), {result['seconds']:.1f} s ===")
+    print(f"Débit                : {throughput['questions_per_s']:.2f} questions/s, "
+          f"{throughput['documents_per_min']:.1f} documents/min, {throughput['summaries_per_min']:.1f} résumés/min")
+    print(f"Modèle               : {throughput['llm_calls']} appels ({throughput['llm_coalesced']} mutualisés), "
+          f"{throughput['completion_tokens_per_s']:.0f} tokens/s générés")
+    print(f"{'Étape':<28}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, stages in (("", result["stages"]), ("serveur : ", result["server"])):
+        for stage, s in stages.items():
+            print(f"{label + stage:<28}{s['count']:>6}{s['p50'] * 1000:>10.0f}{s['p95'] * 1000:>10.0f}"
+                  f"{s['p99'] * 1000:>10.0f}{s['max'] * 1000:>10.0f}")
+    memory = result["memory_mb"]
+    print(f"Mémoire (RSS)        : {memory['start']:.0f} → {memory['end']:.0f} Mo "
+          f"(pic {memory['peak']:.0f}, {memory['growth']:+.0f} Mo)")
+    print("File LLM (attente)   : " + ", ".join(
+        f"{klass} max {q['max']} / moy. {q['mean']:.1f}" for klass, q in result["queue"].items()
+    ) + f" ; appels en cours max {result['max_running']}")
+    if result["errors"]:
+        print(f"Erreurs              : {result['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", default="1,4,16", help="paliers de sessions simultanées (liste)")
+    parser.add_argument("--duration", type=float, default=30, help="durée de chaque palier (s)")
+    parser.add_argument("--ramp", type=float, default=2, help="étalement du démarrage des sessions (s)")
+    parser.add_argument("--pdf-dir", type=Path, help="dossier de PDF à envoyer (sinon pages synthétiques)")
+    parser.add_argument("--documents", type=int, default=50, help="documents synthétiques distincts")
+    parser.add_argument("--pages", default="20,80,300", help="tailles des documents synthétiques (pages)")
+    parser.add_argument("--page-delay", type=float, default=0.005, help="lecture d'une page synthétique (s)")
+    parser.add_argument("--max-length", type=int, default=120000)
+    parser.add_argument("--questions", type=int, default=5, help="questions par document (au plus)")
+    parser.add_argument("--summary-share", type=float, default=0.3, help="part des documents résumés")
+    parser.add_argument("--novel", type=float, default=0.5, help="part des questions formulées librement")
+    parser.add_argument("--think", type=float, default=2.0, help="temps de réflexion moyen entre questions (s)")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=40, help="tokens/s par génération")
+    parser.add_argument("--capacity", type=float, default=200, help="tokens/s au total (0 : illimité)")
+    parser.add_argument("--prefill", type=float, default=4000, help="tokens de prompt lus par seconde (0 : instantané)")
+    parser.add_argument("--tokens", type=int, default=200, help="longueur maximale des réponses")
+    parser.add_argument("--sample-interval", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="écrit les résultats bruts")
+    args = parser.parse_args(argv)
+    args.pages = [int(p) for p in args.pages.split(",")]
+
+    os.environ.update({
+        "ANALYSEUR_MOCK_TTFT": str(args.ttft), "ANALYSEUR_MOCK_TPS": str(args.tps),
+        "ANALYSEUR_MOCK_CAPACITY": str(args.capacity), "ANALYSEUR_MOCK_PREFILL": str(args.prefill),
+        "ANALYSEUR_MOCK_TOKENS": str(args.tokens),
+    })
+    corpus = Corpus(args)
+    results = []
+    for level in (int(n) for n in args.sessions.split(",")):
+        results.append(run_level(level, args, corpus))
+        print_level(results[-1])
+
+    if len(results) > 1:
+        print(f"\n{'Sessions':>8}{'questions/s':>13}{'question p95':>14}{'1er morceau p95':>17}{'file max':>10}{'RSS':>9}")
+        for r in results:
+            question = r["stages"].get("question", percentiles([]))
+            first = r["stages"].get("question_first_chunk", percentiles([]))
+            print(f"{r['sessions']:>8}{r['throughput']['questions_per_s']:>13.2f}{question['p95']:>13.2f}s"
+                  f"{first['p95']:>16.2f}s{max(q['max'] for q in r['queue'].values()):>10}"
+                  f"{r['memory_mb']['growth']:>+8.0f}M")
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Résumé séquentiel (extraction puis modèle) contre résumé en flux.
+
+Les deux variantes utilisent le même découpage en lots et le même modèle ;
+seule change la superposition de la lecture des pages et des appels. Le
+temps en flux doit s'approcher de max(extraction, génération) au lieu de
+leur somme.
+
+Usage :
+
+- ``python benchmarks/pipeline.py --pdf data/teslafinancialreport.pdf`` (PyMuPDF)
+- ``python benchmarks/pipeline.py --pages 80 --page-delay 0.03`` : pages
+  synthétiques, sans PDF ni PyMuPDF
+
+Le modèle simulé est utilisé par défaut (``--backend ollama`` pour un vrai
+modèle) ; sa latence se règle avec ``ANALYSEUR_MOCK_TTFT`` / ``ANALYSEUR_MOCK_TPS``.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("ANALYSEUR_DB", "off")
+
+from analyseur import extraction, pipeline  # noqa: E402
+from analyseur.cache import ANSWERS  # noqa: E402
+
+
+def synthetic_pages(count, delay, chars=2500):
+    for number in range(1, count + 1):
+        time.sleep(delay)
+        yield f"Page {number} : chiffre d'affaires, résultat net, dette nette. " + "texte " * (chars // 6)
+
+
+def run(pages, args):
+    """Consomme un résumé ; renvoie (durée totale, premier lot envoyé, dernière page reçue)"""
+    start = time.perf_counter()
+    first_chunk = last_page = None
+    for kind, _ in pipeline.summarize_pages(
+        pages, args.backend, args.model, chunk_chars=args.chunk_chars,
+        max_length=args.max_length, max_inflight=args.inflight,
+    ):
+        if kind == "page":
+            last_page = time.perf_counter() - start
+        elif kind == "chunk" and first_chunk is None:
+            first_chunk = time.perf_counter() - start
+    return time.perf_counter() - start, first_chunk, last_page
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", type=Path, help="PDF à lire (sinon pages synthétiques)")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--page-delay", type=float, default=0.03, help="durée de lecture d'une page synthétique (s)")
+    parser.add_argument("--backend", default="mock", choices=["mock", "ollama"])
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--chunk-chars", type=int, default=pipeline.DEFAULT_CHUNK_CHARS)
+    parser.add_argument("--max-length", type=int, default=None)
+    parser.add_argument("--inflight", type=int, default=2, help="lots envoyés simultanément")
+    args = parser.parse_args(argv)
+
+    if args.pdf:
+        data = args.pdf.read_bytes()
+
+        def source():
+            return extraction.iter_pages(data)
+    else:
+        def source():
+            return synthetic_pages(args.pages, args.page_delay)
+
+    start = time.perf_counter()
+    pages = list(source())
+    extract = time.perf_counter() - start
+
+    ANSWERS.clear()
+    generate, _, _ = run(iter(pages), args)
+    sequential = extract + generate
+
+    ANSWERS.clear()
+    streamed, first_chunk, last_page = run(pipeline.prefetch(source()), args)
+
+    print(f"Pages                : {len(pages)}")
+    print(f"Extraction seule     : {extract:7.2f} s")
+    print(f"Génération seule     : {generate:7.2f} s")
+    print(f"Séquentiel (somme)   : {sequential:7.2f} s")
+    print(f"En flux              : {streamed:7.2f} s  (dernière page lue à {last_page:.2f} s)")
+    print(f"max(extraction, gén.): {max(extract, generate):7.2f} s")
+    print(f"Gain                 : {sequential / streamed:7.2f}x")
+    if first_chunk is not None:
+        print(f"Premier lot envoyé   : {first_chunk:7.2f} s après le début (en flux)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Temps de démarrage à froid et de rerun des trois applications Streamlit.
+
+Chaque application est exécutée dans un processus neuf avec
+``streamlit.testing.v1.AppTest`` (sans navigateur ni serveur) :
+
+- **import** : coût d'import des modules lourds, chacun mesuré à froid
+- **cold** : premier passage du script (imports, caches vides)
+- **rerun** : passages suivants, comme après un clic (médiane et p95)
+
+Usage : ``python benchmarks/startup.py [--reruns 10] [--json]``.
+Ollama et OpenRouter n'ont pas besoin d'être joignables : les applications
+s'arrêtent alors sur leur message d'erreur, ce qui reste un rerun représentatif.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APPS = {
+    "01_ollama": ROOT / "01_Application_Analyseur_Financier_OpenSource_Ollama" / "app.py",
+    "02_openrouter": ROOT / "02_Application_Analyseur_Financier_OpenSource_OpenRouter" / "app.py",
+    "03_prototype": ROOT / "03_Application_Analyseur_Financier_OpenAI" / "app.py",
+}
+HEAVY_MODULES = ["streamlit", "fitz", "ollama", "requests", "pandas", "numpy", "dotenv"]
+
+# Exécuté dans le processus enfant : mesure d'une application
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_import = time.perf_counter() - start
+
+app = AppTest.from_file(sys.argv[1], default_timeout=60)
+start = time.perf_counter()
+app.run()
+cold = time.perf_counter() - start
+
+reruns = []
+for _ in range(int(sys.argv[2])):
+    start = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - start)
+
+print(json.dumps({
+    "streamlit_import": streamlit_import,
+    "cold": cold,
+    "reruns": reruns,
+    "exceptions": [str(e.value) for e in app.exception],
+}))
+"""
+
+
+def import_time(module):
+    """Durée d'import d'un module dans un interpréteur neuf (None s'il est absent)"""
+    code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return float(result.stdout) if result.returncode == 0 else None
+
+
+def bench_app(path, reruns):
+    env = dict(os.environ, ANALYSEUR_DB=os.getenv("ANALYSEUR_DB", "off"), ANALYSEUR_API_PORT="")
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, str(path), str(reruns)],
+        capture_output=True, text=True, cwd=path.parent, env=env,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "échec"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:8.1f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="résultats bruts en JSON")
+    args = parser.parse_args(argv)
+
+    report = {"imports": {m: import_time(m) for m in HEAVY_MODULES}, "apps": {}}
+    for name, path in APPS.items():
+        started = time.perf_counter()
+        report["apps"][name] = bench_app(path, args.reruns)
+        report["apps"][name]["wall"] = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print("Import à froid (ms)")
+    for module, seconds in report["imports"].items():
+        print(f"  {module:<10} {_ms(seconds) if seconds is not None else '  absent'}")
+    print()
+    print(f"{'Application':<15} {'cold (ms)':>10} {'rerun p50':>10} {'rerun p95':>10}")
+    for name, r in report["apps"].items():
+        if "error" in r:
+            print(f"{name:<15} erreur : {r['error']}")
+            continue
+        runs = sorted(r["reruns"]) or [0.0]
+        p95 = runs[min(len(runs) - 1, int(0.95 * len(runs)))]
+        print(f"{name:<15} {_ms(r['cold']):>10} {_ms(statistics.median(runs)):>10} {_ms(p95):>10}")
+        for exception in r["exceptions"]:
+            print(f"{'':<15} exception : {exception}")
+
+
+if __name__ == "__main__":
+    main()
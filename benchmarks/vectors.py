@@ -0,0 +1,72 @@
+"""Recherche top-k dans l'index vectoriel sur disque (``analyseur.embeddings``).
+
+Crée ``--documents`` index synthétiques (vecteurs aléatoires normalisés)
+dans un dossier temporaire, puis mesure la recherche sur l'ensemble :
+latence (médiane, p95), lignes parcourues par seconde et mémoire résidente
+gagnée. Les matrices sont lues en mémoire mappée : les pages lues comptent
+dans le RSS mais restent du cache disque, que le système peut reprendre.
+
+Usage : ``python benchmarks/vectors.py --documents 2000 --chunks 120 --dimension 768``
+(``--dtype float32`` pour comparer avec la pleine précision).
+"""
+import argparse
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+from analyseur.embeddings import VectorStore, _normalize  # noqa: E402
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=100, help="passages par document")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root:
+        vector_store = VectorStore(root, dtype=args.dtype)
+        start = time.perf_counter()
+        for i in range(args.documents):
+            vectors = _normalize(rng.standard_normal((args.chunks, args.dimension), dtype=np.float32))
+            pages = np.arange(args.chunks) // 4 + 1
+            vector_store.save(f"{i:064x}", vectors, pages, "bench")
+        write = time.perf_counter() - start
+        size = sum(p.stat().st_size for p in Path(root).glob("*.npy")) / 1024 ** 2
+
+        before = rss_mb()
+        durations = []
+        for _ in range(args.queries):
+            query = _normalize(rng.standard_normal((1, args.dimension), dtype=np.float32))[0]
+            start = time.perf_counter()
+            hits = vector_store.search(query, args.k, model="bench")
+            durations.append(time.perf_counter() - start)
+        rows = args.documents * args.chunks
+
+    durations.sort()
+    p95 = durations[min(len(durations) - 1, int(0.95 * len(durations)))]
+    print(f"Index                : {args.documents} documents, {rows:,} passages, {size:,.0f} Mo ({args.dtype})")
+    print(f"Écriture             : {write:7.2f} s")
+    print(f"Recherche top-{args.k:<6} : médiane {statistics.median(durations) * 1000:7.1f} ms, p95 {p95 * 1000:7.1f} ms")
+    print(f"Débit                : {rows / statistics.median(durations) / 1e6:7.1f} M passages/s")
+    print(f"Mémoire (pic RSS)    : +{rss_mb() - before:,.0f} Mo pendant les recherches")
+    print(f"Meilleur score       : {hits[0]['score']:.3f}" if hits else "Aucun résultat")
+
+
+if __name__ == "__main__":
+    main()